@@ -9,6 +9,19 @@ Created on Tue Nov 25 02:03:30 2025
 Cifrado AES-128 con polinomio estandar y polinomio propietario
 """
 
+import struct
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# ============== NUMPY (OPCIONAL) ==============
+try:
+    import numpy as np
+    NUMPY_DISPONIBLE = True
+except ImportError:
+    np = None
+    NUMPY_DISPONIBLE = False
+
 # ============== TABLAS CONSTANTES ==============
 
 # S-Box para SubBytes
@@ -89,19 +102,119 @@ POLINOMIOS = [
 ]
 
 
+# Lectura/escritura de un bloque como 4 palabras big-endian (una por columna)
+_ESTRUCTURA_BLOQUE = struct.Struct('>4I')
+_unpack_from = _ESTRUCTURA_BLOQUE.unpack_from
+_pack_into = _ESTRUCTURA_BLOQUE.pack_into
+
+# Permutaciones de ShiftRows sobre el bloque plano (índice = fila + 4*columna)
+SHIFT_ROWS_IDX = [(i % 4) + 4 * ((i // 4 + i % 4) % 4) for i in range(16)]
+INV_SHIFT_ROWS_IDX = [(i % 4) + 4 * ((i // 4 - i % 4) % 4) for i in range(16)]
+
+
+# ============== TABLAS PRECALCULADAS ==============
+
+class TablasAES:
+    """
+    Tablas precalculadas para un polinomio de GF(2^8).
+
+    - mult: tabla completa 256x256 de multiplicación (índice (a << 8) | b)
+    - te: 4 T-tables de cifrado (SubBytes + ShiftRows + MixColumns)
+    - td: 4 T-tables de descifrado (InvSubBytes + InvShiftRows + InvMixColumns)
+
+    Las palabras de 32 bits representan una columna del estado,
+    con la fila 0 en el byte más significativo.
+    """
+
+    def __init__(self, polinomio):
+        self.polinomio = polinomio
+        self.mult = self._construir_mult(polinomio)
+        self.te = self._construir_t_tables(SBOX, (2, 1, 1, 3))
+        self.td = self._construir_t_tables(INV_SBOX, (14, 9, 13, 11))
+        self._numpy = None
+
+    @staticmethod
+    def _construir_mult(polinomio):
+        """Tabla de multiplicación usando linealidad: a·b = XOR de a·x^i por cada bit de b."""
+        mult = bytearray(65536)
+        for a in range(1, 256):
+            potencias = [a]
+            for _ in range(7):
+                p = potencias[-1] << 1
+                if p & 0x100:
+                    p ^= polinomio
+                potencias.append(p)
+            fila = a << 8
+            for b in range(1, 256):
+                bit_bajo = b & -b
+                mult[fila | b] = mult[fila | (b ^ bit_bajo)] ^ potencias[bit_bajo.bit_length() - 1]
+        return bytes(mult)
+
+    def _construir_t_tables(self, caja, coeficientes):
+        """Genera las 4 T-tables rotando los coeficientes de la columna."""
+        mult = self.mult
+        tablas = []
+        for desplazamiento in range(4):
+            coefs = coeficientes[-desplazamiento:] + coeficientes[:-desplazamiento]
+            tabla = []
+            for x in range(256):
+                s = caja[x] << 8
+                tabla.append((mult[s | coefs[0]] << 24) | (mult[s | coefs[1]] << 16) |
+                             (mult[s | coefs[2]] << 8) | mult[s | coefs[3]])
+            tablas.append(tabla)
+        return tuple(tablas)
+
+    def numpy(self):
+        """Tablas como arrays NumPy para el motor vectorizado (se construyen bajo demanda)."""
+        if self._numpy is None:
+            self._numpy = {
+                'sbox': np.array(SBOX, dtype=np.uint8),
+                'inv_sbox': np.array(INV_SBOX, dtype=np.uint8),
+                'te': tuple(np.array(t, dtype='>u4') for t in self.te),
+                'td': tuple(np.array(t, dtype='>u4') for t in self.td)
+            }
+        return self._numpy
+
+    def inv_mix_palabra(self, palabra):
+        """InvMixColumns sobre una palabra de 32 bits (sin S-Box)."""
+        mult = self.mult
+        a0, a1, a2, a3 = palabra >> 24, (palabra >> 16) & 0xFF, (palabra >> 8) & 0xFF, palabra & 0xFF
+        a0, a1, a2, a3 = a0 << 8, a1 << 8, a2 << 8, a3 << 8
+        return (((mult[a0 | 14] ^ mult[a1 | 11] ^ mult[a2 | 13] ^ mult[a3 | 9]) << 24) |
+                ((mult[a0 | 9] ^ mult[a1 | 14] ^ mult[a2 | 11] ^ mult[a3 | 13]) << 16) |
+                ((mult[a0 | 13] ^ mult[a1 | 9] ^ mult[a2 | 14] ^ mult[a3 | 11]) << 8) |
+                (mult[a0 | 11] ^ mult[a1 | 13] ^ mult[a2 | 9] ^ mult[a3 | 14]))
+
+
+# Caché a nivel de módulo: se construyen una sola vez por polinomio
+_TABLAS_POR_POLINOMIO = {}
+
+
+def obtener_tablas(polinomio_index):
+    """Retorna (y cachea) las tablas precalculadas del polinomio indicado."""
+    tablas = _TABLAS_POR_POLINOMIO.get(polinomio_index)
+    if tablas is None:
+        tablas = TablasAES(POLINOMIOS[polinomio_index])
+        _TABLAS_POR_POLINOMIO[polinomio_index] = tablas
+    return tablas
+
+
 # ============== CLASE AES-128 ==============
 
 class AES128:
-    def __init__(self, polinomio_index=0):
+    def __init__(self, polinomio_index=0, usar_numpy=True):
         """
         Inicializa AES-128.
         
         Args:
             polinomio_index: Índice del polinomio (0-29). 0 = AES estándar
+            usar_numpy: Usar el motor vectorizado en ECB si NumPy está instalado
         """
         self.polinomio = POLINOMIOS[polinomio_index]
         self.polinomio_index = polinomio_index
-    
+        self.tablas = obtener_tablas(polinomio_index)
+        self.usar_numpy = usar_numpy and NUMPY_DISPONIBLE
+
     # ============== FUNCIONES AUXILIARES ==============
     
     def bytes_to_matrix(self, data):
@@ -130,17 +243,8 @@ class AES128:
     # ============== MULTIPLICACIÓN EN GALOIS ==============
     
     def galois_mult(self, a, b):
-        """Multiplicación en GF(2^8) con el polinomio seleccionado"""
-        p = 0
-        for _ in range(8):
-            if b & 1:
-                p ^= a
-            hi_bit_set = a & 0x80
-            a <<= 1
-            if hi_bit_set:
-                a ^= self.polinomio  # Usa el polinomio parametrizable
-            b >>= 1
-        return p & 0xFF
+        """Multiplicación en GF(2^8) con el polinomio seleccionado (tabla precalculada)"""
+        return self.tablas.mult[(a << 8) | b]
     
     # ============== 1. SubBytes ==============
     
@@ -252,6 +356,40 @@ class AES128:
     
     
     
+    def key_expansion_words(self, key):
+        """
+        Expande la clave en 44 palabras de 32 bits (formato de las T-tables).
+        La palabra 4*r + c es la columna c de la clave de ronda r.
+        """
+        round_keys = self.key_expansion(key)
+        palabras = []
+        for matrix in round_keys:
+            for col in range(4):
+                palabras.append((matrix[0][col] << 24) | (matrix[1][col] << 16) |
+                                (matrix[2][col] << 8) | matrix[3][col])
+        return palabras
+    
+    def inv_key_expansion_words(self, key):
+        """
+        Claves de ronda para el descifrado con T-tables (cifrador inverso equivalente):
+        las rondas 1-9 pasan por InvMixColumns, ya que es lineal y puede
+        aplicarse antes del XOR con el estado.
+        """
+        palabras = self.key_expansion_words(key)
+        inv_mix = self.tablas.inv_mix_palabra
+        return palabras[:4] + [inv_mix(w) for w in palabras[4:40]] + palabras[40:]
+    
+    def claves_de_ronda(self, key):
+        """
+        Retorna (claves de cifrado, claves de descifrado) en palabras de 32 bits,
+        usando la caché LRU del módulo indexada por (polinomio, clave).
+        """
+        return _claves_de_ronda_cache(self.polinomio_index, bytes(key))
+    
+    def con_clave(self, key):
+        """Crea un contexto AES128Contexto ligado a la clave."""
+        return AES128Contexto(self, key)
+    
     # ============== CIFRADO DE BLOQUE ==============
     
     def encrypt_block(self, plaintext, key):
@@ -265,28 +403,47 @@ class AES128:
         Returns:
             Lista de 16 bytes cifrados
         """
-        # Generar claves de ronda
-        round_keys = self.key_expansion(key)
+        salida = bytearray(16)
+        self._encrypt_block_into(bytes(plaintext), 0, salida, 0, self.claves_de_ronda(key)[0])
+        return list(salida)
+    
+    def _encrypt_block_into(self, src, i, dst, j, rk):
+        """
+        Cifra el bloque src[i:i+16] y lo escribe en dst[j:j+16].
         
-        # Convertir a matriz
-        state = self.bytes_to_matrix(plaintext)
+        El estado son 4 palabras de 32 bits (una por columna) leídas y escritas
+        directamente sobre los buffers planos (bytes/bytearray/memoryview), sin
+        matrices intermedias. ShiftRows queda implícito en qué palabra aporta
+        cada fila a cada columna.
+        """
+        te0, te1, te2, te3 = self.tablas.te
         
-        # Ronda inicial
-        state = self.add_round_key(state, round_keys[0])
+        # Ronda inicial (AddRoundKey)
+        s0, s1, s2, s3 = _unpack_from(src, i)
+        s0 ^= rk[0]
+        s1 ^= rk[1]
+        s2 ^= rk[2]
+        s3 ^= rk[3]
         
-        # 9 rondas principales
-        for round_num in range(1, 10):
-            state = self.sub_bytes(state)
-            state = self.shift_rows(state)
-            state = self.mix_columns(state)
-            state = self.add_round_key(state, round_keys[round_num])
+        # 9 rondas principales: SubBytes + ShiftRows + MixColumns en 16 consultas de tabla
+        for k in range(4, 40, 4):
+            t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ rk[k]
+            t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ rk[k + 1]
+            t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ rk[k + 2]
+            t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ rk[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
         
         # Ronda final (sin MixColumns)
-        state = self.sub_bytes(state)
-        state = self.shift_rows(state)
-        state = self.add_round_key(state, round_keys[10])
-        
-        return self.matrix_to_bytes(state)
+        sb = SBOX
+        _pack_into(dst, j,
+                   ((sb[s0 >> 24] << 24) | (sb[(s1 >> 16) & 0xFF] << 16) |
+                    (sb[(s2 >> 8) & 0xFF] << 8) | sb[s3 & 0xFF]) ^ rk[40],
+                   ((sb[s1 >> 24] << 24) | (sb[(s2 >> 16) & 0xFF] << 16) |
+                    (sb[(s3 >> 8) & 0xFF] << 8) | sb[s0 & 0xFF]) ^ rk[41],
+                   ((sb[s2 >> 24] << 24) | (sb[(s3 >> 16) & 0xFF] << 16) |
+                    (sb[(s0 >> 8) & 0xFF] << 8) | sb[s1 & 0xFF]) ^ rk[42],
+                   ((sb[s3 >> 24] << 24) | (sb[(s0 >> 16) & 0xFF] << 16) |
+                    (sb[(s1 >> 8) & 0xFF] << 8) | sb[s2 & 0xFF]) ^ rk[43])
     
     # ============== RELLENO PKCS#7 ==============
     
@@ -313,53 +470,71 @@ class AES128:
         Returns:
             bytes cifrados
         """
-        # Convertir a bytes si es necesario
-        if isinstance(plaintext, list):
-            plaintext = bytes(plaintext)
-        
-        # Aplicar relleno
-        padded = self.pkcs7_pad(plaintext)
-        
-        # Cifrar bloque por bloque
-        ciphertext = b''
-        for i in range(0, len(padded), 16):
-            block = list(padded[i:i+16])
-            encrypted = self.encrypt_block(block, key)
-            ciphertext += bytes(encrypted)
-        
-        return ciphertext
+        return self.con_clave(key).encrypt_ecb(plaintext)
     
     def decrypt_ecb(self, ciphertext, key):
         """Descifra en modo ECB."""
-        if isinstance(ciphertext, list):
-            ciphertext = bytes(ciphertext)
-        
-        plaintext = b''
-        for i in range(0, len(ciphertext), 16):
-            block = list(ciphertext[i:i+16])
-            decrypted = self.decrypt_block(block, key)
-            plaintext += bytes(decrypted)
-        
-        return self.pkcs7_unpad(plaintext)
+        return self.con_clave(key).decrypt_ecb(ciphertext)
+    
+    def encrypt_into(self, buf_in, buf_out, key):
+        """Cifra en ECB sobre un buffer del llamador (ver AES128Contexto.encrypt_into)."""
+        return self.con_clave(key).encrypt_into(buf_in, buf_out)
+    
+    def decrypt_into(self, buf_in, buf_out, key):
+        """Descifra en ECB sobre un buffer del llamador (ver AES128Contexto.decrypt_into)."""
+        return self.con_clave(key).decrypt_into(buf_in, buf_out)
+    
+    # ============== MODOS CTR Y CBC ==============
+    
+    def encrypt_ctr(self, data, key, iv, desplazamiento=0, procesos=None):
+        """Cifra en modo CTR (ver AES128Contexto.encrypt_ctr)."""
+        return self.con_clave(key).encrypt_ctr(data, iv, desplazamiento, procesos)
+    
+    def decrypt_ctr(self, data, key, iv, desplazamiento=0, procesos=None):
+        """Descifra en modo CTR (misma operación que el cifrado)."""
+        return self.con_clave(key).decrypt_ctr(data, iv, desplazamiento, procesos)
+    
+    def encrypt_cbc(self, plaintext, key, iv):
+        """Cifra en modo CBC (ver AES128Contexto.encrypt_cbc)."""
+        return self.con_clave(key).encrypt_cbc(plaintext, iv)
+    
+    def decrypt_cbc(self, ciphertext, key, iv, procesos=None):
+        """Descifra en modo CBC (ver AES128Contexto.decrypt_cbc)."""
+        return self.con_clave(key).decrypt_cbc(ciphertext, iv, procesos)
     
     def decrypt_block(self, ciphertext, key):
         """Descifra un bloque de 16 bytes."""
-        round_keys = self.key_expansion(key)
-        state = self.bytes_to_matrix(ciphertext)
-        
-        state = self.add_round_key(state, round_keys[10])
+        salida = bytearray(16)
+        self._decrypt_block_into(bytes(ciphertext), 0, salida, 0, self.claves_de_ronda(key)[1])
+        return list(salida)
+    
+    def _decrypt_block_into(self, src, i, dst, j, dk):
+        """Descifra src[i:i+16] en dst[j:j+16] con T-tables inversas (cifrador inverso equivalente)."""
+        td0, td1, td2, td3 = self.tablas.td
         
-        for round_num in range(9, 0, -1):
-            state = self.inv_shift_rows(state)
-            state = self.inv_sub_bytes(state)
-            state = self.add_round_key(state, round_keys[round_num])
-            state = self.inv_mix_columns(state)
+        s0, s1, s2, s3 = _unpack_from(src, i)
+        s0 ^= dk[40]
+        s1 ^= dk[41]
+        s2 ^= dk[42]
+        s3 ^= dk[43]
         
-        state = self.inv_shift_rows(state)
-        state = self.inv_sub_bytes(state)
-        state = self.add_round_key(state, round_keys[0])
+        for k in range(36, 0, -4):
+            t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ dk[k]
+            t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ dk[k + 1]
+            t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ dk[k + 2]
+            t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ dk[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
         
-        return self.matrix_to_bytes(state)
+        isb = INV_SBOX
+        _pack_into(dst, j,
+                   ((isb[s0 >> 24] << 24) | (isb[(s3 >> 16) & 0xFF] << 16) |
+                    (isb[(s2 >> 8) & 0xFF] << 8) | isb[s1 & 0xFF]) ^ dk[0],
+                   ((isb[s1 >> 24] << 24) | (isb[(s0 >> 16) & 0xFF] << 16) |
+                    (isb[(s3 >> 8) & 0xFF] << 8) | isb[s2 & 0xFF]) ^ dk[1],
+                   ((isb[s2 >> 24] << 24) | (isb[(s1 >> 16) & 0xFF] << 16) |
+                    (isb[(s0 >> 8) & 0xFF] << 8) | isb[s3 & 0xFF]) ^ dk[2],
+                   ((isb[s3 >> 24] << 24) | (isb[(s2 >> 16) & 0xFF] << 16) |
+                    (isb[(s1 >> 8) & 0xFF] << 8) | isb[s0 & 0xFF]) ^ dk[3])
     
     def inv_sub_bytes(self, state):
         """Sustituye cada byte usando S-Box inversa."""
@@ -403,6 +578,490 @@ class AES128:
                 new_state[row][col] = mixed[row]
         return new_state
 
+# ============== CONTEXTO CON CLAVE ==============
+
+class AES128Contexto:
+    """
+    AES-128 ligado a una clave fija.
+    
+    Las claves de ronda se expanden una sola vez al crear el contexto,
+    en lugar de en cada bloque.
+    """
+    
+    def __init__(self, aes, key):
+        """
+        Args:
+            aes: Instancia AES128 (define el polinomio)
+            key: Lista o bytes de 16 bytes
+        """
+        self.aes = aes
+        self.clave = bytes(key)
+        self.claves_cifrado, self.claves_descifrado = aes.claves_de_ronda(self.clave)
+    
+    def encrypt_block(self, plaintext):
+        """Cifra un bloque de 16 bytes."""
+        salida = bytearray(16)
+        self.aes._encrypt_block_into(bytes(plaintext), 0, salida, 0, self.claves_cifrado)
+        return list(salida)
+    
+    def decrypt_block(self, ciphertext):
+        """Descifra un bloque de 16 bytes."""
+        salida = bytearray(16)
+        self.aes._decrypt_block_into(bytes(ciphertext), 0, salida, 0, self.claves_descifrado)
+        return list(salida)
+    
+    def encrypt_into(self, buf_in, buf_out):
+        """
+        Cifra en modo ECB escribiendo en un buffer del llamador (sin relleno).
+        
+        Args:
+            buf_in: bytes/bytearray/memoryview con longitud múltiplo de 16
+            buf_out: buffer escribible de al menos len(buf_in) bytes
+            
+        Returns:
+            Número de bytes escritos
+        """
+        return self._ecb_into(buf_in, buf_out, descifrar=False)
+    
+    def decrypt_into(self, buf_in, buf_out):
+        """Descifra en modo ECB escribiendo en un buffer del llamador (sin quitar relleno)."""
+        return self._ecb_into(buf_in, buf_out, descifrar=True)
+    
+    def _ecb_into(self, buf_in, buf_out, descifrar):
+        """Recorre los bloques leyendo y escribiendo directamente sobre los buffers."""
+        origen = memoryview(buf_in).cast('B')
+        destino = memoryview(buf_out).cast('B')
+        n = len(origen)
+        if n % 16:
+            raise ValueError("La longitud de entrada debe ser múltiplo de 16 bytes")
+        if len(destino) < n:
+            raise ValueError("El buffer de salida es demasiado pequeño")
+        
+        claves = self.claves_descifrado if descifrar else self.claves_cifrado
+        if self.aes.usar_numpy and n >= UMBRAL_NUMPY_BYTES:
+            funcion = _descifrar_bloques_numpy if descifrar else _cifrar_bloques_numpy
+            _ecb_numpy(funcion, self.aes.tablas, origen, destino[:n], claves)
+        else:
+            procesar = self.aes._decrypt_block_into if descifrar else self.aes._encrypt_block_into
+            for i in range(0, n, 16):
+                procesar(origen, i, destino, i, claves)
+        return n
+    
+    def encrypt_ecb(self, plaintext):
+        """Cifra en modo ECB (ver AES128.encrypt_ecb)."""
+        # Convertir a bytes si es necesario
+        if isinstance(plaintext, list):
+            plaintext = bytes(plaintext)
+        
+        # Los bloques completos se leen sin copiar; solo el último se rellena
+        origen = memoryview(plaintext).cast('B')
+        completos = len(origen) - len(origen) % 16
+        salida = bytearray(completos + 16)
+        destino = memoryview(salida)
+        
+        self.encrypt_into(origen[:completos], destino[:completos])
+        self.encrypt_into(self.aes.pkcs7_pad(origen[completos:].tobytes()), destino[completos:])
+        
+        return bytes(salida)
+    
+    def decrypt_ecb(self, ciphertext):
+        """Descifra en modo ECB."""
+        if isinstance(ciphertext, list):
+            ciphertext = bytes(ciphertext)
+        
+        salida = bytearray(len(ciphertext))
+        self.decrypt_into(ciphertext, salida)
+        
+        return self.aes.pkcs7_unpad(memoryview(salida)).tobytes()
+    
+    # ============== MODO CTR ==============
+    
+    def encrypt_ctr(self, data, iv, desplazamiento=0, procesos=None):
+        """
+        Cifra en modo CTR (sin relleno; la salida tiene la misma longitud).
+        
+        El bloque de contador j es E(iv + j) con iv como entero de 128 bits,
+        así que cualquier posición del flujo se calcula sin procesar las anteriores.
+        
+        Args:
+            data: bytes a cifrar
+            iv: Contador inicial de 16 bytes
+            desplazamiento: Posición en bytes de data dentro del flujo
+                            (permite descifrar un fragmento de un mensaje largo)
+            procesos: Si es > 1, reparte los buffers grandes en un pool de procesos
+            
+        Returns:
+            bytes cifrados
+        """
+        iv = _validar_iv(iv)
+        datos = _como_vista(data)
+        n = len(datos)
+        if _usar_paralelo(n, procesos):
+            tareas = [(self.aes.polinomio_index, self.clave, self.aes.usar_numpy,
+                       datos[inicio:fin].tobytes(), iv, desplazamiento + inicio)
+                      for inicio, fin in _particiones(n, procesos, 1)]
+            return _en_paralelo(_trabajo_ctr, tareas, procesos)
+        return _xor_buffers(datos, self._flujo_ctr(iv, desplazamiento, n))
+    
+    def decrypt_ctr(self, data, iv, desplazamiento=0, procesos=None):
+        """Descifra en modo CTR (misma operación que el cifrado)."""
+        return self.encrypt_ctr(data, iv, desplazamiento, procesos)
+    
+    def _flujo_ctr(self, iv, desplazamiento, n):
+        """n bytes del flujo de claves CTR a partir de 'desplazamiento'."""
+        primer_bloque, salto = divmod(desplazamiento, 16)
+        n_bloques = (salto + n + 15) // 16
+        base = int.from_bytes(iv, 'big') + primer_bloque
+        contadores = b''.join(((base + j) & _MASCARA_128).to_bytes(16, 'big')
+                              for j in range(n_bloques))
+        flujo = bytearray(len(contadores))
+        self.encrypt_into(contadores, flujo)
+        return memoryview(flujo)[salto:salto + n]
+    
+    # ============== MODO CBC ==============
+    
+    def encrypt_cbc(self, plaintext, iv):
+        """
+        Cifra en modo CBC con relleno PKCS#7.
+        
+        El cifrado es secuencial por definición (cada bloque depende del anterior).
+        """
+        iv = _validar_iv(iv)
+        padded = self.aes.pkcs7_pad(_como_vista(plaintext).tobytes())
+        salida = bytearray(len(padded))
+        bloque = bytearray(16)
+        rk = self.claves_cifrado
+        cifrar = self.aes._encrypt_block_into
+        
+        c0, c1, c2, c3 = _unpack_from(iv, 0)
+        for i in range(0, len(padded), 16):
+            p0, p1, p2, p3 = _unpack_from(padded, i)
+            _pack_into(bloque, 0, p0 ^ c0, p1 ^ c1, p2 ^ c2, p3 ^ c3)
+            cifrar(bloque, 0, salida, i, rk)
+            c0, c1, c2, c3 = _unpack_from(salida, i)
+        
+        return bytes(salida)
+    
+    def decrypt_cbc(self, ciphertext, iv, procesos=None):
+        """
+        Descifra en modo CBC y quita el relleno PKCS#7.
+        
+        Todos los bloques se descifran de forma independiente (P_i = D(C_i) XOR C_i-1),
+        así que el descifrado se vectoriza y puede repartirse entre procesos.
+        """
+        iv = _validar_iv(iv)
+        datos = _como_vista(ciphertext)
+        n = len(datos)
+        if n == 0 or n % 16:
+            raise ValueError("La longitud del texto cifrado debe ser múltiplo de 16 bytes")
+        
+        if _usar_paralelo(n, procesos):
+            tareas = [(self.aes.polinomio_index, self.clave, self.aes.usar_numpy,
+                       datos[inicio:fin].tobytes(),
+                       iv if inicio == 0 else datos[inicio - 16:inicio].tobytes())
+                      for inicio, fin in _particiones(n, procesos, 16)]
+            plano = _en_paralelo(_trabajo_cbc_descifrar, tareas, procesos)
+        else:
+            plano = self._descifrar_cbc_parte(datos, iv)
+        
+        return self.aes.pkcs7_unpad(plano)
+    
+    def _descifrar_cbc_parte(self, datos, anterior):
+        """Descifra bloques CBC consecutivos dado el bloque cifrado previo (o el IV)."""
+        intermedio = bytearray(len(datos))
+        self.decrypt_into(datos, intermedio)
+        return _xor_buffers(intermedio, anterior + datos[:-16].tobytes())
+    
+    def cifrador(self):
+        """Crea un CifradorECB incremental con esta clave."""
+        return CifradorECB(self)
+    
+    def descifrador(self):
+        """Crea un DescifradorECB incremental con esta clave."""
+        return DescifradorECB(self)
+
+
+# ============== UTILIDADES DE MODOS Y PARALELISMO ==============
+
+_MASCARA_128 = (1 << 128) - 1
+
+# Tamaño mínimo de cada parte para que compense enviarla a otro proceso
+TAM_MIN_PARALELO = 256 * 1024
+
+
+def _como_vista(data):
+    """memoryview de bytes sobre listas, bytes, bytearray o memoryview."""
+    if isinstance(data, list):
+        data = bytes(data)
+    return memoryview(data).cast('B')
+
+
+def _validar_iv(iv):
+    """Valida que el IV/contador tenga 16 bytes y lo retorna como bytes."""
+    iv = bytes(iv)
+    if len(iv) != 16:
+        raise ValueError("El IV debe tener 16 bytes")
+    return iv
+
+
+def _xor_buffers(a, b):
+    """XOR de dos buffers de igual longitud (vía enteros grandes, en tiempo lineal)."""
+    n = len(a)
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(n, 'big')
+
+
+def _usar_paralelo(n, procesos):
+    """Indica si conviene repartir n bytes entre 'procesos' procesos."""
+    return bool(procesos) and procesos > 1 and n >= 2 * TAM_MIN_PARALELO
+
+
+def _particiones(n, procesos, alineacion):
+    """Divide [0, n) en partes contiguas (múltiplos de 'alineacion') para cada proceso."""
+    tam = max(TAM_MIN_PARALELO, -(-n // procesos))
+    tam += -tam % alineacion
+    return [(inicio, min(inicio + tam, n)) for inicio in range(0, n, tam)]
+
+
+def _en_paralelo(funcion, tareas, procesos):
+    """Ejecuta las tareas en un pool de procesos y concatena los resultados en orden."""
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = [pool.submit(funcion, *tarea) for tarea in tareas]
+        return b''.join(futuro.result() for futuro in futuros)
+
+
+def _trabajo_ctr(polinomio_index, clave, usar_numpy, datos, iv, desplazamiento):
+    """Tarea de proceso: CTR sobre una parte del flujo."""
+    contexto = AES128(polinomio_index, usar_numpy).con_clave(clave)
+    return contexto.encrypt_ctr(datos, iv, desplazamiento)
+
+
+def _trabajo_cbc_descifrar(polinomio_index, clave, usar_numpy, datos, anterior):
+    """Tarea de proceso: descifrado CBC de una parte, sin quitar relleno."""
+    contexto = AES128(polinomio_index, usar_numpy).con_clave(clave)
+    return contexto._descifrar_cbc_parte(memoryview(datos), anterior)
+
+
+# ============== CIFRADO INCREMENTAL (STREAMING) ==============
+
+# Tamaño de lectura por defecto para archivos
+TAM_CHUNK_STREAM = 1024 * 1024
+
+
+class _ProcesadorECB(ABC):
+    """
+    Base del cifrado/descifrado incremental.
+    
+    update() procesa los bloques completos disponibles y guarda el resto
+    (menos de 16 bytes, o el último bloque al descifrar) hasta la siguiente
+    llamada; finalize() procesa lo pendiente con el relleno PKCS#7.
+    """
+    
+    # Al descifrar se conserva siempre el último bloque (contiene el relleno)
+    RESERVAR_ULTIMO_BLOQUE = False
+    
+    def __init__(self, contexto):
+        self.contexto = contexto
+        self._pendiente = b''
+        self._finalizado = False
+    
+    @abstractmethod
+    def _procesar_bloques(self, buf_in, buf_out):
+        """Procesa los bloques completos de buf_in y escribe el resultado en buf_out."""
+    
+    def update(self, data):
+        """
+        Procesa un fragmento de datos.
+        
+        Returns:
+            bytes procesados hasta ahora (puede ser b'' si no hay bloques completos)
+        """
+        if self._finalizado:
+            raise ValueError("El procesador ya fue finalizado")
+        
+        vista = memoryview(data).cast('B')
+        total = len(self._pendiente) + len(vista)
+        resto = total % 16
+        if self.RESERVAR_ULTIMO_BLOQUE and resto == 0:
+            resto = 16
+        n = max(total - resto, 0)
+        if n == 0:
+            self._pendiente += vista.tobytes()
+            return b''
+        
+        salida = bytearray(n)
+        destino = memoryview(salida)
+        inicio = 0
+        if self._pendiente:
+            # Completar el bloque pendiente con el inicio del fragmento
+            inicio = 16 - len(self._pendiente)
+            self._procesar_bloques(self._pendiente + vista[:inicio].tobytes(), destino[:16])
+            destino = destino[16:]
+        fin = inicio + len(destino)
+        self._procesar_bloques(vista[inicio:fin], destino)
+        self._pendiente = vista[fin:].tobytes()
+        
+        return bytes(salida)
+    
+    def finalize(self):
+        """Procesa el último bloque y cierra el procesador."""
+        if self._finalizado:
+            raise ValueError("El procesador ya fue finalizado")
+        self._finalizado = True
+        return self._finalizar(self._pendiente)
+    
+    @abstractmethod
+    def _finalizar(self, pendiente):
+        """Procesa lo pendiente al cerrar (relleno PKCS#7) y retorna los últimos bytes."""
+
+
+class CifradorECB(_ProcesadorECB):
+    """Cifrado ECB incremental; finalize() aplica el relleno PKCS#7."""
+    
+    def _procesar_bloques(self, buf_in, buf_out):
+        self.contexto.encrypt_into(buf_in, buf_out)
+    
+    def _finalizar(self, pendiente):
+        ultimo = self.contexto.aes.pkcs7_pad(pendiente)
+        salida = bytearray(16)
+        self.contexto.encrypt_into(ultimo, salida)
+        return bytes(salida)
+
+
+class DescifradorECB(_ProcesadorECB):
+    """Descifrado ECB incremental; finalize() quita el relleno PKCS#7."""
+    
+    RESERVAR_ULTIMO_BLOQUE = True
+    
+    def _procesar_bloques(self, buf_in, buf_out):
+        self.contexto.decrypt_into(buf_in, buf_out)
+    
+    def _finalizar(self, pendiente):
+        if len(pendiente) != 16:
+            raise ValueError("Texto cifrado incompleto: la longitud no es múltiplo de 16 bytes")
+        salida = bytearray(16)
+        self.contexto.decrypt_into(pendiente, salida)
+        return bytes(self.contexto.aes.pkcs7_unpad(salida))
+
+
+def cifrar_stream(contexto, archivo, tam_chunk=TAM_CHUNK_STREAM):
+    """
+    Cifra un archivo por fragmentos con memoria acotada.
+    
+    Args:
+        contexto: AES128Contexto con la clave
+        archivo: Objeto tipo archivo binario (con read())
+        tam_chunk: Bytes leídos por iteración
+        
+    Yields:
+        Fragmentos cifrados; concatenados equivalen a encrypt_ecb del contenido
+    """
+    cifrador = contexto.cifrador()
+    while True:
+        chunk = archivo.read(tam_chunk)
+        if not chunk:
+            break
+        salida = cifrador.update(chunk)
+        if salida:
+            yield salida
+    yield cifrador.finalize()
+
+
+def descifrar_stream(contexto, archivo, tam_chunk=TAM_CHUNK_STREAM):
+    """Descifra un archivo por fragmentos (inverso de cifrar_stream)."""
+    descifrador = contexto.descifrador()
+    while True:
+        chunk = archivo.read(tam_chunk)
+        if not chunk:
+            break
+        salida = descifrador.update(chunk)
+        if salida:
+            yield salida
+    final = descifrador.finalize()
+    if final:
+        yield final
+
+
+# ============== MOTOR VECTORIZADO (NUMPY) ==============
+
+# Por debajo de este tamaño el coste fijo de NumPy supera al del motor puro
+UMBRAL_NUMPY_BYTES = 512
+# Bloques procesados por lote, para acotar la memoria de los temporales
+BLOQUES_POR_LOTE_NUMPY = 65536
+
+
+def _round_keys_numpy(palabras):
+    """Claves de ronda (44 palabras) como array (11, 16) en el orden del bloque plano."""
+    return np.frombuffer(struct.pack('>44I', *palabras), dtype=np.uint8).reshape(11, 16)
+
+
+def _rondas_numpy(estado, t_tables, caja, permutacion, claves_ronda, clave_final):
+    """
+    Rondas con T-tables sobre todos los bloques a la vez.
+    
+    Cada ronda: permutación de ShiftRows, 4 consultas de T-table por columna
+    (palabras big-endian, fila 0 en el byte alto) y AddRoundKey.
+    """
+    t0, t1, t2, t3 = t_tables
+    for clave in claves_ronda:
+        b = estado[:, permutacion].reshape(-1, 4, 4)  # [bloque][columna][fila]
+        palabras = t0[b[:, :, 0]] ^ t1[b[:, :, 1]] ^ t2[b[:, :, 2]] ^ t3[b[:, :, 3]]
+        estado = np.ascontiguousarray(palabras, dtype='>u4').view(np.uint8).reshape(-1, 16)
+        estado ^= clave
+    # Ronda final (sin MixColumns)
+    estado = caja[estado[:, permutacion]]
+    estado ^= clave_final
+    return estado
+
+
+def _cifrar_bloques_numpy(tablas, bloques, rk):
+    """Cifra un array (N, 16) de bloques independientes."""
+    t = tablas.numpy()
+    return _rondas_numpy(bloques ^ rk[0], t['te'], t['sbox'], SHIFT_ROWS_IDX, rk[1:10], rk[10])
+
+
+def _descifrar_bloques_numpy(tablas, bloques, dk):
+    """Descifra un array (N, 16) de bloques (cifrador inverso equivalente)."""
+    t = tablas.numpy()
+    return _rondas_numpy(bloques ^ dk[10], t['td'], t['inv_sbox'], INV_SHIFT_ROWS_IDX, dk[9:0:-1], dk[0])
+
+
+def _ecb_numpy(funcion, tablas, buf_in, buf_out, palabras):
+    """Aplica el motor vectorizado a todo el buffer, por lotes de bloques."""
+    bloques = np.frombuffer(buf_in, dtype=np.uint8).reshape(-1, 16)
+    salida = np.frombuffer(buf_out, dtype=np.uint8).reshape(-1, 16)
+    rk = _round_keys_numpy(palabras)
+    for i in range(0, len(bloques), BLOQUES_POR_LOTE_NUMPY):
+        salida[i:i + BLOQUES_POR_LOTE_NUMPY] = funcion(tablas, bloques[i:i + BLOQUES_POR_LOTE_NUMPY], rk)
+
+
+# ============== CACHÉ DE CLAVES DE RONDA ==============
+
+TAM_CACHE_CLAVES = 64
+
+
+@lru_cache(maxsize=TAM_CACHE_CLAVES)
+def _claves_de_ronda_cache(polinomio_index, clave):
+    """Expande la clave (cifrado y descifrado) para un polinomio; resultado cacheado."""
+    aes = AES128(polinomio_index)
+    return tuple(aes.key_expansion_words(clave)), tuple(aes.inv_key_expansion_words(clave))
+
+
+def estadisticas_cache_claves():
+    """Contadores de la caché de claves de ronda (aciertos, fallos, tamaño)."""
+    info = _claves_de_ronda_cache.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'tamano': info.currsize,
+        'maximo': info.maxsize
+    }
+
+
+def limpiar_cache_claves():
+    """Vacía la caché de claves de ronda y reinicia sus contadores."""
+    _claves_de_ronda_cache.cache_clear()
+
+
 # ============== FUNCIONES DE UTILIDAD ==============
 
 def calcular_polinomio(codigos):
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+Almacenamiento persistente de cadenas (log de solo-anexado)
+
+- Un directorio por cadena: meta.json + bloques.log + bloques.idx, y la
+  clave privada del interventor aparte en clave.json (permisos 0600)
+- Registro: longitud (4 bytes) + datos + CRC32 de los datos (4 bytes)
+- Índice de offsets (8 bytes por bloque) para leer cualquier bloque en O(1)
+- fsync por lotes: cada FSYNC_LOTE registros o FSYNC_INTERVALO segundos
+- Recuperación: al abrir se trunca el registro final incompleto o corrupto
+- Varios procesos (workers de uvicorn) pueden compartir el directorio: las
+  escrituras de cada cadena se serializan con un candado de archivo, los ids
+  nuevos se reservan con mkdir (atómico) y cada proceso incorpora al leer los
+  bloques que anexaron los demás
+"""
+
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Registros por fsync y segundos máximos sin sincronizar
+FSYNC_LOTE = int(os.getenv("FSYNC_LOTE", "8"))
+FSYNC_INTERVALO = float(os.getenv("FSYNC_INTERVALO", "1.0"))
+# Bloques decodificados que se mantienen en memoria por cadena
+TAM_CACHE_BLOQUES = int(os.getenv("TAM_CACHE_BLOQUES", "256"))
+
+MAGIA_LOG = b"TBLOG\x00\x00\x01"
+TAM_MAX_REGISTRO = 64 * 1024 * 1024
+
+_LONGITUD = struct.Struct(">I")
+_CRC = struct.Struct(">I")
+_OFFSET = struct.Struct(">Q")
+
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9_-]+$")
+# Permisos de los archivos con datos de la cadena (solo el dueño)
+MODO_ARCHIVOS = 0o600
+
+
+def _escribir_json_atomico(ruta, datos, modo=MODO_ARCHIVOS):
+    """Escribe un JSON con fsync y os.replace; el archivo se crea ya con 'modo'."""
+    temporal = ruta + ".tmp"
+    try:
+        # Un temporal que quedó de un intento anterior conservaría sus permisos
+        os.remove(temporal)
+    except FileNotFoundError:
+        pass
+    fd = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_EXCL, modo)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class RegistroCorruptoError(Exception):
+    """Un registro del log no coincide con su checksum."""
+
+
+# ============== CANDADOS ENTRE PROCESOS ==============
+def _bloquear(archivo):
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+        return
+    archivo.seek(0)
+    while True:
+        try:
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK se rinde después de ~10 s: se reintenta
+            continue
+
+
+def _desbloquear(archivo):
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CandadoArchivo:
+    """
+    Candado reentrante: un RLock entre los hilos del proceso y un bloqueo
+    exclusivo del archivo 'ruta' entre procesos. Se usa como 'with candado:'.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._hilos = threading.RLock()
+        self._profundidad = 0
+        self._archivo = None
+
+    def __enter__(self):
+        self._hilos.acquire()
+        if self._profundidad == 0:
+            try:
+                archivo = open(self.ruta, 'a+b')
+                try:
+                    _bloquear(archivo)
+                except BaseException:
+                    archivo.close()
+                    raise
+            except BaseException:
+                self._hilos.release()
+                raise
+            self._archivo = archivo
+        self._profundidad += 1
+        return self
+
+    def __exit__(self, *excepcion):
+        self._profundidad -= 1
+        if self._profundidad == 0:
+            archivo, self._archivo = self._archivo, None
+            try:
+                _desbloquear(archivo)
+            finally:
+                archivo.close()
+        self._hilos.release()
+
+
+class CandadosCadenas:
+    """Un CandadoArchivo por cadena: <directorio>/<id>.lock (compartido por los procesos)."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._candados = {}
+        self._candado = threading.Lock()
+
+    def obtener(self, cadena_id):
+        if not _ID_VALIDO.match(cadena_id):
+            raise ValueError(f"Identificador de cadena inválido: {cadena_id!r}")
+        with self._candado:
+            candado = self._candados.get(cadena_id)
+            if candado is None:
+                candado = self._candados[cadena_id] = CandadoArchivo(
+                    os.path.join(self.directorio, f"{cadena_id}.lock"))
+            return candado
+
+
+# ============== LOG DE BLOQUES ==============
+class LogBloques:
+    """
+    Archivo de solo-anexado con registros de longitud prefijada y CRC32,
+    más un archivo de índice con el offset de cada registro.
+    """
+
+    def __init__(self, ruta_log, ruta_idx, fsync_lote=FSYNC_LOTE,
+                 fsync_intervalo=FSYNC_INTERVALO):
+        self.ruta_log = ruta_log
+        self.ruta_idx = ruta_idx
+        self.fsync_lote = fsync_lote
+        self.fsync_intervalo = fsync_intervalo
+        self._candado = threading.RLock()
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+        self._temporizador = None
+
+        self._log = open(ruta_log, 'r+b' if os.path.exists(ruta_log) else 'w+b')
+        self._idx = open(ruta_idx, 'r+b' if os.path.exists(ruta_idx) else 'w+b')
+        self._offsets = array('Q')
+        self._recuperar()
+
+    # ---------- Recuperación ----------
+    def _recuperar(self):
+        """Carga el índice y descarta lo que haya quedado a medio escribir."""
+        self._log.seek(0, os.SEEK_END)
+        tamano = self._log.tell()
+        if tamano < len(MAGIA_LOG):
+            # Log vacío (o cortado antes de escribir la cabecera)
+            self._log.seek(0)
+            self._log.truncate()
+            self._log.write(MAGIA_LOG)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            tamano = len(MAGIA_LOG)
+        else:
+            self._log.seek(0)
+            if self._log.read(len(MAGIA_LOG)) != MAGIA_LOG:
+                raise RegistroCorruptoError(f"{self.ruta_log} no es un log de bloques")
+
+        self._idx.seek(0)
+        datos_idx = self._idx.read()
+        tam_idx = len(datos_idx)
+        datos_idx = datos_idx[:tam_idx - tam_idx % _OFFSET.size]
+        offsets = array('Q', (o for (o,) in _OFFSET.iter_unpack(datos_idx)))
+        indice_original = len(offsets)
+
+        # El índice se escribe después del log: sus últimas entradas pueden
+        # apuntar a registros que no llegaron a disco
+        while offsets and offsets[-1] >= tamano:
+            offsets.pop()
+        fin = len(MAGIA_LOG)
+        while offsets:
+            fin_registro = self._fin_registro_valido(offsets[-1], tamano)
+            if fin_registro is not None:
+                fin = fin_registro
+                break
+            offsets.pop()
+
+        # Registros escritos en el log pero no en el índice
+        while fin < tamano:
+            fin_registro = self._fin_registro_valido(fin, tamano)
+            if fin_registro is None:
+                break
+            offsets.append(fin)
+            fin = fin_registro
+
+        if fin < tamano:
+            print(f"⚠️ {self.ruta_log}: se descartan {tamano - fin} bytes de un registro incompleto")
+            self._log.truncate(fin)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+        if len(offsets) != indice_original or len(datos_idx) != tam_idx:
+            self._idx.seek(0)
+            self._idx.truncate()
+            self._idx.write(b"".join(_OFFSET.pack(o) for o in offsets))
+            self._idx.flush()
+            os.fsync(self._idx.fileno())
+
+        self._offsets = offsets
+        self._fin = fin
+
+    def _fin_registro_valido(self, offset, tamano):
+        """Fin del registro en 'offset' si está completo y su CRC coincide; si no, None."""
+        if offset + _LONGITUD.size > tamano:
+            return None
+        self._log.seek(offset)
+        (longitud,) = _LONGITUD.unpack(self._log.read(_LONGITUD.size))
+        fin = offset + _LONGITUD.size + longitud + _CRC.size
+        if longitud > TAM_MAX_REGISTRO or fin > tamano:
+            return None
+        datos = self._log.read(longitud)
+        (crc,) = _CRC.unpack(self._log.read(_CRC.size))
+        return fin if zlib.crc32(datos) == crc else None
+
+    def _refrescar(self):
+        """Incorpora los registros que otro proceso anexó desde la última lectura del índice."""
+        conocidos = len(self._offsets)
+        total = os.fstat(self._idx.fileno()).st_size // _OFFSET.size
+        if total <= conocidos:
+            return
+        # El índice se escribe después del registro: cada offset nuevo apunta a un registro completo
+        self._idx.seek(conocidos * _OFFSET.size)
+        datos = self._idx.read((total - conocidos) * _OFFSET.size)
+        nuevos = [o for (o,) in _OFFSET.iter_unpack(datos[:len(datos) - len(datos) % _OFFSET.size])]
+        if not nuevos:
+            return
+        self._log.seek(nuevos[-1])
+        (longitud,) = _LONGITUD.unpack(self._log.read(_LONGITUD.size))
+        self._offsets.extend(nuevos)
+        self._fin = nuevos[-1] + _LONGITUD.size + longitud + _CRC.size
+
+    # ---------- Lectura / escritura ----------
+    def __len__(self):
+        with self._candado:
+            self._refrescar()
+            return len(self._offsets)
+
+    def leer(self, indice):
+        """Datos del registro 'indice' (acceso directo por el índice de offsets)."""
+        with self._candado:
+            offset = self._offsets[indice]
+            self._log.seek(offset)
+            (longitud,) = _LONGITUD.unpack(self._log.read(_LONGITUD.size))
+            datos = self._log.read(longitud)
+            (crc,) = _CRC.unpack(self._log.read(_CRC.size))
+        if zlib.crc32(datos) != crc:
+            raise RegistroCorruptoError(f"{self.ruta_log}: checksum inválido en el registro {indice}")
+        return datos
+
+    def agregar(self, datos):
+        """Anexa un registro y retorna su índice; sincroniza a disco por lotes."""
+        if len(datos) > TAM_MAX_REGISTRO:
+            raise ValueError("Registro demasiado grande")
+        registro = _LONGITUD.pack(len(datos)) + datos + _CRC.pack(zlib.crc32(datos))
+        with self._candado:
+            # Quien escribe tiene el candado de la cadena (ver AlmacenCadenas.candado)
+            self._refrescar()
+            offset = self._fin
+            self._log.seek(offset)
+            self._log.write(registro)
+            self._log.flush()
+            self._idx.seek(0, os.SEEK_END)
+            self._idx.write(_OFFSET.pack(offset))
+            self._idx.flush()
+            self._offsets.append(offset)
+            self._fin = offset + len(registro)
+
+            self._pendientes += 1
+            if (self._pendientes >= self.fsync_lote or
+                    time.monotonic() - self._ultimo_fsync >= self.fsync_intervalo):
+                self._sincronizar()
+            elif self._temporizador is None:
+                # Acota el tiempo que un registro puede quedar sin fsync
+                self._temporizador = threading.Timer(self.fsync_intervalo, self.sincronizar)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+            return len(self._offsets) - 1
+
+    def sincronizar(self):
+        """fsync del log y del índice si hay registros pendientes."""
+        with self._candado:
+            if self._pendientes and not self._log.closed:
+                self._sincronizar()
+
+    def _sincronizar(self):
+        os.fsync(self._log.fileno())
+        os.fsync(self._idx.fileno())
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def cerrar(self):
+        with self._candado:
+            if self._log.closed:
+                return
+            self.sincronizar()
+            self._log.close()
+            self._idx.close()
+
+
+# ============== CADENA PERSISTENTE ==============
+class CadenaConCache(Sequence):
+    """
+    Lista de bloques respaldada por un almacén, con una caché LRU de bloques
+    decodificados: la memoria no crece con el largo de la cadena.
+
+    Las subclases implementan __len__, _leer(indice) y _agregar(bloque) -> indice.
+    Si se asigna, al_leer(bloque) se llama con cada bloque leído del almacén.
+    """
+
+    def __init__(self, tam_cache=TAM_CACHE_BLOQUES):
+        self.tam_cache = tam_cache
+        self._cache = OrderedDict()
+        self.al_leer = None
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError("Índice de bloque fuera de rango")
+        bloque = self._cache.get(indice)
+        if bloque is None:
+            bloque = self._leer(indice)
+            if self.al_leer is not None:
+                self.al_leer(bloque)
+            self._guardar_en_cache(indice, bloque)
+        else:
+            self._cache.move_to_end(indice)
+        return bloque
+
+    def append(self, bloque):
+        self._guardar_en_cache(self._agregar(bloque), bloque)
+
+    def _guardar_en_cache(self, indice, bloque):
+        self._cache[indice] = bloque
+        if len(self._cache) > self.tam_cache:
+            self._cache.popitem(last=False)
+
+    def cerrar(self):
+        pass
+
+
+class CadenaPersistente(CadenaConCache):
+    """Cadena sobre un LogBloques; cada bloque se guarda como JSON de a_dict(bloque)."""
+
+    def __init__(self, log, a_dict, desde_dict, tam_cache=TAM_CACHE_BLOQUES):
+        super().__init__(tam_cache)
+        self.log = log
+        self.a_dict = a_dict
+        self.desde_dict = desde_dict
+
+    def __len__(self):
+        return len(self.log)
+
+    def _leer(self, indice):
+        return self.desde_dict(json.loads(self.log.leer(indice)))
+
+    def _agregar(self, bloque):
+        return self.log.agregar(json.dumps(self.a_dict(bloque)).encode('utf-8'))
+
+    def cerrar(self):
+        self.log.cerrar()
+
+
+# ============== DIRECTORIO DE CADENAS ==============
+class AlmacenCadenas:
+    """
+    Directorio con una subcarpeta por cadena (meta.json, clave.json, bloques.log,
+    bloques.idx).
+
+    a_dict / desde_dict convierten un bloque a un dict serializable y de vuelta.
+    """
+
+    def __init__(self, directorio, a_dict, desde_dict):
+        self.directorio = directorio
+        self.a_dict = a_dict
+        self.desde_dict = desde_dict
+        os.makedirs(directorio, exist_ok=True)
+        # Ids reservados (nunca se reutilizan) y candados por cadena;
+        # los nombres con punto no son ids válidos y no se listan como cadenas
+        self._dir_ids = os.path.join(directorio, ".ids")
+        os.makedirs(self._dir_ids, exist_ok=True)
+        self.candados = CandadosCadenas(os.path.join(directorio, ".candados"))
+
+    def _ruta(self, cadena_id, archivo=""):
+        if not _ID_VALIDO.match(cadena_id):
+            raise ValueError(f"Identificador de cadena inválido: {cadena_id!r}")
+        return os.path.join(self.directorio, cadena_id, archivo)
+
+    def ids(self):
+        """Cadenas guardadas (solo lista directorios; no lee los logs)."""
+        return sorted(
+            nombre for nombre in os.listdir(self.directorio)
+            if _ID_VALIDO.match(nombre) and os.path.exists(self._ruta(nombre, "meta.json"))
+        )
+
+    def existe(self, cadena_id):
+        return _ID_VALIDO.match(cadena_id) is not None and \
+            os.path.exists(self._ruta(cadena_id, "meta.json"))
+
+    def reservar_id(self, prefijo="bc_"):
+        """Id nuevo, distinto del de cualquier otro proceso (mkdir es atómico)."""
+        n = len(os.listdir(self._dir_ids))
+        while True:
+            cadena_id = f"{prefijo}{n}"
+            n += 1
+            try:
+                os.mkdir(os.path.join(self._dir_ids, cadena_id))
+            except FileExistsError:
+                continue
+            # Cadenas guardadas antes de reservar ids
+            if not self.existe(cadena_id):
+                return cadena_id
+
+    def candado(self, cadena_id):
+        """Candado de las escrituras de la cadena, compartido entre procesos."""
+        return self.candados.obtener(cadena_id)
+
+    def crear(self, cadena_id, meta, bloques=(), clave=None):
+        """
+        Crea la carpeta de la cadena con sus bloques iniciales, escribe la clave
+        privada (si hay) en clave.json y meta.json, y retorna la cadena.
+        """
+        os.makedirs(self._ruta(cadena_id), exist_ok=True)
+        cadena = self._abrir_cadena(cadena_id)
+        for bloque in bloques:
+            cadena.append(bloque)
+        cadena.log.sincronizar()
+        if clave is not None:
+            _escribir_json_atomico(self._ruta(cadena_id, "clave.json"), clave)
+        # meta.json se escribe al final y de forma atómica: marca la cadena como
+        # existente (los demás procesos nunca la ven sin su bloque génesis)
+        _escribir_json_atomico(self._ruta(cadena_id, "meta.json"), meta)
+        return cadena
+
+    def abrir(self, cadena_id):
+        """Retorna (meta, cadena) de una cadena guardada."""
+        with open(self._ruta(cadena_id, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta, self._abrir_cadena(cadena_id)
+
+    def leer_clave(self, cadena_id):
+        """Clave privada guardada con la cadena (None si es de solo verificación)."""
+        try:
+            with open(self._ruta(cadena_id, "clave.json"), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _abrir_cadena(self, cadena_id):
+        # La recuperación puede truncar el log: no debe correr mientras otro proceso escribe
+        with self.candado(cadena_id):
+            log = LogBloques(self._ruta(cadena_id, "bloques.log"),
+                             self._ruta(cadena_id, "bloques.idx"))
+        return CadenaPersistente(log, self.a_dict, self.desde_dict)
+
+    def eliminar(self, cadena_id):
+        shutil.rmtree(self._ruta(cadena_id), ignore_errors=True)
+
+    def cerrar(self):
+        pass
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén de cadenas en SQLite (alternativa al log por cadena)
+
+- Tablas 'cadenas' y 'bloques' con índices por id de cadena, hash_actual,
+  hash_anterior, hash_codigo y etapa
+- Modo WAL: los workers leen en paralelo mientras otro escribe
+- Pool de conexiones compartido por los hilos del proceso
+- Varios procesos pueden compartir la base: ids nuevos desde una tabla con
+  AUTOINCREMENT y candados de archivo por cadena junto a la base
+- Las claves privadas van en su propia tabla (no en la meta que devuelven las
+  búsquedas) y la base se crea legible solo por su dueño (0600)
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from almacenamiento import MODO_ARCHIVOS, TAM_CACHE_BLOQUES, CadenaConCache, CandadosCadenas
+
+# Conexiones abiertas como máximo por proceso
+TAM_POOL_SQLITE = int(os.getenv("TAM_POOL_SQLITE", "4"))
+# Resultados máximos de una búsqueda
+LIMITE_BUSQUEDA = 100
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cadenas (
+    id TEXT PRIMARY KEY,
+    meta TEXT NOT NULL,
+    num_bloques INTEGER NOT NULL DEFAULT 0,
+    etapa_actual INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_cadenas_etapa ON cadenas (etapa_actual);
+
+CREATE TABLE IF NOT EXISTS bloques (
+    cadena_id TEXT NOT NULL,
+    indice INTEGER NOT NULL,
+    etapa_actual INTEGER NOT NULL,
+    hash_actual TEXT NOT NULL,
+    hash_anterior TEXT NOT NULL,
+    hash_codigo TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    PRIMARY KEY (cadena_id, indice)
+);
+CREATE INDEX IF NOT EXISTS idx_bloques_hash_actual ON bloques (hash_actual);
+CREATE INDEX IF NOT EXISTS idx_bloques_hash_anterior ON bloques (hash_anterior);
+CREATE INDEX IF NOT EXISTS idx_bloques_hash_codigo ON bloques (hash_codigo);
+CREATE INDEX IF NOT EXISTS idx_bloques_etapa ON bloques (etapa_actual);
+
+CREATE TABLE IF NOT EXISTS claves (
+    cadena_id TEXT PRIMARY KEY,
+    clave TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ids_reservados (
+    n INTEGER PRIMARY KEY AUTOINCREMENT
+);
+"""
+
+# Columnas por las que se puede buscar un bloque
+CAMPOS_BUSQUEDA = ('hash_actual', 'hash_anterior', 'hash_codigo', 'etapa_actual')
+
+
+# ============== POOL DE CONEXIONES ==============
+class PoolConexiones:
+    """Pool de conexiones SQLite (WAL, autocommit, transacciones explícitas)."""
+
+    def __init__(self, ruta, tamano=TAM_POOL_SQLITE):
+        self.ruta = ruta
+        self.tamano = tamano
+        self._libres = queue.LifoQueue()
+        self._creadas = 0
+        self._candado = threading.Lock()
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None,
+                              check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    @contextmanager
+    def conexion(self):
+        """Toma una conexión libre (o crea una si no se alcanzó el tamaño del pool)."""
+        try:
+            con = self._libres.get_nowait()
+        except queue.Empty:
+            with self._candado:
+                crear = self._creadas < self.tamano
+                if crear:
+                    self._creadas += 1
+            con = self._conectar() if crear else self._libres.get()
+        try:
+            yield con
+        finally:
+            self._libres.put(con)
+
+    @contextmanager
+    def transaccion(self):
+        """Conexión dentro de BEGIN IMMEDIATE ... COMMIT (ROLLBACK si hay error)."""
+        with self.conexion() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+        self._creadas = 0
+
+
+# ============== CADENA EN SQLITE ==============
+class CadenaSQLite(CadenaConCache):
+    """Cadena cuyos bloques son filas de la tabla 'bloques'."""
+
+    def __init__(self, almacen, cadena_id, tam_cache=TAM_CACHE_BLOQUES):
+        super().__init__(tam_cache)
+        self.almacen = almacen
+        self.cadena_id = cadena_id
+
+    def __len__(self):
+        with self.almacen.pool.conexion() as con:
+            fila = con.execute("SELECT num_bloques FROM cadenas WHERE id = ?",
+                               (self.cadena_id,)).fetchone()
+        return fila[0] if fila else 0
+
+    def _leer(self, indice):
+        with self.almacen.pool.conexion() as con:
+            (datos,) = con.execute(
+                "SELECT datos FROM bloques WHERE cadena_id = ? AND indice = ?",
+                (self.cadena_id, indice)).fetchone()
+        return self.almacen.desde_dict(json.loads(datos))
+
+    def _agregar(self, bloque):
+        with self.almacen.pool.transaccion() as con:
+            (indice,) = con.execute("SELECT num_bloques FROM cadenas WHERE id = ?",
+                                    (self.cadena_id,)).fetchone()
+            _insertar_bloque(con, self.cadena_id, indice, self.almacen.a_dict(bloque))
+        return indice
+
+
+def _insertar_bloque(con, cadena_id, indice, datos):
+    """Inserta el bloque 'indice' y actualiza el resumen de la cadena (dentro de una transacción)."""
+    con.execute(
+        "INSERT INTO bloques (cadena_id, indice, etapa_actual, hash_actual,"
+        " hash_anterior, hash_codigo, datos) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (cadena_id, indice, datos['etapa_actual'], datos['hash_actual'],
+         datos['hash_anterior'], datos['hash_codigo'], json.dumps(datos)))
+    con.execute("UPDATE cadenas SET num_bloques = ?, etapa_actual = ? WHERE id = ?",
+                (indice + 1, datos['etapa_actual'], cadena_id))
+
+
+# ============== ALMACÉN ==============
+class AlmacenSQLite:
+    """
+    Mismo contrato que almacenamiento.AlmacenCadenas, más búsquedas indexadas.
+
+    a_dict / desde_dict convierten un bloque a un dict serializable y de vuelta;
+    el dict debe incluir etapa_actual, hash_actual, hash_anterior y hash_codigo.
+    """
+
+    def __init__(self, ruta, a_dict, desde_dict, tam_pool=TAM_POOL_SQLITE):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.a_dict = a_dict
+        self.desde_dict = desde_dict
+        # Los -wal y -shm de SQLite heredan los permisos de la base
+        os.close(os.open(ruta, os.O_WRONLY | os.O_CREAT, MODO_ARCHIVOS))
+        os.chmod(ruta, MODO_ARCHIVOS)
+        self.pool = PoolConexiones(ruta, tam_pool)
+        with self.pool.conexion() as con:
+            con.executescript(_ESQUEMA)
+        self.candados = CandadosCadenas(os.path.join(directorio, ".candados"))
+
+    def ids(self):
+        with self.pool.conexion() as con:
+            return [fila[0] for fila in con.execute("SELECT id FROM cadenas ORDER BY id")]
+
+    def existe(self, cadena_id):
+        with self.pool.conexion() as con:
+            return con.execute("SELECT 1 FROM cadenas WHERE id = ?",
+                               (cadena_id,)).fetchone() is not None
+
+    def reservar_id(self, prefijo="bc_"):
+        """Id nuevo, distinto del de cualquier otro proceso (AUTOINCREMENT no reutiliza)."""
+        while True:
+            with self.pool.transaccion() as con:
+                n = con.execute("INSERT INTO ids_reservados DEFAULT VALUES").lastrowid - 1
+            cadena_id = f"{prefijo}{n}"
+            # Cadenas guardadas antes de reservar ids
+            if not self.existe(cadena_id):
+                return cadena_id
+
+    def candado(self, cadena_id):
+        """Candado de las escrituras de la cadena, compartido entre procesos."""
+        return self.candados.obtener(cadena_id)
+
+    def crear(self, cadena_id, meta, bloques=(), clave=None):
+        """Inserta la cadena, su clave privada y sus bloques iniciales en una sola transacción."""
+        with self.pool.transaccion() as con:
+            con.execute("INSERT INTO cadenas (id, meta) VALUES (?, ?)",
+                        (cadena_id, json.dumps(meta)))
+            if clave is not None:
+                con.execute("INSERT INTO claves (cadena_id, clave) VALUES (?, ?)",
+                            (cadena_id, json.dumps(clave)))
+            for indice, bloque in enumerate(bloques):
+                _insertar_bloque(con, cadena_id, indice, self.a_dict(bloque))
+        return CadenaSQLite(self, cadena_id)
+
+    def abrir(self, cadena_id):
+        with self.pool.conexion() as con:
+            (meta,) = con.execute("SELECT meta FROM cadenas WHERE id = ?",
+                                  (cadena_id,)).fetchone()
+        return json.loads(meta), CadenaSQLite(self, cadena_id)
+
+    def leer_clave(self, cadena_id):
+        with self.pool.conexion() as con:
+            fila = con.execute("SELECT clave FROM claves WHERE cadena_id = ?",
+                               (cadena_id,)).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def eliminar(self, cadena_id):
+        with self.pool.transaccion() as con:
+            con.execute("DELETE FROM bloques WHERE cadena_id = ?", (cadena_id,))
+            con.execute("DELETE FROM claves WHERE cadena_id = ?", (cadena_id,))
+            con.execute("DELETE FROM cadenas WHERE id = ?", (cadena_id,))
+
+    # ---------- Búsquedas indexadas ----------
+    def buscar_bloques(self, limite=LIMITE_BUSQUEDA, **filtros):
+        """
+        Bloques que cumplen todos los filtros (columnas de CAMPOS_BUSQUEDA).
+
+        Returns:
+            Lista de (cadena_id, indice)
+        """
+        filtros = {campo: valor for campo, valor in filtros.items() if valor is not None}
+        if not filtros or not set(filtros) <= set(CAMPOS_BUSQUEDA):
+            raise ValueError(f"Filtros válidos: {', '.join(CAMPOS_BUSQUEDA)}")
+        condicion = " AND ".join(f"{campo} = ?" for campo in filtros)
+        with self.pool.conexion() as con:
+            return con.execute(
+                f"SELECT cadena_id, indice FROM bloques WHERE {condicion}"
+                f" ORDER BY cadena_id, indice LIMIT ?",
+                (*filtros.values(), limite)).fetchall()
+
+    def cadenas_en_etapa(self, etapa_actual, limite=LIMITE_BUSQUEDA):
+        """Cadenas cuyo último bloque está en la etapa dada: lista de (id, meta, num_bloques)."""
+        with self.pool.conexion() as con:
+            filas = con.execute(
+                "SELECT id, meta, num_bloques FROM cadenas WHERE etapa_actual = ?"
+                " ORDER BY id LIMIT ?", (etapa_actual, limite)).fetchall()
+        return [(cadena_id, json.loads(meta), num) for cadena_id, meta, num in filas]
+
+    def cerrar(self):
+        self.pool.cerrar()
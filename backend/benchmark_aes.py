@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks del cifrador AES-128 propietario.
+
+Uso:
+    python benchmark_aes.py
+"""
+
+import os
+import time
+
+from aes128_propietario import AES128, NUMPY_DISPONIBLE, calcular_polinomio
+
+CODIGOS_GRUPO = [20242678042, 20242678015, 20242678026]
+CLAVE = [0x2b, 0x7e, 0x15, 0x16,
+         0x28, 0xae, 0xd2, 0xa6,
+         0xab, 0xf7, 0x15, 0x88,
+         0x09, 0xcf, 0x4f, 0x3c]
+
+MB = 1024 * 1024
+
+
+def _medir(funcion, *args):
+    """Ejecuta la función y retorna (resultado, segundos)."""
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def _cifrar_con_listas(aes, datos, round_keys):
+    """Pipeline original: estado como matriz 4x4 de listas, una copia por paso."""
+    salida = bytearray()
+    for i in range(0, len(datos), 16):
+        state = aes.bytes_to_matrix(datos[i:i+16])
+        state = aes.add_round_key(state, round_keys[0])
+        for round_num in range(1, 10):
+            state = aes.sub_bytes(state)
+            state = aes.shift_rows(state)
+            state = aes.mix_columns(state)
+            state = aes.add_round_key(state, round_keys[round_num])
+        state = aes.sub_bytes(state)
+        state = aes.shift_rows(state)
+        state = aes.add_round_key(state, round_keys[10])
+        salida += bytes(aes.matrix_to_bytes(state))
+    return bytes(salida)
+
+
+def _cifrar_plano(aes, datos, rk):
+    """Pipeline plano: 4 palabras leídas/escritas sobre buffers sin matrices."""
+    salida = bytearray(len(datos))
+    cifrar = aes._encrypt_block_into
+    for i in range(0, len(datos), 16):
+        cifrar(datos, i, salida, i, rk)
+    return bytes(salida)
+
+
+def benchmark_estado_plano(tamano=1 * MB, muestra_listas=64 * 1024):
+    """Compara el pipeline de listas con el pipeline plano sobre 'tamano' bytes."""
+    aes = AES128(calcular_polinomio(CODIGOS_GRUPO))
+    datos = os.urandom(tamano)
+    round_keys = aes.key_expansion(CLAVE)
+    rk = aes.claves_de_ronda(CLAVE)[0]
+
+    # El pipeline de listas es lento: se mide sobre una muestra y se extrapola
+    ref, t_listas = _medir(_cifrar_con_listas, aes, datos[:muestra_listas], round_keys)
+    plano, t_plano = _medir(_cifrar_plano, aes, datos, rk)
+    assert plano[:muestra_listas] == ref, "El pipeline plano no coincide con el de listas"
+
+    mbs_listas = (muestra_listas / MB) / t_listas
+    mbs_plano = (tamano / MB) / t_plano
+    print(f"Estado con listas: {mbs_listas:8.3f} MB/s (muestra de {muestra_listas // 1024} KB)")
+    print(f"Estado plano:      {mbs_plano:8.3f} MB/s ({tamano // 1024} KB)")
+    print(f"Aceleración:       {mbs_plano / mbs_listas:8.1f}x")
+
+
+def benchmark_numpy(tamano=4 * MB, muestra_plano=1 * MB):
+    """Compara el motor vectorizado (NumPy) con el motor puro en ECB."""
+    if not NUMPY_DISPONIBLE:
+        print("NumPy no está instalado: se omite el benchmark vectorizado")
+        return
+    aes = AES128(calcular_polinomio(CODIGOS_GRUPO))
+    datos = os.urandom(tamano)
+    rk = aes.claves_de_ronda(CLAVE)[0]
+    contexto = aes.con_clave(CLAVE)
+
+    ref, t_plano = _medir(_cifrar_plano, aes, datos[:muestra_plano], rk)
+    cifrado, t_numpy = _medir(contexto.encrypt_ecb, datos)
+    assert cifrado[:muestra_plano] == ref, "El motor NumPy no coincide con el motor puro"
+    _, t_numpy_dec = _medir(contexto.decrypt_ecb, cifrado)
+
+    mbs_plano = (muestra_plano / MB) / t_plano
+    mbs_numpy = (tamano / MB) / t_numpy
+    print(f"Motor puro:        {mbs_plano:8.3f} MB/s (muestra de {muestra_plano // 1024} KB)")
+    print(f"NumPy (cifrado):   {mbs_numpy:8.3f} MB/s ({tamano // MB} MB en {t_numpy * 1000:.0f} ms)")
+    print(f"NumPy (descifrado):{(tamano / MB) / t_numpy_dec:8.3f} MB/s")
+    print(f"Aceleración:       {mbs_numpy / mbs_plano:8.1f}x")
+
+
+def _cifrar_concatenando(contexto, datos):
+    """Bucle ECB anterior: la salida crece con bytes += bytes (copia cuadrática)."""
+    padded = contexto.aes.pkcs7_pad(datos)
+    ciphertext = b''
+    for i in range(0, len(padded), 16):
+        ciphertext += bytes(contexto.encrypt_block(list(padded[i:i+16])))
+    return ciphertext
+
+
+def benchmark_escalado(tamano_maximo=64 * MB, maximo_concatenando=256 * 1024):
+    """
+    Tiempo por KB de encrypt_ecb desde 1 KB hasta 'tamano_maximo'.
+    
+    Con salida preasignada el tiempo por KB debe mantenerse constante (escalado
+    lineal); el bucle que concatena bytes crece con el tamaño del mensaje.
+    """
+    aes = AES128(calcular_polinomio(CODIGOS_GRUPO))
+    contexto = aes.con_clave(CLAVE)
+    if not aes.usar_numpy:
+        # Sin NumPy, 64 MB en Python puro tomaría minutos
+        tamano_maximo = min(tamano_maximo, 4 * MB)
+
+    print(f"{'Tamaño':>10} | {'Preasignado':>16} | {'Concatenando':>16}")
+    tamano = 1024
+    while tamano <= tamano_maximo:
+        datos = os.urandom(tamano)
+        cifrado, t = _medir(contexto.encrypt_ecb, datos)
+        fila = f"{tamano // 1024:>7} KB | {t * 1e6 / (tamano / 1024):>10.1f} µs/KB |"
+        if tamano <= maximo_concatenando:
+            anterior, t_anterior = _medir(_cifrar_concatenando, contexto, datos)
+            assert anterior == cifrado
+            fila += f" {t_anterior * 1e6 / (tamano / 1024):>10.1f} µs/KB"
+        else:
+            fila += f" {'-':>16}"
+        print(fila)
+        tamano *= 4
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 70)
+    print("BENCHMARK 1: ESTADO PLANO VS. MATRICES DE LISTAS")
+    print("=" * 70)
+    benchmark_estado_plano()
+
+    print("\n" + "=" * 70)
+    print("BENCHMARK 2: MOTOR VECTORIZADO (NUMPY) EN ECB")
+    print("=" * 70)
+    benchmark_numpy()
+
+    print("\n" + "=" * 70)
+    print("BENCHMARK 3: ESCALADO DE encrypt_ecb (1 KB - 64 MB)")
+    print("=" * 70)
+    benchmark_escalado()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de los bloques:
+
+- Memoria: bytes por bloque en cadenas de 10k bloques. Compara la
+  representación anterior (__dict__ con hex y observaciones como dicts) con la
+  compacta (__slots__, bytes y Observacion).
+- Validación: cadena de 5k bloques con 20 observaciones por bloque, con y sin
+  reutilizar la codificación canónica memorizada de cada bloque.
+
+Uso:
+    python benchmark_bloques.py
+"""
+
+import contextlib
+import gc
+import hashlib
+import io
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from blockchain import (VERSION_MERKLE, Blockchain, Bloque, Observacion, _firma_a_bytes,
+                        aes_contexto)
+from mineria import VERSION_POW_PREFIJO, minar
+
+BLOQUES = 10000
+OBSERVACIONES_POR_BLOQUE = 3
+
+BLOQUES_VALIDACION = 5000
+OBSERVACIONES_VALIDACION = 20
+
+
+class _BloqueAnterior:
+    """Representación anterior: atributos en __dict__, digests y firmas en hex."""
+
+    def __init__(self, datos):
+        self.__dict__.update(datos)
+
+
+def _datos_bloque(i, hash_anterior):
+    """Dict persistido (forma hex) de un bloque sintético con campos realistas."""
+    fecha = f"2025-12-10T16:{i // 600 % 60:02d}:{i // 10 % 60:02d}.{i:06d}"
+    codigo = f"// Entregable {i}\nprint('etapa {i % 5}')\n"
+    observaciones = []
+    for j in range(OBSERVACIONES_POR_BLOQUE):
+        texto = f"Observación {j} del bloque {i}: revisión aprobada."
+        firma = random.getrandbits(511) | (1 << 510)
+        observaciones.append({
+            'texto': texto,
+            'hash_md5': hashlib.md5(texto.encode('utf-8')).hexdigest(),
+            'firma': format(firma, 'x'),
+            'timestamp': fecha
+        })
+    cifrado = aes_contexto.encrypt_ecb(json.dumps({
+        'codigo': codigo, 'etapa': i % 5, 'fecha': fecha,
+        'observaciones': [obs['texto'] for obs in observaciones]
+    }).encode('utf-8'))
+    return {
+        'version': 2,
+        'dificultad': 2,
+        'hash_anterior': hash_anterior,
+        'codigo': codigo,
+        'etapa_actual': i % 5,
+        'fecha_hora': fecha,
+        'lista_verificacion': [k <= i % 5 for k in range(5)],
+        'hash_codigo': hashlib.sha256(codigo.encode('utf-8')).hexdigest(),
+        'observaciones': observaciones,
+        'nonce': random.randrange(1000),
+        'prueba_trabajo': os.urandom(16).hex(),
+        'hash_actual': os.urandom(64).hex(),
+        'datos_cifrados': bytes(cifrado).hex()
+    }
+
+
+def _bytes_por_bloque(construir, textos):
+    """Memoria retenida por la cadena construida a partir de los JSON, por bloque."""
+    gc.collect()
+    tracemalloc.start()
+    cadena = [construir(json.loads(texto)) for texto in textos]
+    gc.collect()
+    retenida, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cadena
+    return retenida / len(textos)
+
+
+def benchmark_memoria(bloques=BLOQUES):
+    """Bytes por bloque de ambas representaciones para una cadena de 'bloques' bloques."""
+    random.seed(0)
+    textos = []
+    hash_anterior = "0" * 128
+    for i in range(bloques):
+        datos = _datos_bloque(i, hash_anterior)
+        hash_anterior = datos['hash_actual']
+        textos.append(json.dumps(datos))
+
+    anterior = _bytes_por_bloque(_BloqueAnterior, textos)
+    compacto = _bytes_por_bloque(Bloque.desde_dict, textos)
+    print(f"Cadena de {bloques} bloques ({OBSERVACIONES_POR_BLOQUE} observaciones por bloque)")
+    print(f"Anterior (__dict__ + hex):   {anterior:8.0f} bytes/bloque ({anterior * bloques / 2**20:6.1f} MB)")
+    print(f"Compacto (__slots__ + bytes): {compacto:7.0f} bytes/bloque ({compacto * bloques / 2**20:6.1f} MB)")
+    print(f"Reducción:                   {100 * (1 - compacto / anterior):7.1f} %")
+
+
+def _cadena_sintetica(bloques, observaciones, version):
+    """
+    Cadena válida (dificultad 1); las firmas de las observaciones se calculan una vez.
+    Tiene más bloques que etapas: la etapa de cada bloque es su índice.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        bc = Blockchain("benchmark", dificultad=1)
+    firmadas = []
+    for j in range(observaciones):
+        texto = f"Observación {j}: revisión del entregable aprobada por el interventor."
+        hash_md5 = hashlib.md5(texto.encode('utf-8')).hexdigest()
+        firmadas.append((texto, bytes.fromhex(hash_md5),
+                         _firma_a_bytes(bc.rsa_interventor.firmar(hash_md5))))
+    for i in range(1, bloques):
+        bloque = Bloque(bc.cadena[-1].hash_actual, f"// Entregable {i}\n", i, [],
+                        bc.rsa_interventor, dificultad=1, version=version, minar_pow=False)
+        bloque.observaciones = [Observacion(texto, hash_md5, firma, bloque.fecha_hora)
+                                for texto, hash_md5, firma in firmadas]
+        bloque.aplicar_pow(*minar(*bloque.campos_pow(), dificultad=1, version=version))
+        bc.cadena.append(bloque)
+    return bc
+
+
+def _medir(funcion):
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def benchmark_validacion(bloques=BLOQUES_VALIDACION, observaciones=OBSERVACIONES_VALIDACION):
+    """Validación de la cadena y cálculo del hash de cada bloque, con y sin caché."""
+    for version in (VERSION_POW_PREFIJO, VERSION_MERKLE):
+        bc = _cadena_sintetica(bloques, observaciones, version)
+
+        def revalidar(full=False):
+            bc.invalidar_validacion()
+            return bc.validar_cadena(full=full, procesos=1)
+
+        def hashes(completa):
+            for bloque in bc.cadena:
+                if completa:
+                    bloque._invalidar_cache()
+                bloque._calcular_hash_actual()
+                if version >= VERSION_MERKLE:
+                    bloque._calcular_raiz_merkle()
+
+        sin_cache, (valida, _) = _medir(lambda: revalidar(full=True))
+        con_cache, _ = _medir(revalidar)
+        hash_sin_cache, _ = _medir(lambda: hashes(True))
+        hash_con_cache, _ = _medir(lambda: hashes(False))
+
+        print(f"\nVersión {version}: {bloques} bloques x {observaciones} observaciones "
+              f"(cadena válida: {valida})")
+        print(f"  Validación recalculando codificaciones: {sin_cache:7.2f} s")
+        print(f"  Validación reutilizando codificaciones: {con_cache:7.2f} s "
+              f"({100 * (1 - con_cache / sin_cache):5.1f} % menos)")
+        print(f"  Solo hashes (SHA-512 + raíz), sin caché: {1e6 * hash_sin_cache / bloques:7.1f} us/bloque")
+        print(f"  Solo hashes (SHA-512 + raíz), con caché: {1e6 * hash_con_cache / bloques:7.1f} us/bloque")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 70)
+    print("BENCHMARK: MEMORIA POR BLOQUE")
+    print("=" * 70)
+    benchmark_memoria()
+
+    print("\n" + "=" * 70)
+    print("BENCHMARK: VALIDACIÓN CON CODIFICACIÓN CANÓNICA MEMORIZADA")
+    print("=" * 70)
+    benchmark_validacion()
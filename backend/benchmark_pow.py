@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del minado (PoW con MD5): hashes por segundo.
+
+Uso:
+    python benchmark_pow.py
+"""
+
+import hashlib
+import time
+
+from mineria import VERSION_POW_LEGADO, VERSION_POW_PREFIJO, minar
+
+HASH_CODIGO = hashlib.sha256(b"print('hola')").hexdigest()
+FECHA = "2025-12-10T16:05:58.000000"
+
+INTENTOS = 200000
+
+
+def _minar_original(hash_codigo, fecha_hora, obs_text, intentos):
+    """Bucle original: f-string + encode + hexdigest + startswith por intento."""
+    nonce = 0
+    while nonce < intentos:
+        data = f"{nonce}{hash_codigo}{fecha_hora}{obs_text}"
+        hash_md5 = hashlib.md5(data.encode('utf-8')).hexdigest()
+        if hash_md5.startswith("0" * 32):
+            break
+        nonce += 1
+
+
+def _hashes_por_segundo(funcion, *args, **kwargs):
+    inicio = time.perf_counter()
+    funcion(*args, **kwargs)
+    return INTENTOS / (time.perf_counter() - inicio)
+
+
+def benchmark_kernel():
+    """Compara el bucle original con el kernel de bytes, para observaciones cortas y largas."""
+    print(f"{'Observaciones':>14} | {'Original':>12} | {'Kernel v1':>12} | {'Kernel v2':>12}")
+    for largo in (64, 4096):
+        obs_text = "x" * largo
+        original = _hashes_por_segundo(_minar_original, HASH_CODIGO, FECHA, obs_text, INTENTOS)
+        # 128 bits de dificultad: ningún nonce es válido y se recorre todo el rango
+        v1 = _hashes_por_segundo(minar, HASH_CODIGO, FECHA, obs_text, bits=128,
+                                 limite=INTENTOS, version=VERSION_POW_LEGADO)
+        v2 = _hashes_por_segundo(minar, HASH_CODIGO, FECHA, obs_text, bits=128,
+                                 limite=INTENTOS, version=VERSION_POW_PREFIJO)
+        print(f"{largo:>11} B | {original:>8.0f} H/s | {v1:>8.0f} H/s | {v2:>8.0f} H/s")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 70)
+    print("BENCHMARK: HASHES POR SEGUNDO DEL MINADO")
+    print("=" * 70)
+    benchmark_kernel()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de RSA-512:
+- Pares de claves por segundo a 512, 1024 y 2048 bits: generación original
+  (Miller-Rabin sobre cada impar aleatorio) vs criba de primos pequeños
+- Firmas por segundo con el exponente completo y con CRT
+- Firma por lotes de las observaciones de un bloque
+- Verificación: sin caché vs VerificadorRSA (primera pasada y repetida)
+
+Uso:
+    python benchmark_rsa.py
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import random
+import time
+
+import rsa512
+from rsa512 import RSA512, VerificadorRSA, es_primo
+
+FIRMAS = 2000
+VERIFICACIONES = 20000
+BITS_GENERACION = (512, 1024, 2048)
+# Cada medición corre hasta juntar PARES_MINIMOS pares o SEGUNDOS_POR_MEDICION
+PARES_MINIMOS = 3
+SEGUNDOS_POR_MEDICION = 20.0
+OBSERVACIONES_POR_BLOQUE = 256
+
+
+def _hashes(cantidad):
+    return [hashlib.md5(f"Observación {i}".encode('utf-8')).hexdigest() for i in range(cantidad)]
+
+
+def _por_segundo(funcion, cantidad):
+    inicio = time.perf_counter()
+    funcion()
+    return cantidad / (time.perf_counter() - inicio)
+
+
+def _generar_primo_original(bits):
+    """Generación original: un impar aleatorio nuevo por intento, todos a Miller-Rabin."""
+    while True:
+        n = random.getrandbits(bits)
+        n |= (1 << (bits - 1)) | 1
+        if es_primo(n):
+            return n
+
+
+def _pares_por_segundo(bits, generar_primo):
+    """Pares de claves por segundo usando la función de primos dada."""
+    original = rsa512.generar_primo
+    rsa512.generar_primo = generar_primo
+    try:
+        pares = 0
+        inicio = time.perf_counter()
+        while pares < PARES_MINIMOS or time.perf_counter() - inicio < 1.0:
+            with contextlib.redirect_stdout(io.StringIO()):
+                RSA512(bits)
+            pares += 1
+            if time.perf_counter() - inicio > SEGUNDOS_POR_MEDICION:
+                break
+        return pares / (time.perf_counter() - inicio)
+    finally:
+        rsa512.generar_primo = original
+
+
+def benchmark_generacion(tamanos=BITS_GENERACION):
+    """Pares de claves por segundo: generación original vs criba."""
+    random.seed(0)
+    print(f"{'Bits':>6} | {'Original':>14} | {'Criba':>14} | {'Mejora':>6}")
+    for bits in tamanos:
+        original = _pares_por_segundo(bits, _generar_primo_original)
+        criba = _pares_por_segundo(bits, rsa512.generar_primo)
+        print(f"{bits:>6} | {original:>8.2f} par/s | {criba:>8.2f} par/s | {criba / original:>5.1f}x")
+
+
+def benchmark_firma(firmas=FIRMAS):
+    """Firmas por segundo: exponente privado completo vs CRT (mismas firmas)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        rsa = RSA512()
+    sin_crt = RSA512.desde_claves(rsa.n, rsa.e, rsa.d)
+    hashes = _hashes(firmas)
+    assert sin_crt.firmar_lote(hashes[:16]) == rsa.firmar_lote(hashes[:16])
+
+    completo = _por_segundo(lambda: [sin_crt.firmar(h) for h in hashes], firmas)
+    crt = _por_segundo(lambda: [rsa.firmar(h) for h in hashes], firmas)
+    print(f"Exponente completo: {completo:8.0f} firmas/s")
+    print(f"CRT:                {crt:8.0f} firmas/s ({crt / completo:.1f}x)")
+
+
+def benchmark_lote(observaciones=OBSERVACIONES_POR_BLOQUE, bloques=10):
+    """Observaciones por segundo al firmar el lote de un bloque, secuencial y en procesos."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        rsa = RSA512()
+    hashes = _hashes(observaciones)
+    total = observaciones * bloques
+    print(f"\nLotes de {observaciones} observaciones ({bloques} bloques, {os.cpu_count()} CPU)")
+    for procesos in (1, 2, 4):
+        tasa = _por_segundo(
+            lambda: [rsa.firmar_lote(hashes, procesos=procesos) for _ in range(bloques)], total)
+        print(f"  procesos={procesos}: {tasa:8.0f} firmas/s")
+
+
+def benchmark_verificacion(firmas=VERIFICACIONES):
+    """Verificaciones por segundo de firmas distintas: sin caché, y con caché en frío y en caliente."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        rsa = RSA512()
+    pares = [(int(h, 16), int(rsa.firmar(h), 16)) for h in _hashes(firmas)]
+
+    def sin_cache():
+        return all(pow(s, rsa.e, rsa.n) == m for m, s in pares)
+
+    verificador = VerificadorRSA(rsa.e, rsa.n)
+    directa = _por_segundo(sin_cache, firmas)
+    fria = _por_segundo(lambda: verificador.verificar_lote(pares), firmas)
+    caliente = _por_segundo(lambda: verificador.verificar_lote(pares), firmas)
+    print(f"\nVerificación de {firmas} firmas distintas")
+    print(f"  pow por firma:           {directa:10.0f} firmas/s")
+    print(f"  VerificadorRSA (frío):   {fria:10.0f} firmas/s")
+    print(f"  VerificadorRSA (repite): {caliente:10.0f} firmas/s ({caliente / directa:.0f}x)")
+
+
+if __name__ == "__main__":
+    print("\n" + "=" * 70)
+    print("BENCHMARK: GENERACIÓN DE CLAVES RSA")
+    print("=" * 70)
+    benchmark_generacion()
+
+    print("\n" + "=" * 70)
+    print("BENCHMARK: FIRMAS RSA-512")
+    print("=" * 70)
+    benchmark_firma()
+    benchmark_lote()
+    benchmark_verificacion()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga: varios workers de uvicorn compartiendo las cadenas
+
+- Levanta uvicorn con N workers sobre un DIR_DATOS temporal (log y SQLite)
+- Crea CADENAS cadenas en paralelo: todos los ids deben ser distintos
+- Envía INTENTOS aprobaciones simultáneas de la misma etapa de cada cadena:
+  exactamente una debe agregarse (las demás reciben 400)
+- Avanza las etapas restantes de todas las cadenas en paralelo
+- Comprueba que cada cadena se lee igual desde todos los workers y que es válida
+
+Uso:
+    python benchmark_workers.py [workers ...]   (por defecto: 1 y 4)
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = (1, 4)
+BACKENDS = ("log", "sqlite")
+CADENAS = 12
+INTENTOS = 4
+LECTURAS = 8
+HILOS = 16
+# Segundos máximos de espera a que arranquen los workers
+ARRANQUE = 90.0
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pedir(url, metodo="GET", cuerpo=None):
+    """(status, json) de una petición HTTP."""
+    datos = None if cuerpo is None else json.dumps(cuerpo).encode('utf-8')
+    peticion = urllib.request.Request(url, data=datos, method=metodo,
+                                      headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(peticion, timeout=120) as respuesta:
+            return respuesta.status, json.loads(respuesta.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+class Servidor:
+    """uvicorn main:app con 'workers' procesos y un directorio de datos temporal."""
+
+    def __init__(self, workers, backend):
+        self.directorio = tempfile.mkdtemp(prefix="datos_workers_")
+        self.url = f"http://127.0.0.1:{_puerto_libre()}"
+        entorno = dict(os.environ, DIR_DATOS=self.directorio, BACKEND_ALMACEN=backend,
+                       WEB_CONCURRENCY=str(workers), PROFUNDIDAD_POOL_CLAVES="2",
+                       PROCESOS_TRABAJOS="1")
+        entorno.setdefault("DIFICULTAD_POW", "2")
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", self.url.rsplit(":", 1)[1], "--workers", str(workers)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=entorno,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def esperar(self):
+        limite = time.monotonic() + ARRANQUE
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError("uvicorn terminó al arrancar")
+            try:
+                _pedir(self.url + "/")
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("uvicorn no respondió a tiempo")
+
+    def cerrar(self):
+        self.proceso.terminate()
+        try:
+            self.proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+
+def _crear(url, i):
+    return _pedir(url + "/blockchain/create", "POST",
+                  {"projectName": f"Carga {i}", "codigoInicial": f"// inicio {i}"})
+
+
+def _aprobar(url, cadena_id, etapa, intento=0):
+    status, _ = _pedir(url + f"/blockchain/{cadena_id}/aprobar-etapa", "POST", {
+        "codigo": f"// {cadena_id} etapa {etapa} intento {intento}",
+        "etapa": etapa,
+        "observaciones": [f"Aprobación {intento} de la etapa {etapa}"]
+    })
+    return status
+
+
+def _avanzar(url, cadena_id):
+    """Etapas 2 a 4 de una cadena, en orden; retorna los status."""
+    return [_aprobar(url, cadena_id, etapa) for etapa in range(2, 5)]
+
+
+def prueba_carga(workers, backend):
+    """Corre la prueba contra un servidor nuevo; retorna un dict con los resultados."""
+    servidor = Servidor(workers, backend)
+    try:
+        servidor.esperar()
+        url = servidor.url
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(HILOS) as pool:
+            pids = set(r[1]["pid"] for r in pool.map(lambda _: _pedir(url + "/"),
+                                                      range(8 * workers)))
+            creadas = list(pool.map(lambda i: _crear(url, i), range(CADENAS)))
+            ids = [cuerpo["blockchain_id"] for status, cuerpo in creadas if status == 200]
+
+            # Aprobaciones simultáneas de la misma etapa: solo una puede encadenar
+            carreras = list(pool.map(lambda t: _aprobar(url, *t),
+                                     [(cadena_id, 1, k) for cadena_id in ids
+                                      for k in range(INTENTOS)]))
+            ganadoras = Counter()
+            for (cadena_id, _, _), status in zip(
+                    [(c, 1, k) for c in ids for k in range(INTENTOS)], carreras):
+                ganadoras[cadena_id] += status == 200
+
+            avances = list(pool.map(lambda c: _avanzar(url, c), ids))
+
+            # Cada cadena leída varias veces (las lecturas se reparten entre workers)
+            lecturas = list(pool.map(
+                lambda c: [tuple(b["hash_actual"] for b in
+                                 _pedir(url + f"/blockchain/{c}/blocks")[1]["blocks"])
+                           for _ in range(LECTURAS)], ids))
+            validas = list(pool.map(
+                lambda c: _pedir(url + f"/blockchain/{c}/validate?full=true", "POST")[1]["valid"],
+                ids))
+        duracion = time.perf_counter() - inicio
+        peticiones = (8 * workers + CADENAS + len(carreras) + 3 * len(ids) +
+                      LECTURAS * len(ids) + len(ids))
+        return {
+            "workers_vistos": len(pids),
+            "creadas": len(ids),
+            "ids_unicos": len(set(ids)) == len(ids) == CADENAS,
+            "una_ganadora": all(ganadoras[c] == 1 for c in ids),
+            "avances_ok": all(s == 200 for estados in avances for s in estados),
+            "lecturas_iguales": all(len(set(l)) == 1 and len(l[0]) == 5 for l in lecturas),
+            "validas": all(validas),
+            "duracion": duracion,
+            "peticiones_por_segundo": peticiones / duracion
+        }
+    finally:
+        servidor.cerrar()
+
+
+if __name__ == "__main__":
+    lista_workers = [int(w) for w in sys.argv[1:]] or list(WORKERS)
+    print("\n" + "=" * 70)
+    print(f"PRUEBA DE CARGA: {CADENAS} cadenas, {INTENTOS} aprobaciones simultáneas por etapa")
+    print("=" * 70)
+    consistente = True
+    for backend in BACKENDS:
+        for workers in lista_workers:
+            r = prueba_carga(workers, backend)
+            ok = all(r[k] for k in ("ids_unicos", "una_ganadora", "avances_ok",
+                                     "lecturas_iguales", "validas"))
+            consistente = consistente and ok
+            print(f"{backend:>6} | workers={workers} (respondieron {r['workers_vistos']}) | "
+                  f"ids únicos: {r['ids_unicos']} | una aprobación por etapa: {r['una_ganadora']} | "
+                  f"etapas: {r['avances_ok']} | lecturas iguales: {r['lecturas_iguales']} | "
+                  f"válidas: {r['validas']} | {r['peticiones_por_segundo']:6.1f} pet/s "
+                  f"({r['duracion']:.1f} s)")
+    print("\nResultado:", "CONSISTENTE" if consistente else "INCONSISTENTE")
+    sys.exit(0 if consistente else 1)
@@ -10,14 +10,29 @@ Sistema Blockchain Completo para Contratos Inteligentes
 """
 
 import hashlib
+import itertools
 import time
 from datetime import datetime
 import json
+import os
 import sys
+import threading
+import weakref
+from collections.abc import MutableMapping
+from contextlib import closing
+from functools import partial
+
+from almacenamiento import AlmacenCadenas, CadenaConCache
+from almacenamiento_sqlite import AlmacenSQLite
+
+from mineria import (DIFICULTAD_POR_DEFECTO, VERSION_POW_LEGADO, calcular_pow,
+                     cumple_dificultad, minar)
+from merkle import hash_hoja, prueba_inclusion, raiz_merkle, verificar_inclusion
+from validacion import validar_en_lotes
 
 # ============== IMPORTAR RSA-512 ==============
 try:
-    from rsa512 import RSA512
+    from rsa512 import RSA512, importar_clave_publica, verificador_para
     RSA_DISPONIBLE = True
     print("✓ Módulo RSA-512 importado correctamente")
 except ImportError:
@@ -60,6 +75,20 @@ except ImportError:
         def decrypt_ecb(self, data, key):
             decrypted = bytes([b ^ key[i % len(key)] for i, b in enumerate(data)])
             return self.pkcs7_unpad(decrypted)
+        
+        def con_clave(self, key):
+            return AES128Contexto(self, key)
+    
+    class AES128Contexto:
+        def __init__(self, aes, key):
+            self.aes = aes
+            self.clave = key
+        
+        def encrypt_ecb(self, data):
+            return self.aes.encrypt_ecb(data, self.clave)
+        
+        def decrypt_ecb(self, data):
+            return self.aes.decrypt_ecb(data, self.clave)
     
     def calcular_polinomio(codigos):
         suma = sum(int(str(cod)[-2:]) for cod in codigos)
@@ -74,10 +103,149 @@ CLAVE_AES = [0x2b, 0x7e, 0x15, 0x16,
              0x28, 0xae, 0xd2, 0xa6,
              0xab, 0xf7, 0x15, 0x88,
              0x09, 0xcf, 0x4f, 0x3c]
+# Contexto ligado a la clave: las claves de ronda se expanden una vez por proceso
+aes_contexto = aes_cipher.con_clave(CLAVE_AES)
+
+# ============== CONFIGURACIÓN PoW ==============
+# Ceros hexadecimales exigidos al inicio del hash MD5
+DIFICULTAD_POW = int(os.getenv("DIFICULTAD_POW", DIFICULTAD_POR_DEFECTO))
+# Procesos para la búsqueda del nonce (1 = secuencial)
+PROCESOS_MINERIA = int(os.getenv("PROCESOS_MINERIA", "1"))
+# Procesos para validar cadenas (1 = secuencial)
+PROCESOS_VALIDACION = int(os.getenv("PROCESOS_VALIDACION", "1"))
+# Procesos para firmar las observaciones de un bloque (1 = secuencial)
+PROCESOS_FIRMA = int(os.getenv("PROCESOS_FIRMA", "1"))
+
+# Versiones del formato de los bloques (1 y 2: ver versiones del PoW en mineria.py)
+# 3: PoW como la versión 2; el hash del bloque incluye la raíz Merkle de las
+#    observaciones en lugar de su JSON (pruebas de inclusión por observación)
+VERSION_MERKLE = 3
+# Versión del formato de los bloques nuevos
+VERSION_BLOQUE = VERSION_MERKLE
+
+# ============== CONFIGURACIÓN PERSISTENCIA ==============
+# Directorio de las cadenas guardadas (vacío = solo en memoria)
+DIR_DATOS = os.getenv("DIR_DATOS", "")
+# "log" (un log de solo-anexado por cadena) o "sqlite" (una base con índices)
+BACKEND_ALMACEN = os.getenv("BACKEND_ALMACEN", "log")
+
+# ============== OBSERVACIONES ==============
+def _firma_a_bytes(firma_hex):
+    """Firma RSA (hex sin ceros a la izquierda, como la genera RSA512) a bytes."""
+    valor = int(firma_hex, 16)
+    return valor.to_bytes((valor.bit_length() + 7) // 8, 'big')
+
+
+def _firma_a_hex(firma):
+    return format(int.from_bytes(firma, 'big'), 'x')
+
+
+class Observacion:
+    """Observación firmada; el hash MD5 y la firma RSA se guardan como bytes."""
+
+    # _bloque: bloque que la contiene, al que se avisa si se modifica
+    __slots__ = ('texto', 'hash_md5', 'firma', 'timestamp', '_sellada', '_bloque')
+
+    def __init__(self, texto, hash_md5, firma, timestamp):
+        self.texto = texto
+        self.hash_md5 = hash_md5
+        self.firma = firma
+        self.timestamp = timestamp
+        self._sellada = True
+
+    def __setattr__(self, nombre, valor):
+        object.__setattr__(self, nombre, valor)
+        bloque = getattr(self, '_bloque', None)
+        if bloque is not None and getattr(self, '_sellada', False):
+            bloque._observacion_modificada()
+
+    def __getstate__(self):
+        # Sin el bloque: al deserializarse, el bloque vuelve a adoptarla
+        return None, {nombre: getattr(self, nombre) for nombre in self.__slots__
+                      if nombre != '_bloque' and hasattr(self, nombre)}
+
+    def __setstate__(self, estado):
+        for nombre, valor in estado[1].items():
+            object.__setattr__(self, nombre, valor)
+
+    @property
+    def firma_hex(self):
+        return _firma_a_hex(self.firma)
+
+    def a_dict(self):
+        """Forma canónica (hex): entra en el hash del bloque y es la que se persiste."""
+        return {
+            'texto': self.texto,
+            'hash_md5': self.hash_md5.hex(),
+            'firma': self.firma_hex,
+            'timestamp': self.timestamp
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(datos['texto'], bytes.fromhex(datos['hash_md5']),
+                   _firma_a_bytes(datos['firma']), datos['timestamp'])
+
+
+def hoja_observacion(obs_dict):
+    """Hoja Merkle de una observación: hash de su forma canónica (JSON ordenado)."""
+    return hash_hoja(json.dumps(obs_dict, sort_keys=True).encode('utf-8'))
+
+
+def resumen_observaciones(obs_dicts, version):
+    """
+    Parte del hash del bloque que cubre las observaciones (forma canónica):
+    su JSON completo, o la raíz Merkle (hex) desde VERSION_MERKLE.
+    """
+    if version >= VERSION_MERKLE:
+        return raiz_merkle([hoja_observacion(obs) for obs in obs_dicts]).hex()
+    return json.dumps(obs_dicts, sort_keys=True)
+
+
+def codificar_bloque(hash_anterior, nonce, hash_codigo, fecha_hora, lista_verificacion,
+                     resumen_obs, prueba_trabajo):
+    """Codificación canónica (bytes) de los campos hasheados, dados en hex (ver resumen_observaciones)."""
+    lista_ver = "".join(["1" if x else "0" for x in lista_verificacion])
+    data = (f"{hash_anterior}{nonce}{hash_codigo}"
+            f"{fecha_hora}{lista_ver}{resumen_obs}{prueba_trabajo}")
+    return data.encode('utf-8')
+
+
+def calcular_hash_bloque(*campos):
+    """SHA-512 (hex) del bloque; mismos argumentos que codificar_bloque."""
+    return hashlib.sha512(codificar_bloque(*campos)).hexdigest()
+
+
+def verificar_inclusion_observacion(obs_dict, prueba, raiz_hex):
+    """
+    Verifica una prueba de inclusión de una observación sin el resto del bloque.
+
+    Args:
+        obs_dict: Observación en forma canónica (texto, hash_md5, firma, timestamp)
+        prueba: Lista de (lado, hash hex) como la retorna Bloque.prueba_observacion
+        raiz_hex: Raíz Merkle del bloque
+    """
+    try:
+        prueba = [(lado, bytes.fromhex(hermano)) for lado, hermano in prueba]
+        return verificar_inclusion(hoja_observacion(obs_dict), prueba, bytes.fromhex(raiz_hex))
+    except (TypeError, ValueError):
+        return False
+
 
 # ============== CLASE BLOQUE ==============
 class Bloque:
-    """Bloque de blockchain con cifrado AES."""
+    """
+    Bloque de blockchain con cifrado AES.
+
+    Representación compacta: __slots__ y digests, PoW y datos cifrados como
+    bytes. El hex solo aparece en los datos que se hashean/persisten (a_dict)
+    y al serializar para la API.
+
+    La codificación canónica de los campos hasheados y la raíz Merkle
+    calculada se memorizan: se descartan al asignar un campo hasheado o al
+    modificarse una de sus observaciones. Un bloque sellado que se modifica
+    avisa a las cadenas que lo validaron (ver Blockchain.invalidar_validacion).
+    """
     
     ETAPAS = [
         "Establecimiento de requerimientos funcionales",
@@ -87,59 +255,189 @@ class Bloque:
         "Entrega final y liquidación"
     ]
 
-    def __init__(self, hash_anterior, codigo, etapa_actual, observaciones_lista, rsa_interventor):
+    __slots__ = ('version', 'dificultad', 'hash_anterior', 'codigo', 'etapa_actual',
+                 'fecha_hora', 'verificacion', 'hash_codigo', 'observaciones', 'raiz_merkle',
+                 'nonce', 'prueba_trabajo', 'hash_actual', 'datos_cifrados', '_sellado',
+                 '_cache_codificacion', '_cache_raiz', '_vigilantes')
+
+    # Campos que entran en la codificación canónica (observaciones, a través de la raíz)
+    _CAMPOS_HASHEADOS = frozenset(('version', 'hash_anterior', 'nonce', 'hash_codigo',
+                                   'fecha_hora', 'verificacion', 'observaciones',
+                                   'raiz_merkle', 'prueba_trabajo'))
+
+    def __setattr__(self, nombre, valor):
+        if nombre in self._CAMPOS_HASHEADOS:
+            self._invalidar_cache(observaciones=nombre in ('observaciones', 'version'))
+        object.__setattr__(self, nombre, valor)
+        if nombre == 'observaciones':
+            self._adoptar_observaciones()
+        # Cambiar un bloque sellado invalida las marcas de validación incremental
+        if getattr(self, '_sellado', False):
+            self._registrar_mutacion()
+
+    def __getstate__(self):
+        # Ni la caché ni las cadenas que lo vigilan viajan a otros procesos
+        # (p. ej. al validar en paralelo)
+        return None, {nombre: getattr(self, nombre) for nombre in self.__slots__
+                      if not nombre.startswith(('_cache', '_vigilantes'))
+                      and hasattr(self, nombre)}
+
+    def __setstate__(self, estado):
+        for nombre, valor in estado[1].items():
+            object.__setattr__(self, nombre, valor)
+        self._adoptar_observaciones()
+        self._invalidar_cache()
+
+    # ---------- Aviso de modificaciones ----------
+    def _adoptar_observaciones(self):
+        for obs in self.observaciones:
+            object.__setattr__(obs, '_bloque', self)
+
+    def _observacion_modificada(self):
+        self._invalidar_cache()
+        if getattr(self, '_sellado', False):
+            self._registrar_mutacion()
+
+    def agregar_vigilante(self, cadena):
+        """Registra una Blockchain a la que avisar si este bloque sellado se modifica."""
+        vigilantes = getattr(self, '_vigilantes', None) or ()
+        if any(ref() is cadena for ref in vigilantes):
+            return
+        vigilantes = tuple(ref for ref in vigilantes if ref() is not None)
+        object.__setattr__(self, '_vigilantes', vigilantes + (weakref.ref(cadena),))
+
+    def _registrar_mutacion(self):
+        for ref in getattr(self, '_vigilantes', None) or ():
+            cadena = ref()
+            if cadena is not None:
+                cadena.invalidar_validacion()
+
+    def __init__(self, hash_anterior, codigo, etapa_actual, observaciones_lista, rsa_interventor,
+                 dificultad=None, procesos_mineria=None, version=None, minar_pow=True):
         """
         Args:
-            hash_anterior: Hash SHA-512 del bloque anterior
+            hash_anterior: Hash SHA-512 del bloque anterior (bytes o hex)
             codigo: Código del proyecto
             etapa_actual: Número de etapa (0-4)
             observaciones_lista: Lista de strings con las observaciones
             rsa_interventor: Instancia RSA512 para firmar
+            dificultad: Ceros hexadecimales del PoW (por defecto DIFICULTAD_POW)
+            procesos_mineria: Procesos para el PoW (por defecto PROCESOS_MINERIA)
+            version: Versión del formato del bloque (por defecto VERSION_BLOQUE)
+            minar_pow: Si es False el bloque queda sin PoW; se completa con aplicar_pow()
         """
-        self.hash_anterior = hash_anterior
+        self.version = VERSION_BLOQUE if version is None else version
+        self.dificultad = DIFICULTAD_POW if dificultad is None else dificultad
+        self.hash_anterior = (bytes.fromhex(hash_anterior) if isinstance(hash_anterior, str)
+                              else hash_anterior)
         self.codigo = codigo
         self.etapa_actual = etapa_actual
         self.fecha_hora = datetime.now().isoformat()
-        self.lista_verificacion = [True if i <= etapa_actual else False
-                                   for i in range(len(self.ETAPAS))]
+        # Bit i encendido = etapa i completada
+        self.verificacion = (1 << (etapa_actual + 1)) - 1
         self.hash_codigo = self._calcular_hash_codigo()
         self.observaciones = []
         
-        # Agregar cada observación individualmente
+        # Firmar todas las observaciones en un lote (cada una con su firma)
         if isinstance(observaciones_lista, str):
             observaciones_lista = [observaciones_lista]
         
-        for obs_texto in observaciones_lista:
-            self.agregar_observacion(obs_texto, rsa_interventor)
+        self.agregar_observaciones(observaciones_lista, rsa_interventor)
         
+        self.raiz_merkle = b""
         self.nonce = 0
-        self.prueba_trabajo = ""
-        self._calcular_pow()
-        self.hash_actual = self._calcular_hash_actual()
-        self.datos_cifrados = self._cifrar_bloque()
+        self.prueba_trabajo = b""
+        self.hash_actual = b""
+        self.datos_cifrados = b""
+        if minar_pow:
+            self._calcular_pow(PROCESOS_MINERIA if procesos_mineria is None else procesos_mineria)
+            self._sellar()
+
+    @property
+    def lista_verificacion(self):
+        return [bool(self.verificacion >> i & 1) for i in range(len(self.ETAPAS))]
 
     def _calcular_hash_codigo(self):
         """SHA-256 del código."""
-        return hashlib.sha256(self.codigo.encode('utf-8')).hexdigest()
+        return hashlib.sha256(self.codigo.encode('utf-8')).digest()
 
-    def _calcular_pow(self):
-        """Prueba de Trabajo con MD5."""
-        obs_text = " | ".join([obs['texto'] for obs in self.observaciones])
-        while True:
-            data = f"{self.nonce}{self.hash_codigo}{self.fecha_hora}{obs_text}"
-            hash_md5 = hashlib.md5(data.encode('utf-8')).hexdigest()
-            if hash_md5.startswith("00"):
-                self.prueba_trabajo = hash_md5
-                break
-            self.nonce += 1
+    def campos_pow(self):
+        """Campos del bloque incluidos en el PoW: (hash_codigo hex, fecha_hora, obs_text)."""
+        obs_text = " | ".join([obs.texto for obs in self.observaciones])
+        return self.hash_codigo.hex(), self.fecha_hora, obs_text
+
+    def _calcular_pow(self, procesos=1, progreso=None):
+        """Prueba de Trabajo con MD5 (menor nonce válido); 'progreso' se pasa a minar()."""
+        self.nonce, prueba_trabajo = minar(
+            *self.campos_pow(),
+            dificultad=self.dificultad, procesos=procesos, version=self.version,
+            progreso=progreso
+        )
+        self.prueba_trabajo = bytes.fromhex(prueba_trabajo)
+
+    def aplicar_pow(self, nonce, prueba_trabajo):
+        """Completa un bloque creado con minar_pow=False con el resultado de minar()."""
+        self.nonce = nonce
+        self.prueba_trabajo = bytes.fromhex(prueba_trabajo)
+        self._sellar()
+
+    def _sellar(self):
+        """Calcula el hash del bloque y cifra sus datos (después del PoW)."""
+        self.observaciones = tuple(self.observaciones)
+        if self.version >= VERSION_MERKLE:
+            self.raiz_merkle = self._calcular_raiz_merkle()
+        self.hash_actual = self._calcular_hash_actual()
+        self.datos_cifrados = self._cifrar_bloque()
+        self._sellado = True
+
+    # ---------- Codificación canónica (memorizada) ----------
+    def _invalidar_cache(self, observaciones=True):
+        object.__setattr__(self, '_cache_codificacion', None)
+        if observaciones:
+            object.__setattr__(self, '_cache_raiz', None)
+
+    def _hojas_merkle(self):
+        return [hoja_observacion(obs.a_dict()) for obs in self.observaciones]
+
+    def _calcular_raiz_merkle(self):
+        """Raíz Merkle de las observaciones (memorizada)."""
+        if self._cache_raiz is None:
+            object.__setattr__(self, '_cache_raiz', raiz_merkle(self._hojas_merkle()))
+        return self._cache_raiz
+
+    def codificacion_canonica(self):
+        """Bytes sobre los que se calcula hash_actual (memorizados)."""
+        if self._cache_codificacion is None:
+            if self.version >= VERSION_MERKLE:
+                resumen_obs = self.raiz_merkle.hex()
+            else:
+                resumen_obs = resumen_observaciones(
+                    [obs.a_dict() for obs in self.observaciones], self.version)
+            object.__setattr__(self, '_cache_codificacion', codificar_bloque(
+                self.hash_anterior.hex(), self.nonce, self.hash_codigo.hex(), self.fecha_hora,
+                self.lista_verificacion, resumen_obs, self.prueba_trabajo.hex()
+            ))
+        return self._cache_codificacion
 
     def _calcular_hash_actual(self):
-        """SHA-512 del bloque."""
-        obs_json = json.dumps(self.observaciones, sort_keys=True)
-        lista_ver = "".join(["1" if x else "0" for x in self.lista_verificacion])
-        data = (f"{self.hash_anterior}{self.nonce}{self.hash_codigo}"
-                f"{self.fecha_hora}{lista_ver}{obs_json}{self.prueba_trabajo}")
-        return hashlib.sha512(data.encode('utf-8')).hexdigest()
+        """SHA-512 del bloque (sobre la forma hex de sus campos)."""
+        return hashlib.sha512(self.codificacion_canonica()).digest()
+
+    def prueba_observacion(self, indice_obs):
+        """
+        Prueba de inclusión de la observación 'indice_obs' en la raíz Merkle.
+
+        Returns:
+            Lista de (lado, hash hex) (ver verificar_inclusion_observacion)
+
+        Raises:
+            ValueError: si el bloque es anterior a VERSION_MERKLE
+            IndexError: si la observación no existe
+        """
+        if self.version < VERSION_MERKLE:
+            raise ValueError(f"El bloque (versión {self.version}) no tiene raíz Merkle")
+        return [(lado, hermano.hex())
+                for lado, hermano in prueba_inclusion(self._hojas_merkle(), indice_obs)]
 
     def _cifrar_bloque(self):
         """Cifra datos del bloque con AES."""
@@ -147,18 +445,16 @@ class Bloque:
             'codigo': self.codigo,
             'etapa': self.etapa_actual,
             'fecha': self.fecha_hora,
-            'observaciones': [obs['texto'] for obs in self.observaciones]
+            'observaciones': [obs.texto for obs in self.observaciones]
         }
         datos_json = json.dumps(datos)
         datos_bytes = datos_json.encode('utf-8')
-        datos_cifrados = aes_cipher.encrypt_ecb(datos_bytes, CLAVE_AES)
-        return datos_cifrados.hex()
+        return bytes(aes_contexto.encrypt_ecb(datos_bytes))
 
     def descifrar_bloque(self):
         """Descifra datos del bloque."""
         try:
-            datos_bytes = bytes.fromhex(self.datos_cifrados)
-            datos_descifrados = aes_cipher.decrypt_ecb(datos_bytes, CLAVE_AES)
+            datos_descifrados = aes_contexto.decrypt_ecb(self.datos_cifrados)
             if isinstance(datos_descifrados, bytes):
                 datos_json = datos_descifrados.decode('utf-8', errors='ignore')
             else:
@@ -167,7 +463,7 @@ class Bloque:
         except json.JSONDecodeError as e:
             return {
                 "nota": "Datos cifrados (no se pudo descifrar completamente)",
-                "datos_hex": self.datos_cifrados[:64] + "...",
+                "datos_hex": self.datos_cifrados[:32].hex() + "...",
                 "etapa": self.etapa_actual,
                 "fecha": self.fecha_hora
             }
@@ -180,76 +476,395 @@ class Bloque:
 
     def agregar_observacion(self, texto, rsa_interventor):
         """Agrega observación con firma RSA-512."""
-        hash_obs = hashlib.md5(texto.encode('utf-8')).hexdigest()
-        firma = rsa_interventor.firmar(hash_obs)
-        observacion = {
-            'texto': texto,
-            'hash_md5': hash_obs,
-            'firma': firma,
-            'timestamp': datetime.now().isoformat()
-        }
-        self.observaciones.append(observacion)
+        self.agregar_observaciones([texto], rsa_interventor)
+
+    def agregar_observaciones(self, textos, rsa_interventor, procesos=None):
+        """Agrega observaciones firmadas con RSA512.firmar_lote (ver PROCESOS_FIRMA)."""
+        hashes_obs = [hashlib.md5(texto.encode('utf-8')).hexdigest() for texto in textos]
+        firmas = rsa_interventor.firmar_lote(
+            hashes_obs, procesos=PROCESOS_FIRMA if procesos is None else procesos)
+        nuevas = [
+            Observacion(texto, bytes.fromhex(hash_obs), _firma_a_bytes(firma),
+                        datetime.now().isoformat())
+            for texto, hash_obs, firma in zip(textos, hashes_obs, firmas)
+        ]
+        if isinstance(self.observaciones, tuple):
+            # Bloque ya sellado: reasignar la tupla queda registrado como modificación
+            self.observaciones = self.observaciones + tuple(nuevas)
+        else:
+            self.observaciones.extend(nuevas)
+            self._adoptar_observaciones()
 
     def verificar_firma(self, indice_obs, rsa_interventor):
-        """Verifica firma RSA-512."""
+        """Verifica firma RSA-512 (rsa_interventor: RSA512 o VerificadorRSA)."""
         if indice_obs >= len(self.observaciones):
             return False
         obs = self.observaciones[indice_obs]
-        return rsa_interventor.verificar(obs['hash_md5'], obs['firma'])
+        return rsa_interventor.verificar_enteros(int.from_bytes(obs.hash_md5, 'big'),
+                                                 int.from_bytes(obs.firma, 'big'))
+
+    def pares_firma(self):
+        """(hash, firma) de cada observación como enteros, para verificar en lote."""
+        return [(int.from_bytes(obs.hash_md5, 'big'), int.from_bytes(obs.firma, 'big'))
+                for obs in self.observaciones]
+
+    def validar_bloque(self, completa=False):
+        """
+        Valida integridad del bloque.
+        Args:
+            completa: Si es True recalcula la codificación en lugar de reutilizarla
+        """
+        if completa:
+            self._invalidar_cache()
 
-    def validar_bloque(self):
-        """Valida integridad del bloque."""
-        hash_codigo_calc = hashlib.sha256(self.codigo.encode('utf-8')).hexdigest()
+        hash_codigo_calc = hashlib.sha256(self.codigo.encode('utf-8')).digest()
         if hash_codigo_calc != self.hash_codigo:
             return False, "Hash del código no coincide"
         
-        obs_text = " | ".join([obs['texto'] for obs in self.observaciones])
-        data = f"{self.nonce}{self.hash_codigo}{self.fecha_hora}{obs_text}"
-        hash_md5 = hashlib.md5(data.encode('utf-8')).hexdigest()
-        if not hash_md5.startswith("00"):
+        hash_md5 = calcular_pow(self.nonce, *self.campos_pow(), self.version)
+        if not cumple_dificultad(hash_md5, self.dificultad):
             return False, "PoW inválido"
-        if hash_md5 != self.prueba_trabajo:
+        if bytes.fromhex(hash_md5) != self.prueba_trabajo:
             return False, "Hash PoW no coincide"
         
+        if self.version >= VERSION_MERKLE and self._calcular_raiz_merkle() != self.raiz_merkle:
+            return False, "Raíz Merkle no coincide"
+
         hash_actual_calc = self._calcular_hash_actual()
         if hash_actual_calc != self.hash_actual:
             return False, "Hash actual no coincide"
         
         return True, "Bloque válido"
 
+    def a_dict(self):
+        """Estado completo del bloque en forma hex (para persistirlo)."""
+        datos = {
+            'version': self.version,
+            'dificultad': self.dificultad,
+            'hash_anterior': self.hash_anterior.hex(),
+            'codigo': self.codigo,
+            'etapa_actual': self.etapa_actual,
+            'fecha_hora': self.fecha_hora,
+            'lista_verificacion': self.lista_verificacion,
+            'hash_codigo': self.hash_codigo.hex(),
+            'observaciones': [obs.a_dict() for obs in self.observaciones],
+            'nonce': self.nonce,
+            'prueba_trabajo': self.prueba_trabajo.hex(),
+            'hash_actual': self.hash_actual.hex(),
+            'datos_cifrados': self.datos_cifrados.hex()
+        }
+        if self.version >= VERSION_MERKLE:
+            datos['raiz_merkle'] = self.raiz_merkle.hex()
+        return datos
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Reconstruye un bloque guardado sin volver a firmar ni minar."""
+        bloque = cls.__new__(cls)
+        bloque.version = datos['version']
+        bloque.dificultad = datos['dificultad']
+        bloque.hash_anterior = bytes.fromhex(datos['hash_anterior'])
+        bloque.codigo = datos['codigo']
+        bloque.etapa_actual = datos['etapa_actual']
+        bloque.fecha_hora = datos['fecha_hora']
+        bloque.verificacion = sum(1 << i for i, x in enumerate(datos['lista_verificacion']) if x)
+        bloque.hash_codigo = bytes.fromhex(datos['hash_codigo'])
+        bloque.observaciones = tuple(Observacion.desde_dict(obs) for obs in datos['observaciones'])
+        bloque.raiz_merkle = bytes.fromhex(datos.get('raiz_merkle', ''))
+        bloque.nonce = datos['nonce']
+        bloque.prueba_trabajo = bytes.fromhex(datos['prueba_trabajo'])
+        bloque.hash_actual = bytes.fromhex(datos['hash_actual'])
+        bloque.datos_cifrados = bytes.fromhex(datos['datos_cifrados'])
+        bloque._sellado = True
+        return bloque
+
     def __str__(self):
         return (f"\n{'='*70}\n"
                 f"BLOQUE - Etapa {self.etapa_actual + 1}: {self.ETAPAS[self.etapa_actual]}\n"
                 f"{'='*70}\n"
-                f"Hash Anterior: {self.hash_anterior[:32]}...\n"
-                f"Hash Código: {self.hash_codigo[:32]}...\n"
+                f"Hash Anterior: {self.hash_anterior.hex()[:32]}...\n"
+                f"Hash Código: {self.hash_codigo.hex()[:32]}...\n"
                 f"Fecha/Hora: {self.fecha_hora}\n"
                 f"Nonce: {self.nonce}\n"
-                f"Prueba Trabajo: {self.prueba_trabajo}\n"
+                f"Prueba Trabajo: {self.prueba_trabajo.hex()}\n"
                 f"Lista Verificación: {['✓' if x else '✗' for x in self.lista_verificacion]}\n"
                 f"Observaciones: {len(self.observaciones)}\n"
-                f"Datos Cifrados: {self.datos_cifrados[:32]}... (AES-128)\n"
-                f"Hash Actual: {self.hash_actual[:32]}...\n"
+                f"Raíz Merkle: {self.raiz_merkle.hex()[:32]}...\n"
+                f"Datos Cifrados: {self.datos_cifrados.hex()[:32]}... (AES-128)\n"
+                f"Hash Actual: {self.hash_actual.hex()[:32]}...\n"
                 f"{'='*70}")
 
+
+def verificar_bloque(bloque, clave_publica, completa=False):
+    """
+    Verificaciones de un bloque que no dependen del resto de la cadena
+    (se ejecuta en los procesos de validación).
+
+    Args:
+        bloque: Bloque sellado
+        clave_publica: (e, n) del interventor
+        completa: Recalcular la codificación canónica (ver Bloque.validar_bloque)
+
+    Returns:
+        (error_bloque, error_firmas): mensaje de cada verificación fallida o None
+    """
+    valido, mensaje = bloque.validar_bloque(completa)
+    if not valido:
+        return mensaje, None
+    validas = verificador_para(*clave_publica).verificar_lote(bloque.pares_firma())
+    for j, valida in enumerate(validas):
+        if not valida:
+            return None, f"firma RSA-512 inválida en observación {j}"
+    return None, None
+
+
+def verificar_bloque_simulador(bloque_data):
+    """
+    Verificaciones de un bloque del simulador que no dependen de los demás
+    (hash del código, PoW, hash actual y MD5 de observaciones), sobre el dict
+    que envía el frontend; se ejecuta en los procesos de validación.
+    """
+    resultado = {
+        "valido": True,
+        "errores": [],
+        "validaciones": {}
+    }
+
+    # 1. Validar hash del código
+    codigo_texto = bloque_data.get('codigo_texto', bloque_data.get('codigo', ''))
+    hash_codigo_calculado = hashlib.sha256(codigo_texto.encode('utf-8')).hexdigest()
+    hash_codigo_match = hash_codigo_calculado == bloque_data['codigo_hash']
+    resultado['validaciones']['hash_codigo'] = {
+        "valido": hash_codigo_match,
+        "esperado": bloque_data['codigo_hash'],
+        "calculado": hash_codigo_calculado
+    }
+    if not hash_codigo_match:
+        resultado['valido'] = False
+        resultado['errores'].append("Hash del código no coincide")
+
+    # 2. Validar PoW (MD5)
+    obs_text = " | ".join([obs['texto'] for obs in bloque_data['observaciones']])
+    version = bloque_data.get('version', VERSION_POW_LEGADO)
+    pow_calculado = calcular_pow(bloque_data['nonce'], bloque_data['codigo_hash'],
+                                 bloque_data['fecha'], obs_text, version)
+    pow_match = pow_calculado == bloque_data['pow_hash']
+    dificultad = bloque_data.get('dificultad', DIFICULTAD_POR_DEFECTO)
+    pow_valido = cumple_dificultad(pow_calculado, dificultad)
+
+    resultado['validaciones']['pow'] = {
+        "valido": pow_match and pow_valido,
+        "hash_match": pow_match,
+        "prefijo_valido": pow_valido,
+        "esperado": bloque_data['pow_hash'],
+        "calculado": pow_calculado
+    }
+    if not pow_match:
+        resultado['valido'] = False
+        resultado['errores'].append("Hash PoW no coincide")
+    if not pow_valido:
+        resultado['valido'] = False
+        resultado['errores'].append(f"PoW no tiene prefijo '{'0' * dificultad}'")
+
+    # 3. Validar hash actual del bloque
+    observaciones_normalizadas = []
+    for obs in bloque_data['observaciones']:
+        obs_normalizada = {
+            'texto': obs.get('texto', ''),
+            'hash_md5': obs.get('hash_md5', ''),
+            'firma': obs.get('firma_rsa', obs.get('firma', '')),
+            'timestamp': obs.get('timestamp', '')
+        }
+        observaciones_normalizadas.append(obs_normalizada)
+
+    hash_actual_calculado = calcular_hash_bloque(
+        bloque_data['hash_anterior'], bloque_data['nonce'], bloque_data['codigo_hash'],
+        bloque_data['fecha'], bloque_data['lista_verificacion'],
+        resumen_observaciones(observaciones_normalizadas, version), bloque_data['pow_hash'])
+    hash_actual_match = hash_actual_calculado == bloque_data['hash_actual']
+
+    resultado['validaciones']['hash_actual'] = {
+        "valido": hash_actual_match,
+        "esperado": bloque_data['hash_actual'],
+        "calculado": hash_actual_calculado
+    }
+    if not hash_actual_match:
+        resultado['valido'] = False
+        resultado['errores'].append("Hash actual no coincide")
+
+    # 4. Validar firmas MD5 de observaciones
+    firmas_validas = []
+    for idx, obs in enumerate(bloque_data['observaciones']):
+        hash_obs = hashlib.md5(obs['texto'].encode('utf-8')).hexdigest()
+        firma_valida = hash_obs == obs['hash_md5']
+        firmas_validas.append(firma_valida)
+        if not firma_valida:
+            resultado['valido'] = False
+            resultado['errores'].append(f"Hash MD5 de observación {idx} no coincide")
+
+    resultado['validaciones']['firmas'] = {
+        "validas": firmas_validas,
+        "todas_validas": all(firmas_validas)
+    }
+    return resultado
+
+
 # ============== CLASE BLOCKCHAIN ==============
+class ListaBloques(list):
+    """
+    Lista de bloques en memoria de una Blockchain: todo cambio que no sea
+    agregar al final (asignar, eliminar, insertar, reordenar) llama a
+    al_modificar(), que baja la marca de validación de la cadena.
+    """
+
+    __slots__ = ('al_modificar',)
+
+    def __init__(self, bloques=(), al_modificar=None):
+        super().__init__(bloques)
+        self.al_modificar = al_modificar
+
+    def _modificada(self):
+        if self.al_modificar is not None:
+            self.al_modificar()
+
+    def __setitem__(self, indice, valor):
+        super().__setitem__(indice, valor)
+        self._modificada()
+
+    def __delitem__(self, indice):
+        super().__delitem__(indice)
+        self._modificada()
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._modificada()
+        return self
+
+    def insert(self, indice, bloque):
+        super().insert(indice, bloque)
+        self._modificada()
+
+    def pop(self, indice=-1):
+        bloque = super().pop(indice)
+        self._modificada()
+        return bloque
+
+    def remove(self, bloque):
+        super().remove(bloque)
+        self._modificada()
+
+    def clear(self):
+        super().clear()
+        self._modificada()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._modificada()
+
+    def reverse(self):
+        super().reverse()
+        self._modificada()
+
+
 class Blockchain:
     """Blockchain completa con RSA-512 y AES."""
     
-    def __init__(self, nombre_proyecto, codigo_inicial=None):
+    def __init__(self, nombre_proyecto, codigo_inicial=None, dificultad=None,
+                 rsa_interventor=None):
+        """
+        Args:
+            rsa_interventor: Par de claves ya generado (p. ej. de pool_claves);
+                             si es None se genera uno nuevo
+        """
         self.nombre_proyecto = nombre_proyecto
+        self.dificultad = DIFICULTAD_POW if dificultad is None else dificultad
         self.cadena = []
         self.notificaciones = []  # ✅ Inicializar ANTES de usar _notificar
+        # Serializa las escrituras a la cadena (minado en segundo plano); en un
+        # RegistroCadenas se reemplaza por el candado del almacén, que también
+        # excluye a los demás procesos
+        self.candado = threading.RLock()
+        self.invalidar_validacion()
         
-        print("\n🔐 Generando claves RSA-512 del interventor...")
-        self.rsa_interventor = RSA512()
-        print(f"   ✓ RSA-512 generado (n = {self.rsa_interventor.n.bit_length()} bits)")
+        if rsa_interventor is None:
+            print("\n🔐 Generando claves RSA-512 del interventor...")
+            rsa_interventor = RSA512()
+        self.rsa_interventor = rsa_interventor
+        # Con la clave pública basta para validar (ver a_meta(privada=False))
+        self.clave_publica = rsa_interventor.obtener_clave_publica()
+        print(f"   ✓ RSA-512 listo (n = {self.rsa_interventor.n.bit_length()} bits)")
         print(f"\n🔒 Configurando cifrado AES-128")
         print(f"   Códigos grupo: {CODIGOS_GRUPO}")
         print(f"   Polinomio índice: {INDICE_POLINOMIO}")
         print(f"   Clave AES: {bytes(CLAVE_AES).hex()[:32]}...")
         self._crear_bloque_genesis(codigo_inicial)
 
+    @classmethod
+    def restaurar(cls, meta, cadena, clave=None):
+        """
+        Reconstruye una blockchain guardada a partir de sus metadatos y su cadena.
+
+        Args:
+            clave: Clave privada guardada aparte (ver clave_privada); las cadenas
+                   guardadas antes la traen en meta['rsa_interventor']
+        """
+        bc = cls.__new__(cls)
+        bc.nombre_proyecto = meta['nombre_proyecto']
+        bc.dificultad = meta['dificultad']
+        bc.cadena = cadena
+        bc.notificaciones = []
+        bc.candado = threading.RLock()
+        # Lo leído de disco se verifica completo la primera vez
+        bc.invalidar_validacion()
+        clave = clave or meta.get('rsa_interventor')
+        if clave:
+            # Las cadenas guardadas sin p y q firman sin CRT
+            p, q = clave.get('p'), clave.get('q')
+            bc.rsa_interventor = RSA512.desde_claves(int(clave['n'], 16), clave['e'],
+                                                     int(clave['d'], 16),
+                                                     int(p, 16) if p else None,
+                                                     int(q, 16) if q else None)
+        else:
+            # Nodo de solo verificación: valida la cadena pero no puede firmar
+            bc.rsa_interventor = None
+        # Las cadenas guardadas antes de exportar la clave pública la toman de la privada
+        publica = meta.get('clave_publica') or clave
+        if not publica:
+            raise ValueError("Metadatos sin clave pública del interventor")
+        bc.clave_publica = importar_clave_publica(publica).obtener_clave_publica()
+        return bc
+
+    def a_meta(self, privada=True):
+        """
+        Metadatos que se guardan junto a la cadena.
+
+        Args:
+            privada: Incluir la clave RSA privada; con False los metadatos solo
+                     sirven para validar la cadena (ver restaurar)
+        """
+        meta = {
+            'nombre_proyecto': self.nombre_proyecto,
+            'dificultad': self.dificultad,
+            'clave_publica': self.verificador().exportar_clave_publica()
+        }
+        clave = self.clave_privada() if privada else None
+        if clave is not None:
+            meta['rsa_interventor'] = clave
+        return meta
+
+    def clave_privada(self):
+        """Clave RSA privada del interventor (hex) o None en un nodo de solo verificación."""
+        rsa = self.rsa_interventor
+        if rsa is None:
+            return None
+        return {'n': hex(rsa.n), 'e': rsa.e, 'd': hex(rsa.d),
+                'p': hex(rsa.p) if rsa.p else None,
+                'q': hex(rsa.q) if rsa.q else None}
+
+    def verificador(self):
+        """Verificador de firmas del interventor (solo necesita la clave pública)."""
+        return verificador_para(*self.clave_publica)
+
     def _crear_bloque_genesis(self, codigo_inicial=None):
         """Crea bloque génesis."""
         hash_anterior = "0" * 128
@@ -269,14 +884,15 @@ class Blockchain:
             codigo=codigo_inicial,
             etapa_actual=0,
             observaciones_lista=observaciones_genesis,
-            rsa_interventor=self.rsa_interventor
+            rsa_interventor=self.rsa_interventor,
+            dificultad=self.dificultad
         )
         
         self.cadena.append(bloque_genesis)
         self._notificar(f"Blockchain inicializada: {self.nombre_proyecto}")
         print(f"✓ Blockchain inicializada")
-        print(f"✓ Hash código inicial (SHA-256): {bloque_genesis.hash_codigo[:32]}...")
-        print(f"✓ Bloque génesis: {bloque_genesis.hash_actual[:32]}...")
+        print(f"✓ Hash código inicial (SHA-256): {bloque_genesis.hash_codigo.hex()[:32]}...")
+        print(f"✓ Bloque génesis: {bloque_genesis.hash_actual.hex()[:32]}...")
 
     def agregar_etapa(self, codigo, etapa_actual, observaciones_lista):
         """
@@ -286,20 +902,46 @@ class Blockchain:
             etapa_actual: Número de etapa (0-4)
             observaciones_lista: Lista de strings con las observaciones
         """
+        nuevo_bloque = self.preparar_etapa(codigo, etapa_actual, observaciones_lista)
+        if nuevo_bloque is None:
+            return None
+
+        inicio = time.time()
+        nuevo_bloque.aplicar_pow(*minar(
+            *nuevo_bloque.campos_pow(), dificultad=nuevo_bloque.dificultad,
+            procesos=PROCESOS_MINERIA, version=nuevo_bloque.version
+        ))
+        tiempo_pow = time.time() - inicio
+        print(f"   ✓ PoW calculado en {tiempo_pow:.2f}s (nonce={nuevo_bloque.nonce})")
+
+        return self.confirmar_etapa(nuevo_bloque)
+
+    def preparar_etapa(self, codigo, etapa_actual, observaciones_lista):
+        """
+        Valida la etapa y crea el bloque con las observaciones firmadas, sin PoW.
+        El PoW se calcula aparte (ver agregar_etapa o la cola de trabajos) y el
+        bloque se agrega con confirmar_etapa().
+        """
+        if self.rsa_interventor is None:
+            self._notificar("ERROR: Cadena de solo verificación (sin clave privada)",
+                            tipo="error")
+            return None
+
         if etapa_actual < 0 or etapa_actual >= len(Bloque.ETAPAS):
             self._notificar(f"ERROR: Etapa {etapa_actual} inválida", tipo="error")
             return None
 
-        if etapa_actual > 0:
-            ultimo_bloque = self.cadena[-1]
-            if ultimo_bloque.etapa_actual != etapa_actual - 1:
-                self._notificar(
-                    f"ERROR: Debe completar etapa {ultimo_bloque.etapa_actual + 1} primero",
-                    tipo="error"
-                )
-                return None
+        # Una sola lectura: otro proceso puede agregar un bloque en cualquier momento
+        # (confirmar_etapa vuelve a revisar la etapa y el enlace con el candado)
+        ultimo_bloque = self.cadena[-1]
+        if ultimo_bloque.etapa_actual != etapa_actual - 1:
+            self._notificar(
+                f"ERROR: Debe completar etapa {ultimo_bloque.etapa_actual + 1} primero",
+                tipo="error"
+            )
+            return None
 
-        hash_anterior = self.cadena[-1].hash_actual
+        hash_anterior = ultimo_bloque.hash_actual
         
         # Convertir a lista si viene un string
         if isinstance(observaciones_lista, str):
@@ -309,18 +951,18 @@ class Blockchain:
         print(f"   📝 {len(observaciones_lista)} observaciones a firmar...")
         print(f"   ⛏️ Calculando PoW...")
         
-        inicio = time.time()
-        
-        nuevo_bloque = Bloque(
+        return Bloque(
             hash_anterior=hash_anterior,
             codigo=codigo,
             etapa_actual=etapa_actual,
             observaciones_lista=observaciones_lista,
-            rsa_interventor=self.rsa_interventor
+            rsa_interventor=self.rsa_interventor,
+            dificultad=self.dificultad,
+            minar_pow=False
         )
-        
-        tiempo_pow = time.time() - inicio
-        print(f"   ✓ PoW calculado en {tiempo_pow:.2f}s (nonce={nuevo_bloque.nonce})")
+
+    def confirmar_etapa(self, nuevo_bloque):
+        """Valida un bloque ya minado y lo agrega si sigue encadenando con el último."""
         print(f"   ✓ {len(nuevo_bloque.observaciones)} observaciones firmadas individualmente")
         print(f"   ✓ Datos cifrados con AES-128")
 
@@ -329,7 +971,17 @@ class Blockchain:
             self._notificar(f"ERROR: {mensaje}", tipo="error")
             return None
 
-        self.cadena.append(nuevo_bloque)
+        with self.candado:
+            ultimo_bloque = self.cadena[-1]
+            if (nuevo_bloque.hash_anterior != ultimo_bloque.hash_actual or
+                    nuevo_bloque.etapa_actual != ultimo_bloque.etapa_actual + 1):
+                # Otro bloque se agregó mientras este se minaba
+                self._notificar("ERROR: La cadena cambió mientras se minaba el bloque",
+                                tipo="error")
+                return None
+            self.cadena.append(nuevo_bloque)
+
+        etapa_actual = nuevo_bloque.etapa_actual
         self._notificar(
             f"Etapa {etapa_actual + 1} completada: {Bloque.ETAPAS[etapa_actual]}",
             tipo="success"
@@ -338,29 +990,117 @@ class Blockchain:
         
         return nuevo_bloque
 
-    def validar_cadena(self):
-        """Valida toda la cadena."""
+    @property
+    def cadena(self):
+        return self._cadena
+
+    @cadena.setter
+    def cadena(self, bloques):
+        """Reemplazar la cadena la revalida desde el inicio."""
+        if isinstance(bloques, list):
+            bloques = ListaBloques(bloques, self.invalidar_validacion)
+        elif isinstance(bloques, CadenaConCache):
+            # Los bloques que se vuelven a leer del almacén también avisan
+            bloques.al_leer = self._vigilar
+        self._cadena = bloques
+        self.invalidar_validacion()
+
+    def _vigilar(self, bloque):
+        bloque.agregar_vigilante(self)
+
+    def invalidar_validacion(self, desde=0):
+        """
+        Baja la marca de validación para que se revaliden los bloques desde
+        'desde'. La llaman la lista de bloques y los bloques ya validados de
+        esta cadena cuando se modifican.
+        """
+        if desde <= 0 or self.validado_hasta < 0:
+            self.validado_hasta = -1
+            self._hash_validado = None
+        elif desde - 1 < self.validado_hasta:
+            self.validado_hasta = desde - 1
+            self._hash_validado = self.cadena[desde - 1].hash_actual
+
+    def _marca_vigente(self):
+        """La marca sigue en el mismo bloque (la cadena pudo acortarse o reemplazarse)."""
+        if self.validado_hasta < 0:
+            return True
+        return (self.validado_hasta < len(self.cadena) and
+                self.cadena[self.validado_hasta].hash_actual == self._hash_validado)
+
+    def validar_cadena(self, full=False, procesos=None):
+        """
+        Valida la cadena.
+        Args:
+            full: Si es True revalida todo (auditoría); si no, solo los bloques
+                  posteriores a la marca de validación
+            procesos: Procesos de validación (por defecto PROCESOS_VALIDACION)
+        """
         print(f"\n{'='*70}")
-        print("VALIDANDO BLOCKCHAIN COMPLETA")
+        print("VALIDANDO BLOCKCHAIN COMPLETA" if full else "VALIDANDO BLOCKCHAIN (INCREMENTAL)")
         print(f"{'='*70}")
         
-        for i, bloque in enumerate(self.cadena):
-            valido, mensaje = bloque.validar_bloque()
+        for i, valido, mensaje in self.validar_cadena_pasos(full, procesos):
             if not valido:
-                return False, f"Bloque {i} inválido: {mensaje}"
-            
-            if i > 0:
-                if bloque.hash_anterior != self.cadena[i-1].hash_actual:
-                    return False, f"Bloque {i}: hash anterior no coincide"
-            
-            for j in range(len(bloque.observaciones)):
-                if not bloque.verificar_firma(j, self.rsa_interventor):
-                    return False, f"Bloque {i}: firma RSA-512 inválida en observación {j}"
-            
-            print(f"✓ Bloque {i} (Etapa {bloque.etapa_actual + 1}): VÁLIDO")
+                return False, mensaje
         
         return True, "Blockchain íntegra y válida"
 
+    def validar_cadena_pasos(self, full=False, procesos=None):
+        """
+        Valida bloque a bloque y genera (indice, valido, mensaje) por cada uno;
+        se detiene en el primer bloque inválido.
+
+        Con procesos > 1 las verificaciones de cada bloque se reparten en lotes
+        en un pool (ver validacion.py); los enlaces se revisan aquí, en orden,
+        así que el resultado es el mismo que el de la validación secuencial.
+
+        Los bloques hasta 'validado_hasta' (hash, PoW, enlace y firmas ya
+        verificados) se omiten salvo con full=True, si alguno de ellos se
+        modificó o si el bloque de la marca ya no es el mismo (hash_actual).
+        Al avanzar, la marca queda en el último bloque válido. Con full=True
+        tampoco se reutiliza la codificación canónica memorizada de los bloques.
+        """
+        if full or not self._marca_vigente():
+            self.invalidar_validacion()
+
+        inicio = self.validado_hasta + 1
+        anterior = self.cadena[inicio - 1] if inicio > 0 else None
+        bloques = (self.cadena[i] for i in range(inicio, len(self.cadena)))
+        verificar = partial(verificar_bloque,
+                            clave_publica=self.clave_publica,
+                            completa=full)
+        resultados = validar_en_lotes(bloques, verificar,
+                                      PROCESOS_VALIDACION if procesos is None else procesos)
+
+        with closing(resultados):
+            for i, (bloque, (error_bloque, error_firmas)) in enumerate(resultados, inicio):
+                if error_bloque:
+                    yield i, False, f"Bloque {i} inválido: {error_bloque}"
+                    return
+
+                if anterior is not None and bloque.hash_anterior != anterior.hash_actual:
+                    yield i, False, f"Bloque {i}: hash anterior no coincide"
+                    return
+
+                etapa_esperada = 0 if anterior is None else anterior.etapa_actual + 1
+                if bloque.etapa_actual != etapa_esperada:
+                    yield i, False, (f"Bloque {i}: etapa {bloque.etapa_actual + 1} fuera de orden "
+                                     f"(se esperaba la etapa {etapa_esperada + 1})")
+                    return
+
+                if error_firmas:
+                    yield i, False, f"Bloque {i}: {error_firmas}"
+                    return
+
+                anterior = bloque
+                self._vigilar(bloque)
+                self.validado_hasta = i
+                self._hash_validado = bloque.hash_actual
+                mensaje = f"Bloque {i} (Etapa {bloque.etapa_actual + 1}): VÁLIDO"
+                print(f"✓ {mensaje}")
+                yield i, True, mensaje
+
     def _notificar(self, mensaje, tipo="info"):
         """Registra notificación."""
         notificacion = {
@@ -386,6 +1126,119 @@ class Blockchain:
             print(f"{icono} [{notif['timestamp']}] {notif['mensaje']}")
 
 
+# ============== PERSISTENCIA ==============
+class RegistroCadenas(MutableMapping):
+    """
+    Diccionario id -> Blockchain respaldado en disco.
+
+    Al asignar una cadena se guardan sus metadatos y sus bloques pasan al
+    almacén (AlmacenCadenas o AlmacenSQLite); al leer un id que no está en
+    memoria solo se abren sus metadatos: los bloques se leen bajo demanda.
+
+    Varios procesos (workers de uvicorn) pueden usar el mismo almacén: los ids
+    se reservan en el almacén y el candado de cada cadena cargada es el del
+    almacén, compartido entre procesos.
+    """
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self._cargadas = {}
+        self._candado = threading.Lock()
+
+    def __getitem__(self, cadena_id):
+        with self._candado:
+            # Otro proceso pudo eliminarla
+            if not self.almacen.existe(cadena_id):
+                self._cerrar(cadena_id)
+                raise KeyError(cadena_id)
+            bc = self._cargadas.get(cadena_id)
+            if bc is None:
+                meta, cadena = self.almacen.abrir(cadena_id)
+                bc = Blockchain.restaurar(meta, cadena, self.almacen.leer_clave(cadena_id))
+                bc.candado = self.almacen.candado(cadena_id)
+                self._cargadas[cadena_id] = bc
+            return bc
+
+    def __setitem__(self, cadena_id, bc):
+        with self._candado:
+            self._cerrar(cadena_id)
+            self.almacen.eliminar(cadena_id)
+            candado = self.almacen.candado(cadena_id)
+            with bc.candado, candado:
+                # Los bloques se guardan antes de publicar la cadena; la clave
+                # privada va aparte, con permisos restringidos
+                bc.cadena = self.almacen.crear(cadena_id, bc.a_meta(privada=False), bc.cadena,
+                                               clave=bc.clave_privada())
+                bc.invalidar_validacion()
+            bc.candado = candado
+            self._cargadas[cadena_id] = bc
+
+    def __delitem__(self, cadena_id):
+        with self._candado:
+            if cadena_id not in self._cargadas and not self.almacen.existe(cadena_id):
+                raise KeyError(cadena_id)
+            self._cerrar(cadena_id)
+            self.almacen.eliminar(cadena_id)
+
+    def __contains__(self, cadena_id):
+        return self.almacen.existe(cadena_id)
+
+    def __iter__(self):
+        return iter(self.almacen.ids())
+
+    def __len__(self):
+        return len(self.almacen.ids())
+
+    def reservar_id(self, prefijo="bc_"):
+        """Id nuevo, que ningún otro proceso con el mismo almacén recibirá."""
+        return self.almacen.reservar_id(prefijo)
+
+    def _cerrar(self, cadena_id):
+        bc = self._cargadas.pop(cadena_id, None)
+        if bc is not None and isinstance(bc.cadena, CadenaConCache):
+            bc.cadena.cerrar()
+
+    def cerrar(self):
+        """Sincroniza y cierra las cadenas abiertas y el almacén."""
+        with self._candado:
+            for cadena_id in list(self._cargadas):
+                self._cerrar(cadena_id)
+            self.almacen.cerrar()
+
+
+_ids_en_memoria = itertools.count()
+_candado_ids = threading.Lock()
+
+
+def reservar_id_cadena(registro, prefijo="bc_"):
+    """
+    Id para una cadena nueva. Con un RegistroCadenas lo reserva el almacén
+    (único entre procesos); con un dict en memoria, único en este proceso.
+    """
+    if isinstance(registro, RegistroCadenas):
+        return registro.reservar_id(prefijo)
+    with _candado_ids:
+        while True:
+            cadena_id = f"{prefijo}{next(_ids_en_memoria)}"
+            if cadena_id not in registro:
+                return cadena_id
+
+
+def crear_registro_cadenas(directorio=DIR_DATOS, backend=BACKEND_ALMACEN):
+    """Registro persistente si hay directorio de datos; si no, un dict en memoria."""
+    if not directorio:
+        return {}
+    if backend == "sqlite":
+        almacen = AlmacenSQLite(os.path.join(directorio, "cadenas.db"),
+                                Bloque.a_dict, Bloque.desde_dict)
+    elif backend == "log":
+        almacen = AlmacenCadenas(directorio, Bloque.a_dict, Bloque.desde_dict)
+    else:
+        raise ValueError(f"BACKEND_ALMACEN desconocido: {backend}")
+    print(f"💾 Cadenas persistidas en: {directorio} ({backend})")
+    return RegistroCadenas(almacen)
+
+
 # ============== DEMO COMPLETA ==============
 def demo_completa():
     """Demostración completa del sistema."""
@@ -1,14 +1,26 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, MutableMapping, Optional
+import asyncio
 import hashlib
 import json
 import time
 import os
 
 # Importar blockchain
-from blockchain import Blockchain, Bloque, INDICE_POLINOMIO
+from blockchain import (Blockchain, Bloque, INDICE_POLINOMIO, PROCESOS_VALIDACION,
+                        RegistroCadenas, calcular_hash_bloque, codificar_bloque,
+                        crear_registro_cadenas,
+                        reservar_id_cadena, resumen_observaciones,
+                        verificar_bloque_simulador, verificar_inclusion_observacion)
+from mineria import DIFICULTAD_POR_DEFECTO, VERSION_POW_LEGADO, minar
+from pool_claves import PoolClaves
+from rsa512 import importar_clave_publica
+from trabajos import COMPLETADO, CANCELADO, ColaLlenaError, GestorTrabajos
+from validacion import validar_en_lotes
 
 app = FastAPI(title="Blockchain API", version="1.0.0")
 
@@ -44,8 +56,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Almacenamiento
-blockchains: Dict[str, Blockchain] = {}
+# Almacenamiento (en disco si DIR_DATOS está definido; ver almacenamiento.py)
+blockchains: MutableMapping[str, Blockchain] = crear_registro_cadenas()
+
+# Workers de uvicorn (--workers lee WEB_CONCURRENCY): comparten las cadenas a
+# través del almacén, así que con más de uno DIR_DATOS es obligatorio. Los
+# trabajos de minado viven en el worker que los creó: con más de uno, los
+# endpoints /async y /jobs responden 501 (ver _exigir_trabajos_locales).
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+if WORKERS > 1 and not isinstance(blockchains, RegistroCadenas):
+    raise RuntimeError("Con WEB_CONCURRENCY > 1 se debe definir DIR_DATOS "
+                       "(las cadenas en memoria no se comparten entre workers)")
+
+# Nonce máximo que prueba /fraude/recalcular-nonce
+LIMITE_NONCE = 10000000
+
+# Cola de trabajos de minado (el PoW no corre en el hilo de la petición)
+gestor_trabajos = GestorTrabajos()
+
+# Claves RSA pregeneradas en segundo plano (crear una cadena no espera primos);
+# la reserva y sus procesos se reparten entre los workers
+pool_claves = PoolClaves(workers=WORKERS)
+
+@app.on_event("startup")
+def iniciar_pool_claves():
+    pool_claves.iniciar()
+
+@app.on_event("shutdown")
+def cerrar_trabajos():
+    pool_claves.cerrar()
+    gestor_trabajos.cerrar()
+    if isinstance(blockchains, RegistroCadenas):
+        blockchains.cerrar()
 
 # ============== MODELOS ==============
 class CreateBlockchainRequest(BaseModel):
@@ -65,6 +107,8 @@ class RecalcularNonceRequest(BaseModel):
     hash_codigo: str
     fecha: str
     observaciones: List[str]
+    dificultad: int = DIFICULTAD_POR_DEFECTO
+    version: int = VERSION_POW_LEGADO
 
 class RecalcularHashActualRequest(BaseModel):
     hash_anterior: str
@@ -74,6 +118,17 @@ class RecalcularHashActualRequest(BaseModel):
     lista_verificacion: List[bool]
     observaciones: List[dict]
     pow_hash: str
+    version: int = VERSION_POW_LEGADO
+
+class VerificarFirmaRequest(BaseModel):
+    clave_publica: dict
+    hash: str
+    firma: str
+
+class VerificarInclusionRequest(BaseModel):
+    observacion: dict
+    prueba: List[List[str]]
+    raiz_merkle: str
 
 # ✅ NUEVOS MODELOS PARA FRAUDE
 class CodigoRequest(BaseModel):
@@ -87,15 +142,16 @@ class TextoRequest(BaseModel):
 
 @app.get("/")
 def root():
-    return {"status": "running", "message": "Blockchain API v1.0"}
+    return {"status": "running", "message": "Blockchain API v1.0", "pid": os.getpid()}
 
 @app.post("/blockchain/create")
 def create_blockchain(request: CreateBlockchainRequest):
     try:
-        blockchain_id = f"bc_{len(blockchains)}"
+        blockchain_id = reservar_id_cadena(blockchains)
         
         # ✅ Pasar el código inicial desde el request
-        bc = Blockchain(request.projectName, request.codigoInicial)
+        bc = Blockchain(request.projectName, request.codigoInicial,
+                        rsa_interventor=pool_claves.obtener())
         blockchains[blockchain_id] = bc
         
         print(f"✅ Blockchain guardada con ID: {blockchain_id}")
@@ -108,7 +164,7 @@ def create_blockchain(request: CreateBlockchainRequest):
             "blockchain_id": blockchain_id,
             "blockchain": {
                 "name": bc.nombre_proyecto,
-                "rsaBits": 512,
+                "rsaBits": bc.rsa_interventor.n.bit_length(),
                 "createdAt": genesis.fecha_hora
             },
             "genesis_block": serialize_block(genesis, 0),
@@ -117,7 +173,7 @@ def create_blockchain(request: CreateBlockchainRequest):
                 {"type": "info", "message": f"🆔 ID: {blockchain_id}"},
                 {"type": "success", "message": f"✅ Bloque génesis (nonce={genesis.nonce})"},
                 {"type": "success", "message": f"✅ {len(genesis.observaciones)} observación inicial firmada"},
-                {"type": "info", "message": f"💾 Hash del código inicial: {genesis.hash_codigo[:16]}..."}
+                {"type": "info", "message": f"💾 Hash del código inicial: {genesis.hash_codigo.hex()[:16]}..."}
             ]
         }
     except Exception as e:
@@ -136,8 +192,32 @@ def get_blocks(blockchain_id: str):
         "blocks": [serialize_block(block, idx) for idx, block in enumerate(bc.cadena)]
     }
 
-@app.post("/blockchain/{blockchain_id}/aprobar-etapa")
-def aprobar_etapa(blockchain_id: str, request: AprobarEtapaRequest):
+def _exigir_trabajos_locales():
+    """501 si hay varios workers: otra petición sobre el mismo job_id podría caer en otro."""
+    if WORKERS > 1:
+        raise HTTPException(
+            status_code=501,
+            detail=f"Trabajos asíncronos no disponibles con {WORKERS} workers; "
+                   "use el endpoint síncrono")
+
+def _enviar_trabajo(tipo, funcion, *args, **kwargs):
+    """Encola un trabajo de minado; 429 si la cola está llena."""
+    try:
+        return gestor_trabajos.enviar(tipo, funcion, *args, **kwargs)
+    except ColaLlenaError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+async def _esperar_resultado(trabajo, codigo_error=500):
+    """Espera (sin bloquear el event loop) a que termine el trabajo y retorna su resultado."""
+    await asyncio.shield(asyncio.wrap_future(trabajo.finalizado))
+    if trabajo.estado == COMPLETADO:
+        return trabajo.resultado
+    if trabajo.estado == CANCELADO:
+        raise HTTPException(status_code=409, detail="Trabajo cancelado")
+    raise HTTPException(status_code=codigo_error, detail=trabajo.error)
+
+def _enviar_aprobar_etapa(blockchain_id: str, request: AprobarEtapaRequest):
+    """Firma las observaciones y encola el PoW del nuevo bloque."""
     print(f"🔍 Buscando blockchain: {blockchain_id}")
     
     if blockchain_id not in blockchains:
@@ -145,21 +225,25 @@ def aprobar_etapa(blockchain_id: str, request: AprobarEtapaRequest):
     
     bc = blockchains[blockchain_id]
     
-    try:
-        # ✅ CORREGIDO: Pasar lista de observaciones directamente
-        print(f"📝 Recibidas {len(request.observaciones)} observaciones")
-        for i, obs in enumerate(request.observaciones, 1):
-            print(f"   {i}. {obs[:50]}...")
-        
-        nuevo_bloque = bc.agregar_etapa(
-            request.codigo, 
-            request.etapa, 
-            request.observaciones  # ✅ Lista completa, no concatenada
-        )
-        
-        if nuevo_bloque is None:
-            raise HTTPException(status_code=400, detail="No se pudo agregar el bloque")
-        
+    # ✅ CORREGIDO: Pasar lista de observaciones directamente
+    print(f"📝 Recibidas {len(request.observaciones)} observaciones")
+    for i, obs in enumerate(request.observaciones, 1):
+        print(f"   {i}. {obs[:50]}...")
+    
+    nuevo_bloque = bc.preparar_etapa(
+        request.codigo, 
+        request.etapa, 
+        request.observaciones  # ✅ Lista completa, no concatenada
+    )
+    
+    if nuevo_bloque is None:
+        raise HTTPException(status_code=400, detail="No se pudo agregar el bloque")
+
+    def al_terminar(resultado, duracion):
+        print(f"   ✓ PoW calculado en {duracion:.2f}s")
+        nuevo_bloque.aplicar_pow(*resultado)
+        if bc.confirmar_etapa(nuevo_bloque) is None:
+            raise ValueError(f"No se pudo agregar el bloque: {bc.notificaciones[-1]['mensaje']}")
         return {
             "success": True,
             "block": serialize_block(nuevo_bloque, len(bc.cadena) - 1),
@@ -167,9 +251,20 @@ def aprobar_etapa(blockchain_id: str, request: AprobarEtapaRequest):
                 {"type": "success", "message": f"✅ Etapa {request.etapa + 1} completada"},
                 {"type": "success", "message": f"✅ {len(nuevo_bloque.observaciones)} observaciones firmadas con RSA-512"},
                 {"type": "info", "message": f"⛏️ Nonce: {nuevo_bloque.nonce}"},
-                {"type": "info", "message": f"🔐 Hash PoW: {nuevo_bloque.prueba_trabajo[:16]}..."}
+                {"type": "info", "message": f"🔐 Hash PoW: {nuevo_bloque.prueba_trabajo.hex()[:16]}..."}
             ]
         }
+
+    return _enviar_trabajo("aprobar-etapa", minar, *nuevo_bloque.campos_pow(),
+                           dificultad=nuevo_bloque.dificultad,
+                           version=nuevo_bloque.version, al_terminar=al_terminar)
+
+@app.post("/blockchain/{blockchain_id}/aprobar-etapa")
+async def aprobar_etapa(blockchain_id: str, request: AprobarEtapaRequest):
+    try:
+        # Abrir la cadena, firmar y encolar bloquean: fuera del event loop
+        trabajo = await run_in_threadpool(_enviar_aprobar_etapa, blockchain_id, request)
+        return await _esperar_resultado(trabajo, codigo_error=400)
     except HTTPException:
         raise
     except Exception as e:
@@ -178,24 +273,57 @@ def aprobar_etapa(blockchain_id: str, request: AprobarEtapaRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/blockchain/{blockchain_id}/aprobar-etapa/async", status_code=202)
+def aprobar_etapa_async(blockchain_id: str, request: AprobarEtapaRequest):
+    """Igual que aprobar-etapa pero retorna de inmediato el id del trabajo (ver /jobs/{id})."""
+    _exigir_trabajos_locales()
+    trabajo = _enviar_aprobar_etapa(blockchain_id, request)
+    return {"success": True, "job_id": trabajo.id, "estado": trabajo.estado}
+
 
 @app.post("/blockchain/{blockchain_id}/validate")
-def validate_blockchain(blockchain_id: str):
+def validate_blockchain(blockchain_id: str, full: bool = False):
+    """Valida los bloques nuevos desde la última validación (full=true: toda la cadena)."""
     if blockchain_id not in blockchains:
         raise HTTPException(status_code=404, detail="Blockchain not found")
     
     bc = blockchains[blockchain_id]
-    valida, mensaje = bc.validar_cadena()
+    valida, mensaje = bc.validar_cadena(full=full)
     
     return {
         "valid": valida,
         "message": mensaje,
+        "full": full,
+        "validado_hasta": bc.validado_hasta,
         "logs": [
             {"type": "info", "message": "🔍 Validando blockchain..."},
             {"type": "success" if valida else "error", "message": mensaje}
         ]
     }
 
+@app.get("/blockchain/{blockchain_id}/validate/stream")
+def validate_blockchain_stream(blockchain_id: str, full: bool = False):
+    """Valida la cadena y emite (SSE) un evento 'bloque' por bloque y un evento 'fin'."""
+    if blockchain_id not in blockchains:
+        raise HTTPException(status_code=404, detail="Blockchain not found")
+    
+    bc = blockchains[blockchain_id]
+
+    def generar():
+        inicio = time.time()
+        total = len(bc.cadena)
+        valida, mensaje = True, "Blockchain íntegra y válida"
+        for i, valido, mensaje_bloque in bc.validar_cadena_pasos(full):
+            yield _evento_sse("bloque", {"indice": i, "total": total,
+                                         "valido": valido, "mensaje": mensaje_bloque})
+            if not valido:
+                valida, mensaje = False, mensaje_bloque
+        yield _evento_sse("fin", {"valid": valida, "message": mensaje, "full": full,
+                                  "validado_hasta": bc.validado_hasta,
+                                  "tiempo": round(time.time() - inicio, 3)})
+
+    return _respuesta_sse(generar())
+
 @app.delete("/blockchain/{blockchain_id}")
 def delete_blockchain(blockchain_id: str):
     if blockchain_id not in blockchains:
@@ -215,96 +343,12 @@ def validar_bloque_fraude(request: ValidarBloqueRequest):
         print(f"\n🔍 Validando bloque fraude...")
         print(f"   Bloque ID: {bloque_data.get('id', 'N/A')}")
         
-        resultados = {
-            "valido": True,
-            "errores": [],
-            "validaciones": {}
-        }
-        
-        # 1. Validar hash del código
-        codigo_texto = bloque_data.get('codigo_texto', bloque_data.get('codigo', ''))
-        hash_codigo_calculado = hashlib.sha256(codigo_texto.encode('utf-8')).hexdigest()
-        hash_codigo_match = hash_codigo_calculado == bloque_data['codigo_hash']
-        resultados['validaciones']['hash_codigo'] = {
-            "valido": hash_codigo_match,
-            "esperado": bloque_data['codigo_hash'],
-            "calculado": hash_codigo_calculado
-        }
-        if not hash_codigo_match:
-            resultados['valido'] = False
-            resultados['errores'].append("Hash del código no coincide")
-        
-        # 2. Validar PoW (MD5)
-        obs_text = " | ".join([obs['texto'] for obs in bloque_data['observaciones']])
-        data_pow = f"{bloque_data['nonce']}{bloque_data['codigo_hash']}{bloque_data['fecha']}{obs_text}"
-        pow_calculado = hashlib.md5(data_pow.encode('utf-8')).hexdigest()
-        pow_match = pow_calculado == bloque_data['pow_hash']
-        pow_valido = pow_calculado.startswith("00")
-        
-        resultados['validaciones']['pow'] = {
-            "valido": pow_match and pow_valido,
-            "hash_match": pow_match,
-            "prefijo_valido": pow_valido,
-            "esperado": bloque_data['pow_hash'],
-            "calculado": pow_calculado
-        }
-        if not pow_match:
-            resultados['valido'] = False
-            resultados['errores'].append("Hash PoW no coincide")
-        if not pow_valido:
-            resultados['valido'] = False
-            resultados['errores'].append("PoW no tiene prefijo '00'")
-        
-        # 3. Validar hash actual - USAR EL MISMO MÉTODO QUE LA BLOCKCHAIN
-        # ✅ IMPORTANTE: Ordenar las observaciones igual que en blockchain.py
-        observaciones_ordenadas = [
-            {
-                'texto': obs['texto'],
-                'hash_md5': obs['hash_md5'],
-                'firma': obs.get('firma_rsa', obs.get('firma', '')),
-                'timestamp': obs['timestamp']
-            }
-            for obs in bloque_data['observaciones']
-        ]
-        
-        obs_json = json.dumps(observaciones_ordenadas, sort_keys=True)
-        lista_ver = "".join(["1" if x else "0" for x in bloque_data['lista_verificacion']])
-        data_hash = (f"{bloque_data['hash_anterior']}{bloque_data['nonce']}{bloque_data['codigo_hash']}"
-                     f"{bloque_data['fecha']}{lista_ver}{obs_json}{bloque_data['pow_hash']}")
-        hash_actual_calculado = hashlib.sha512(data_hash.encode('utf-8')).hexdigest()
-        hash_actual_match = hash_actual_calculado == bloque_data['hash_actual']
-        
-        # Debug para ver qué está pasando
-        if not hash_actual_match:
+        resultados = verificar_bloque_simulador(bloque_data)
+        if not resultados['validaciones']['hash_actual']['valido']:
+            hash_actual = resultados['validaciones']['hash_actual']
             print(f"   ❌ Hash no coincide:")
-            print(f"      Esperado: {bloque_data['hash_actual'][:32]}...")
-            print(f"      Calculado: {hash_actual_calculado[:32]}...")
-            print(f"      Data para hash: {data_hash[:100]}...")
-            print(f"      Obs JSON: {obs_json[:100]}...")
-        
-        resultados['validaciones']['hash_actual'] = {
-            "valido": hash_actual_match,
-            "esperado": bloque_data['hash_actual'],
-            "calculado": hash_actual_calculado
-        }
-        if not hash_actual_match:
-            resultados['valido'] = False
-            resultados['errores'].append("Hash actual no coincide")
-        
-        # 4. Validar firmas RSA de observaciones
-        firmas_validas = []
-        for idx, obs in enumerate(bloque_data['observaciones']):
-            hash_obs = hashlib.md5(obs['texto'].encode('utf-8')).hexdigest()
-            firma_valida = hash_obs == obs['hash_md5']
-            firmas_validas.append(firma_valida)
-            if not firma_valida:
-                resultados['valido'] = False
-                resultados['errores'].append(f"Hash MD5 de observación {idx} no coincide")
-        
-        resultados['validaciones']['firmas'] = {
-            "validas": firmas_validas,
-            "todas_validas": all(firmas_validas)
-        }
+            print(f"      Esperado: {hash_actual['esperado'][:32]}...")
+            print(f"      Calculado: {hash_actual['calculado'][:32]}...")
         
         print(f"   Resultado: {'✅ VÁLIDO' if resultados['valido'] else '❌ CORRUPTO'}")
         if resultados['errores']:
@@ -347,39 +391,50 @@ async def recalcular_hash_observacion(request: TextoRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _enviar_recalcular_nonce(request: RecalcularNonceRequest):
+    """Encola la búsqueda del nonce."""
+    print(f"\n⛏️ Recalculando nonce...")
+    obs_text = " | ".join(request.observaciones)
+
+    def al_terminar(resultado, duracion):
+        if resultado is None:
+            raise ValueError("No se encontró nonce válido (límite excedido)")
+        nonce, hash_md5 = resultado
+        print(f"   ✅ Nonce encontrado: {nonce} en {duracion:.2f}s")
+        return {
+            "nonce": nonce,
+            "pow_hash": hash_md5,
+            "tiempo": round(duracion, 2),
+            "intentos": nonce
+        }
+
+    # Límite de seguridad: nonces 0..10.000.000
+    return _enviar_trabajo("recalcular-nonce", minar, request.hash_codigo, request.fecha,
+                           obs_text, dificultad=request.dificultad,
+                           limite=LIMITE_NONCE + 1, version=request.version,
+                           al_terminar=al_terminar)
+
 @app.post("/fraude/recalcular-nonce")
-def recalcular_nonce(request: RecalcularNonceRequest):
+async def recalcular_nonce(request: RecalcularNonceRequest):
     """Recalcula el nonce para PoW"""
     try:
-        print(f"\n⛏️ Recalculando nonce...")
-        obs_text = " | ".join(request.observaciones)
-        nonce = 0
-        inicio = time.time()
-        
-        while True:
-            data = f"{nonce}{request.hash_codigo}{request.fecha}{obs_text}"
-            hash_md5 = hashlib.md5(data.encode('utf-8')).hexdigest()
-            if hash_md5.startswith("00"):
-                tiempo = time.time() - inicio
-                print(f"   ✅ Nonce encontrado: {nonce} en {tiempo:.2f}s")
-                return {
-                    "nonce": nonce,
-                    "pow_hash": hash_md5,
-                    "tiempo": round(tiempo, 2),
-                    "intentos": nonce
-                }
-            nonce += 1
-            
-            # Límite de seguridad
-            if nonce > 10000000:
-                raise HTTPException(status_code=500, detail="No se encontró nonce válido (límite excedido)")
-                
+        trabajo = await run_in_threadpool(_enviar_recalcular_nonce, request)
+        return await _esperar_resultado(trabajo)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/fraude/recalcular-nonce/async", status_code=202)
+def recalcular_nonce_async(request: RecalcularNonceRequest):
+    """Igual que recalcular-nonce pero retorna de inmediato el id del trabajo."""
+    _exigir_trabajos_locales()
+    trabajo = _enviar_recalcular_nonce(request)
+    return {"success": True, "job_id": trabajo.id, "estado": trabajo.estado}
+
 @app.post("/fraude/recalcular-hash-actual")
 def recalcular_hash_actual(request: RecalcularHashActualRequest):
     """Recalcula el hash SHA-512 del bloque"""
@@ -397,20 +452,16 @@ def recalcular_hash_actual(request: RecalcularHashActualRequest):
             }
             observaciones_normalizadas.append(obs_normalizada)
         
-        # Serializar con sort_keys=True (igual que blockchain.py)
-        obs_json = json.dumps(observaciones_normalizadas, sort_keys=True)
-        lista_ver = "".join(["1" if x else "0" for x in request.lista_verificacion])
-        
-        data = (f"{request.hash_anterior}{request.nonce}{request.hash_codigo}"
-                f"{request.fecha}{lista_ver}{obs_json}{request.pow_hash}")
-        
-        hash_actual = hashlib.sha512(data.encode('utf-8')).hexdigest()
+        # JSON con sort_keys=True o raíz Merkle, según la versión (igual que blockchain.py)
+        resumen_obs = resumen_observaciones(observaciones_normalizadas, request.version)
+        hash_actual = calcular_hash_bloque(
+            request.hash_anterior, request.nonce, request.hash_codigo, request.fecha,
+            request.lista_verificacion, resumen_obs, request.pow_hash)
         
         # Debug
         print(f"   Nonce: {request.nonce}")
         print(f"   Hash código: {request.hash_codigo[:32]}...")
-        print(f"   Lista verificación: {lista_ver}")
-        print(f"   Observaciones JSON: {obs_json[:100]}...")
+        print(f"   Observaciones (versión {request.version}): {resumen_obs[:100]}...")
         print(f"   Hash calculado: {hash_actual[:32]}...")
         
         return {"hash": hash_actual}
@@ -437,23 +488,26 @@ def debug_comparar_hash(request: dict):
             }
             obs_normalizadas.append(obs_normalizada)
         
-        obs_json_normalizado = json.dumps(obs_normalizadas, sort_keys=True)
+        # Mismos helpers que la cadena: JSON de las observaciones o raíz Merkle (v3)
+        version = bloque_data.get('version', VERSION_POW_LEGADO)
+        obs_json_normalizado = resumen_observaciones(obs_normalizadas, version)
         
         # Método 2: Directo
-        obs_json_directo = json.dumps(bloque_data['observaciones'], sort_keys=True)
+        obs_json_directo = resumen_observaciones(bloque_data['observaciones'], version)
         
-        lista_ver = "".join(["1" if x else "0" for x in bloque_data['lista_verificacion']])
+        campos = (bloque_data['hash_anterior'], bloque_data['nonce'], bloque_data['codigo_hash'],
+                  bloque_data['fecha'], bloque_data['lista_verificacion'])
+        data_normalizado = codificar_bloque(*campos, obs_json_normalizado,
+                                            bloque_data['pow_hash']).decode('utf-8')
+        data_directo = codificar_bloque(*campos, obs_json_directo,
+                                        bloque_data['pow_hash']).decode('utf-8')
         
-        data_normalizado = (f"{bloque_data['hash_anterior']}{bloque_data['nonce']}{bloque_data['codigo_hash']}"
-                           f"{bloque_data['fecha']}{lista_ver}{obs_json_normalizado}{bloque_data['pow_hash']}")
-        
-        data_directo = (f"{bloque_data['hash_anterior']}{bloque_data['nonce']}{bloque_data['codigo_hash']}"
-                       f"{bloque_data['fecha']}{lista_ver}{obs_json_directo}{bloque_data['pow_hash']}")
-        
-        hash_normalizado = hashlib.sha512(data_normalizado.encode('utf-8')).hexdigest()
-        hash_directo = hashlib.sha512(data_directo.encode('utf-8')).hexdigest()
+        hash_normalizado = calcular_hash_bloque(*campos, obs_json_normalizado,
+                                                bloque_data['pow_hash'])
+        hash_directo = calcular_hash_bloque(*campos, obs_json_directo, bloque_data['pow_hash'])
         
         return {
+            "version": version,
             "hash_esperado": bloque_data['hash_actual'],
             "hash_normalizado": hash_normalizado,
             "hash_directo": hash_directo,
@@ -471,82 +525,23 @@ def debug_comparar_hash(request: dict):
 
 @app.post("/fraude/validar-cadena-completa")
 def validar_cadena_completa(request: dict):
-    """Valida la cadena completa considerando los enlaces entre bloques"""
+    """
+    Valida la cadena completa considerando los enlaces entre bloques.
+
+    Las verificaciones de cada bloque se reparten en lotes entre
+    PROCESOS_VALIDACION procesos; los enlaces se revisan en orden al recorrer
+    los resultados.
+    """
     try:
         bloques = request['bloques']
         resultados = []
+        primer_invalido = None
         
         print(f"\n🔍 Validando cadena completa ({len(bloques)} bloques)...")
         
-        for index, bloque_data in enumerate(bloques):
-            resultado = {
-                "valido": True,
-                "errores": [],
-                "validaciones": {}
-            }
-            
-            # 1. Validar hash del código
-            codigo_texto = bloque_data.get('codigo_texto', bloque_data.get('codigo', ''))
-            hash_codigo_calculado = hashlib.sha256(codigo_texto.encode('utf-8')).hexdigest()
-            hash_codigo_match = hash_codigo_calculado == bloque_data['codigo_hash']
-            resultado['validaciones']['hash_codigo'] = {
-                "valido": hash_codigo_match,
-                "esperado": bloque_data['codigo_hash'],
-                "calculado": hash_codigo_calculado
-            }
-            if not hash_codigo_match:
-                resultado['valido'] = False
-                resultado['errores'].append("Hash del código no coincide")
-            
-            # 2. Validar PoW (MD5)
-            obs_text = " | ".join([obs['texto'] for obs in bloque_data['observaciones']])
-            data_pow = f"{bloque_data['nonce']}{bloque_data['codigo_hash']}{bloque_data['fecha']}{obs_text}"
-            pow_calculado = hashlib.md5(data_pow.encode('utf-8')).hexdigest()
-            pow_match = pow_calculado == bloque_data['pow_hash']
-            pow_valido = pow_calculado.startswith("00")
-            
-            resultado['validaciones']['pow'] = {
-                "valido": pow_match and pow_valido,
-                "hash_match": pow_match,
-                "prefijo_valido": pow_valido,
-                "esperado": bloque_data['pow_hash'],
-                "calculado": pow_calculado
-            }
-            if not pow_match:
-                resultado['valido'] = False
-                resultado['errores'].append("Hash PoW no coincide")
-            if not pow_valido:
-                resultado['valido'] = False
-                resultado['errores'].append("PoW no tiene prefijo '00'")
-            
-            # 3. Validar hash actual del bloque
-            observaciones_normalizadas = []
-            for obs in bloque_data['observaciones']:
-                obs_normalizada = {
-                    'texto': obs.get('texto', ''),
-                    'hash_md5': obs.get('hash_md5', ''),
-                    'firma': obs.get('firma_rsa', obs.get('firma', '')),
-                    'timestamp': obs.get('timestamp', '')
-                }
-                observaciones_normalizadas.append(obs_normalizada)
-            
-            obs_json = json.dumps(observaciones_normalizadas, sort_keys=True)
-            lista_ver = "".join(["1" if x else "0" for x in bloque_data['lista_verificacion']])
-            data_hash = (f"{bloque_data['hash_anterior']}{bloque_data['nonce']}{bloque_data['codigo_hash']}"
-                        f"{bloque_data['fecha']}{lista_ver}{obs_json}{bloque_data['pow_hash']}")
-            hash_actual_calculado = hashlib.sha512(data_hash.encode('utf-8')).hexdigest()
-            hash_actual_match = hash_actual_calculado == bloque_data['hash_actual']
-            
-            resultado['validaciones']['hash_actual'] = {
-                "valido": hash_actual_match,
-                "esperado": bloque_data['hash_actual'],
-                "calculado": hash_actual_calculado
-            }
-            if not hash_actual_match:
-                resultado['valido'] = False
-                resultado['errores'].append("Hash actual no coincide")
-            
-            # 4. ✅ VALIDAR ENLACE CON EL BLOQUE ANTERIOR (EFECTO CASCADA)
+        verificados = validar_en_lotes(bloques, verificar_bloque_simulador, PROCESOS_VALIDACION)
+        for index, (bloque_data, resultado) in enumerate(verificados):
+            # ✅ VALIDAR ENLACE CON EL BLOQUE ANTERIOR (EFECTO CASCADA)
             if index > 0:
                 bloque_anterior = bloques[index - 1]
                 enlace_valido = bloque_data['hash_anterior'] == bloque_anterior['hash_actual']
@@ -562,28 +557,15 @@ def validar_cadena_completa(request: dict):
                     resultado['errores'].append(f"Cadena rota: hash_anterior no coincide con hash_actual del Bloque #{index - 1}")
                     print(f"   ❌ Bloque #{index}: CADENA ROTA")
             
-            # 5. Validar firmas MD5 de observaciones
-            firmas_validas = []
-            for idx, obs in enumerate(bloque_data['observaciones']):
-                hash_obs = hashlib.md5(obs['texto'].encode('utf-8')).hexdigest()
-                firma_valida = hash_obs == obs['hash_md5']
-                firmas_validas.append(firma_valida)
-                if not firma_valida:
-                    resultado['valido'] = False
-                    resultado['errores'].append(f"Hash MD5 de observación {idx} no coincide")
-            
-            resultado['validaciones']['firmas'] = {
-                "validas": firmas_validas,
-                "todas_validas": all(firmas_validas)
-            }
-            
+            if not resultado['valido'] and primer_invalido is None:
+                primer_invalido = index
             print(f"   Bloque #{index}: {'✅ VÁLIDO' if resultado['valido'] else '❌ CORRUPTO'}")
             if resultado['errores']:
                 print(f"      Errores: {', '.join(resultado['errores'])}")
             
             resultados.append(resultado)
         
-        return {"resultados": resultados}
+        return {"resultados": resultados, "primer_bloque_invalido": primer_invalido}
         
     except Exception as e:
         print(f"❌ Error en validar-cadena-completa: {str(e)}")
@@ -613,7 +595,8 @@ def descifrar_bloque(blockchain_id: str, bloque_index: int):
         
         bloque = bc.cadena[bloque_index]
         print(f"  ✅ Bloque obtenido - Etapa: {bloque.etapa_actual}")
-        print(f"  Datos cifrados (hex): {bloque.datos_cifrados[:64]}...")
+        datos_cifrados_hex = bloque.datos_cifrados.hex()
+        print(f"  Datos cifrados (hex): {datos_cifrados_hex[:64]}...")
         
         # Intentar descifrar
         print(f"  🔄 Intentando descifrar...")
@@ -624,10 +607,10 @@ def descifrar_bloque(blockchain_id: str, bloque_index: int):
         return {
             "success": True,
             "bloque_index": bloque_index,
-            "datos_cifrados_hex": bloque.datos_cifrados[:128] + "...",
+            "datos_cifrados_hex": datos_cifrados_hex[:128] + "...",
             "datos_descifrados": datos_descifrados,
             "algoritmo": f"AES-128 ECB (Polinomio índice {INDICE_POLINOMIO})",
-            "longitud_cifrado": len(bloque.datos_cifrados),
+            "longitud_cifrado": len(datos_cifrados_hex),
             "logs": [
                 {"type": "info", "message": f"🔓 Descifrando bloque #{bloque_index}..."},
                 {"type": "success", "message": f"✅ AES-128 descifrado exitosamente"},
@@ -645,31 +628,242 @@ def descifrar_bloque(blockchain_id: str, bloque_index: int):
 
 
 
+# ============== MÉTRICAS ==============
+@app.get("/claves/metricas")
+def metricas_claves():
+    """Estado de la reserva de claves RSA (profundidad, aciertos, tasa de recarga)."""
+    return pool_claves.metricas()
+
+
+# ============== CLAVES PÚBLICAS ==============
+@app.get("/blockchain/{blockchain_id}/clave-publica")
+def clave_publica_cadena(blockchain_id: str):
+    """Clave pública del interventor: basta para validar las firmas de la cadena."""
+    if blockchain_id not in blockchains:
+        raise HTTPException(status_code=404, detail="Blockchain not found")
+    verificador = blockchains[blockchain_id].verificador()
+    return {
+        "clave_publica": verificador.exportar_clave_publica(),
+        "bits": verificador.n.bit_length()
+    }
+
+
+@app.post("/claves/verificar-firma")
+def verificar_firma(request: VerificarFirmaRequest):
+    """Verifica una firma (hex) de un hash (hex) con una clave pública exportada."""
+    try:
+        verificador = importar_clave_publica(request.clave_publica)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"valida": verificador.verificar(request.hash, request.firma)}
+
+
+# ============== PRUEBAS DE INCLUSIÓN (MERKLE) ==============
+@app.get("/blockchain/{blockchain_id}/bloque/{bloque_index}/observacion/{obs_index}/prueba")
+def prueba_inclusion_observacion(blockchain_id: str, bloque_index: int, obs_index: int):
+    """
+    Prueba de que una observación pertenece a un bloque: la observación, los
+    hashes hermanos hasta la raíz Merkle y los campos con los que la raíz
+    entra en el hash del bloque.
+    """
+    if blockchain_id not in blockchains:
+        raise HTTPException(status_code=404, detail="Blockchain not found")
+    bc = blockchains[blockchain_id]
+    if not 0 <= bloque_index < len(bc.cadena):
+        raise HTTPException(status_code=404, detail="Bloque no encontrado")
+    bloque = bc.cadena[bloque_index]
+    if not 0 <= obs_index < len(bloque.observaciones):
+        raise HTTPException(status_code=404, detail="Observación no encontrada")
+    try:
+        prueba = bloque.prueba_observacion(obs_index)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {
+        "bloque_index": bloque_index,
+        "obs_index": obs_index,
+        "observacion": bloque.observaciones[obs_index].a_dict(),
+        "prueba": prueba,
+        "raiz_merkle": bloque.raiz_merkle.hex(),
+        "hash_actual": bloque.hash_actual.hex(),
+        # Con estos campos y la raíz se recalcula hash_actual (calcular_hash_bloque)
+        "encabezado": {
+            "hash_anterior": bloque.hash_anterior.hex(),
+            "nonce": bloque.nonce,
+            "hash_codigo": bloque.hash_codigo.hex(),
+            "fecha": bloque.fecha_hora,
+            "lista_verificacion": bloque.lista_verificacion,
+            "pow_hash": bloque.prueba_trabajo.hex()
+        }
+    }
+
+@app.post("/merkle/verificar-inclusion")
+def verificar_inclusion_merkle(request: VerificarInclusionRequest):
+    """Verifica una prueba de inclusión contra una raíz Merkle (sin consultar la cadena)."""
+    valido = verificar_inclusion_observacion(request.observacion, request.prueba,
+                                             request.raiz_merkle)
+    return {"valido": valido, "hashes_en_prueba": len(request.prueba)}
+
+
+# ============== BÚSQUEDAS ==============
+def _almacen_indexado():
+    """Almacén con búsquedas indexadas (SQLite) o None si las cadenas están en memoria/log."""
+    almacen = getattr(blockchains, "almacen", None)
+    return almacen if hasattr(almacen, "buscar_bloques") else None
+
+def _buscar_bloques(**filtros):
+    """(blockchain_id, indice) de los bloques que cumplen los filtros."""
+    filtros = {campo: valor for campo, valor in filtros.items() if valor is not None}
+    if not filtros:
+        raise HTTPException(status_code=400, detail="Debe indicar al menos un filtro")
+    almacen = _almacen_indexado()
+    if almacen is not None:
+        return almacen.buscar_bloques(**filtros)
+    # Sin índices: recorre todas las cadenas
+    return [
+        (blockchain_id, indice)
+        for blockchain_id in list(blockchains)
+        for indice, bloque in enumerate(blockchains[blockchain_id].cadena)
+        if all(_valor_api(getattr(bloque, campo)) == valor for campo, valor in filtros.items())
+    ]
+
+def _valor_api(valor):
+    """Los digests del bloque son bytes; la API los expone en hex."""
+    return valor.hex() if isinstance(valor, bytes) else valor
+
+def _serializar_resultados(encontrados):
+    return {
+        "indexado": _almacen_indexado() is not None,
+        "resultados": [
+            {"blockchain_id": blockchain_id,
+             "block": serialize_block(blockchains[blockchain_id].cadena[indice], indice)}
+            for blockchain_id, indice in encontrados
+        ]
+    }
+
+@app.get("/buscar/bloque/{hash_actual}")
+def buscar_bloque_por_hash(hash_actual: str):
+    """Bloque (y su cadena) con el hash SHA-512 dado."""
+    encontrados = _buscar_bloques(hash_actual=hash_actual)
+    if not encontrados:
+        raise HTTPException(status_code=404, detail="Bloque no encontrado")
+    return _serializar_resultados(encontrados[:1])
+
+@app.get("/buscar/bloques")
+def buscar_bloques(hash_codigo: Optional[str] = None, hash_anterior: Optional[str] = None,
+                   etapa: Optional[int] = None):
+    """Bloques por hash del código (entregable), hash anterior y/o etapa (0-4)."""
+    return _serializar_resultados(_buscar_bloques(
+        hash_codigo=hash_codigo, hash_anterior=hash_anterior, etapa_actual=etapa))
+
+@app.get("/buscar/cadenas")
+def buscar_cadenas(etapa: int):
+    """Cadenas cuyo último bloque está en la etapa dada (0-4)."""
+    almacen = _almacen_indexado()
+    if almacen is not None:
+        cadenas = [(blockchain_id, meta['nombre_proyecto'], num_bloques)
+                   for blockchain_id, meta, num_bloques in almacen.cadenas_en_etapa(etapa)]
+    else:
+        cadenas = []
+        for blockchain_id in list(blockchains):
+            bc = blockchains[blockchain_id]
+            if bc.cadena[-1].etapa_actual == etapa:
+                cadenas.append((blockchain_id, bc.nombre_proyecto, len(bc.cadena)))
+    return {
+        "indexado": almacen is not None,
+        "cadenas": [
+            {"blockchain_id": blockchain_id, "name": nombre, "etapa": etapa, "bloques": num_bloques}
+            for blockchain_id, nombre, num_bloques in cadenas
+        ]
+    }
+
+
+# ============== TRABAJOS DE MINADO ==============
+def _evento_sse(evento: str, datos: dict):
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(datos)}\n\n"
+
+def _respuesta_sse(eventos):
+    return StreamingResponse(eventos, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _obtener_trabajo(job_id: str):
+    _exigir_trabajos_locales()
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+@app.get("/jobs/{job_id}")
+def obtener_trabajo(job_id: str):
+    """Estado del trabajo y su resultado cuando termina."""
+    return _obtener_trabajo(job_id).a_dict()
+
+@app.get("/jobs/{job_id}/esperar")
+async def esperar_trabajo(job_id: str, timeout: float = 30.0):
+    """Espera a que el trabajo termine (como máximo 'timeout' segundos) y retorna su estado."""
+    trabajo = _obtener_trabajo(job_id)
+    try:
+        await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(trabajo.finalizado)),
+                               timeout=min(max(timeout, 0.0), 300.0))
+    except asyncio.TimeoutError:
+        pass
+    return trabajo.a_dict()
+
+@app.get("/jobs/{job_id}/eventos")
+async def eventos_trabajo(job_id: str, intervalo: float = 0.5):
+    """
+    Progreso del trabajo por SSE: eventos 'progreso' (nonce actual, intentos,
+    hashes por segundo) cada 'intervalo' segundos y un evento 'fin' con el resultado.
+    """
+    trabajo = _obtener_trabajo(job_id)
+    intervalo = min(max(intervalo, 0.1), 10.0)
+
+    async def generar():
+        terminado = asyncio.wrap_future(trabajo.finalizado)
+        while trabajo.activo:
+            yield _evento_sse("progreso", trabajo.a_dict())
+            await asyncio.wait({terminado}, timeout=intervalo)
+        yield _evento_sse("fin", trabajo.a_dict())
+
+    return _respuesta_sse(generar())
+
+@app.delete("/jobs/{job_id}")
+def cancelar_trabajo(job_id: str):
+    """Cancela un trabajo pendiente o en ejecución."""
+    _obtener_trabajo(job_id)
+    return gestor_trabajos.cancelar(job_id).a_dict()
+
+
 # ============== SERIALIZACIÓN ==============
 def serialize_block(bloque: Bloque, index: int):
-    """Serializa un bloque para JSON"""
+    """Serializa un bloque para JSON (aquí se pasan a hex los digests y firmas)"""
     return {
         "id": index,
+        "version": bloque.version,
         "etapa": bloque.etapa_actual,
         "fecha": bloque.fecha_hora,
-        "hash_anterior": bloque.hash_anterior,
-        "codigo_hash": bloque.hash_codigo,
+        "hash_anterior": bloque.hash_anterior.hex(),
+        "codigo_hash": bloque.hash_codigo.hex(),
         "codigo_texto": bloque.codigo,
         "nonce": bloque.nonce,
-        "pow_hash": bloque.prueba_trabajo,
-        "hash_actual": bloque.hash_actual,
+        "pow_hash": bloque.prueba_trabajo.hex(),
+        "dificultad": bloque.dificultad,
+        "hash_actual": bloque.hash_actual.hex(),
+        "raiz_merkle": bloque.raiz_merkle.hex(),
         "lista_verificacion": bloque.lista_verificacion,
         "observaciones": [
             {
-                "texto": obs['texto'],
-                "hash_md5": obs['hash_md5'],
-                "firma_rsa": obs['firma'],
-                "timestamp": obs['timestamp']
+                "texto": obs.texto,
+                "hash_md5": obs.hash_md5.hex(),
+                "firma_rsa": obs.firma_hex,
+                "timestamp": obs.timestamp
             }
             for obs in bloque.observaciones
         ],
-        "cifrado_aes": bloque.datos_cifrados[:64] + "..." if len(bloque.datos_cifrados) > 64 else bloque.datos_cifrados
-        # ✅ datos_cifrados (sin "a") es el correcto
+        # Los primeros 32 bytes (64 caracteres hex) del cifrado AES
+        "cifrado_aes": (bloque.datos_cifrados[:32].hex() + "..." if len(bloque.datos_cifrados) > 32
+                        else bloque.datos_cifrados.hex())
     }
 
 if __name__ == "__main__":
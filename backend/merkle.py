@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Árbol de Merkle (SHA-256) para pruebas de inclusión en O(log n)
+
+- Hoja: SHA-256(0x00 || datos); nodo interno: SHA-256(0x01 || izquierdo || derecho)
+  (prefijos distintos: una hoja no puede hacerse pasar por un nodo interno)
+- Un nodo sin pareja sube sin cambios al nivel siguiente (no se duplica)
+- Raíz de un árbol sin hojas: SHA-256 de la cadena vacía
+- Prueba de inclusión: hermanos desde la hoja hasta la raíz, con su lado
+"""
+
+import hashlib
+
+PREFIJO_HOJA = b"\x00"
+PREFIJO_NODO = b"\x01"
+
+IZQUIERDA = "izquierda"
+DERECHA = "derecha"
+
+
+def hash_hoja(datos):
+    """Hash de una hoja a partir de sus datos (bytes)."""
+    return hashlib.sha256(PREFIJO_HOJA + datos).digest()
+
+
+def hash_nodo(izquierdo, derecho):
+    return hashlib.sha256(PREFIJO_NODO + izquierdo + derecho).digest()
+
+
+def _siguiente_nivel(nivel):
+    siguiente = [hash_nodo(nivel[i], nivel[i + 1]) for i in range(0, len(nivel) - 1, 2)]
+    if len(nivel) % 2:
+        siguiente.append(nivel[-1])
+    return siguiente
+
+
+def raiz_merkle(hojas):
+    """Raíz del árbol cuyas hojas son los hashes dados (ver hash_hoja)."""
+    if not hojas:
+        return hashlib.sha256(b"").digest()
+    nivel = list(hojas)
+    while len(nivel) > 1:
+        nivel = _siguiente_nivel(nivel)
+    return nivel[0]
+
+
+def prueba_inclusion(hojas, indice):
+    """
+    Prueba de que la hoja 'indice' pertenece al árbol.
+
+    Returns:
+        Lista de (lado, hash) de los hermanos, desde la hoja hasta la raíz;
+        'lado' indica si el hermano va a la izquierda o a la derecha
+    """
+    if not 0 <= indice < len(hojas):
+        raise IndexError("Índice de hoja fuera de rango")
+    prueba = []
+    nivel = list(hojas)
+    while len(nivel) > 1:
+        hermano = indice ^ 1
+        if hermano < len(nivel):
+            prueba.append((IZQUIERDA if hermano < indice else DERECHA, nivel[hermano]))
+        nivel = _siguiente_nivel(nivel)
+        indice //= 2
+    return prueba
+
+
+def verificar_inclusion(hoja, prueba, raiz):
+    """Verifica que la hoja, combinada con los hermanos de la prueba, da la raíz."""
+    actual = hoja
+    for lado, hermano in prueba:
+        if lado == IZQUIERDA:
+            actual = hash_nodo(hermano, actual)
+        elif lado == DERECHA:
+            actual = hash_nodo(actual, hermano)
+        else:
+            return False
+    return actual == raiz
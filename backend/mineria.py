@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de Prueba de Trabajo (PoW) con MD5
+
+- Búsqueda secuencial o repartida en un pool de procesos
+- Dificultad configurable: prefijo de ceros hexadecimales o bits
+- Siempre retorna el menor nonce válido (mismo resultado que la búsqueda secuencial)
+- Formato versionado de los datos del PoW
+- Cancelación cooperativa y reporte de progreso (para minar en segundo plano)
+"""
+
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Prefijo "00" en hexadecimal
+DIFICULTAD_POR_DEFECTO = 2
+
+# Versiones del formato de los datos del PoW
+# 1: MD5(nonce + hash_codigo + fecha + observaciones)
+# 2: MD5(hash_codigo + fecha + observaciones + nonce); la parte constante se
+#    hashea una sola vez y cada intento copia ese estado y agrega el nonce,
+#    así el costo por intento no depende del largo de las observaciones
+VERSION_POW_LEGADO = 1
+VERSION_POW_PREFIJO = 2
+
+# Nonces por tarea en la búsqueda paralela
+NONCES_POR_TAREA = 20000
+
+# Cada cuántos lotes (de 10 intentos) un proceso revisa si otro ya encontró un nonce menor
+LOTES_POR_REVISION = 100
+
+# Segundos mínimos entre dos reportes de progreso
+INTERVALO_PROGRESO = 0.25
+
+
+class MineriaCancelada(Exception):
+    """La búsqueda del nonce se canceló antes de terminar."""
+
+
+def bits_de_dificultad(dificultad=DIFICULTAD_POR_DEFECTO, bits=None):
+    """Bits en cero exigidos al inicio del hash (cada carácter hex son 4 bits)."""
+    if bits is None:
+        bits = 4 * dificultad
+    if not 0 <= bits <= 128:
+        raise ValueError("La dificultad debe estar entre 0 y 128 bits")
+    return bits
+
+
+def cumple_dificultad(hash_hex, dificultad=DIFICULTAD_POR_DEFECTO, bits=None):
+    """Verifica que un hash MD5 (hex) cumpla la dificultad."""
+    bits = bits_de_dificultad(dificultad, bits)
+    return int(hash_hex, 16) >> (128 - bits) == 0
+
+
+def datos_pow(nonce, hash_codigo, fecha_hora, obs_text, version=VERSION_POW_LEGADO):
+    """Cadena sobre la que se calcula el PoW según la versión del formato."""
+    if version <= VERSION_POW_LEGADO:
+        return f"{nonce}{hash_codigo}{fecha_hora}{obs_text}"
+    return f"{hash_codigo}{fecha_hora}{obs_text}{nonce}"
+
+
+def calcular_pow(nonce, hash_codigo, fecha_hora, obs_text, version=VERSION_POW_LEGADO):
+    """MD5 (hex) del PoW para un nonce."""
+    datos = datos_pow(nonce, hash_codigo, fecha_hora, obs_text, version)
+    return hashlib.md5(datos.encode('utf-8')).hexdigest()
+
+
+def _lote_legado(md5, buf, ult, d_ini, d_fin, maximo):
+    """Lote de intentos v1: el nonce está al inicio del buffer, antes de la parte constante."""
+    for d in range(d_ini, d_fin):
+        buf[ult] = d
+        digest = md5(buf).digest()
+        if digest <= maximo:
+            return d, digest
+    return None
+
+
+def _lote_prefijo(base, buf, ult, d_ini, d_fin, maximo):
+    """Lote de intentos v2: copia el estado MD5 de la parte constante y agrega el nonce."""
+    for d in range(d_ini, d_fin):
+        buf[ult] = d
+        h = base.copy()
+        h.update(buf)
+        digest = h.digest()
+        if digest <= maximo:
+            return d, digest
+    return None
+
+
+def _buscar_rango(constante, inicio, fin, objetivo, version):
+    """
+    Busca el primer nonce en [inicio, fin) cuyo MD5 sea menor que el objetivo.
+
+    Kernel sobre bytes: el nonce en decimal ASCII vive en un bytearray reutilizable,
+    los intentos se agrupan en lotes de 10 que solo cambian el último dígito
+    (sin formatear enteros ni armar cadenas por intento) y el digest se compara
+    como bytes contra el máximo permitido.
+
+    Returns:
+        (nonce, hash_hex) o None si no hay nonce válido en el rango
+        (o si otro proceso ya encontró uno menor)
+    """
+    md5 = hashlib.md5
+    maximo = (objetivo - 1).to_bytes(16, 'big')
+    legado = version <= VERSION_POW_LEGADO
+    base = None if legado else md5(constante)
+    mejor = _MEJOR_NONCE
+
+    ancho = 0
+    buf = None
+    lotes = 0
+    nonce = inicio
+    while nonce < fin:
+        if mejor is not None and lotes % LOTES_POR_REVISION == 0 and mejor.value <= nonce:
+            return None
+        lotes += 1
+
+        # El lote cubre los nonces que solo difieren en el último dígito
+        digitos = str(nonce).encode('ascii')
+        if len(digitos) != ancho:
+            ancho = len(digitos)
+            buf = bytearray(digitos + constante) if legado else bytearray(digitos)
+        else:
+            buf[:ancho] = digitos
+        ult = ancho - 1
+        fin_lote = min(fin, nonce - nonce % 10 + 10)
+        d_ini = digitos[ult]
+        d_fin = d_ini + (fin_lote - nonce)
+
+        if legado:
+            encontrado = _lote_legado(md5, buf, ult, d_ini, d_fin, maximo)
+        else:
+            encontrado = _lote_prefijo(base, buf, ult, d_ini, d_fin, maximo)
+        if encontrado:
+            d, digest = encontrado
+            nonce += d - d_ini
+            if mejor is not None:
+                with mejor.get_lock():
+                    if nonce < mejor.value:
+                        mejor.value = nonce
+            return nonce, digest.hex()
+        nonce = fin_lote
+    return None
+
+
+# Menor nonce encontrado, compartido entre los procesos del pool
+_MEJOR_NONCE = None
+
+
+def _inicializar_proceso(mejor_nonce):
+    global _MEJOR_NONCE
+    _MEJOR_NONCE = mejor_nonce
+
+
+def minar(hash_codigo, fecha_hora, obs_text, dificultad=DIFICULTAD_POR_DEFECTO,
+          bits=None, procesos=None, nonce_inicial=0, limite=None, version=VERSION_POW_LEGADO,
+          cancelacion=None, progreso=None):
+    """
+    Busca el menor nonce válido a partir de nonce_inicial.
+
+    Args:
+        hash_codigo, fecha_hora, obs_text: Campos del bloque incluidos en el PoW
+        dificultad: Cantidad de ceros hexadecimales al inicio del hash
+        bits: Alternativa a 'dificultad': cantidad de bits en cero
+        procesos: Si es > 1, reparte el espacio de nonces en un pool de procesos
+        nonce_inicial: Primer nonce a probar
+        limite: Nonce máximo (exclusivo); None = sin límite
+        version: Versión del formato de los datos del PoW
+        cancelacion: Evento opcional (is_set()); se revisa entre rangos de nonces
+        progreso: Callable opcional; recibe nonce, intentos y hashes_por_segundo
+            entre rangos de nonces (como máximo cada INTERVALO_PROGRESO segundos)
+
+    Returns:
+        (nonce, hash_md5_hex), o None si se alcanzó el límite
+
+    Raises:
+        MineriaCancelada: si el evento de cancelación se activó
+    """
+    objetivo = 1 << (128 - bits_de_dificultad(dificultad, bits))
+    constante = f"{hash_codigo}{fecha_hora}{obs_text}".encode('utf-8')
+
+    reportar = _Reporte(progreso, nonce_inicial) if progreso is not None else None
+
+    if not procesos or procesos <= 1:
+        fin = limite
+        inicio = nonce_inicial
+        while fin is None or inicio < fin:
+            _revisar_cancelacion(cancelacion)
+            tope = inicio + NONCES_POR_TAREA if fin is None else min(inicio + NONCES_POR_TAREA, fin)
+            resultado = _buscar_rango(constante, inicio, tope, objetivo, version)
+            if resultado:
+                return resultado
+            inicio = tope
+            if reportar:
+                reportar(inicio)
+        return None
+
+    return _minar_paralelo(constante, objetivo, procesos, nonce_inicial, limite, version,
+                           cancelacion, reportar)
+
+
+class _Reporte:
+    """Calcula intentos y hashes por segundo y los entrega al callable de progreso."""
+
+    def __init__(self, progreso, nonce_inicial):
+        self.progreso = progreso
+        self.nonce_inicial = nonce_inicial
+        self.inicio = time.perf_counter()
+        self.ultimo = self.inicio
+
+    def __call__(self, nonce):
+        ahora = time.perf_counter()
+        if ahora - self.ultimo < INTERVALO_PROGRESO:
+            return
+        self.ultimo = ahora
+        intentos = nonce - self.nonce_inicial
+        self.progreso(nonce=nonce, intentos=intentos,
+                      hashes_por_segundo=round(intentos / (ahora - self.inicio)))
+
+
+def _revisar_cancelacion(cancelacion):
+    if cancelacion is not None and cancelacion.is_set():
+        raise MineriaCancelada("Minado cancelado")
+
+
+def _minar_paralelo(constante, objetivo, procesos, nonce_inicial, limite, version,
+                    cancelacion=None, reportar=None):
+    """
+    Reparte rangos consecutivos de nonces entre procesos.
+
+    Al encontrar un nonce se dejan de enviar rangos; los rangos en curso
+    menores que el encontrado terminan (podrían contener uno menor) y los
+    mayores se detienen al ver el valor compartido.
+    """
+    tope = limite if limite is not None else (1 << 63) - 1
+    mejor_nonce = multiprocessing.Value('q', tope)
+    mejor = None
+    siguiente = nonce_inicial
+    pendientes = set()
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                             initargs=(mejor_nonce,)) as pool:
+        while True:
+            while mejor is None and siguiente < tope and len(pendientes) < 2 * procesos:
+                fin = min(siguiente + NONCES_POR_TAREA, tope)
+                pendientes.add(pool.submit(_buscar_rango, constante, siguiente, fin, objetivo, version))
+                siguiente = fin
+            if not pendientes:
+                return mejor
+            if cancelacion is not None and cancelacion.is_set():
+                mejor_nonce.value = -1  # detiene los rangos en curso
+                for futuro in pendientes:
+                    futuro.cancel()
+                raise MineriaCancelada("Minado cancelado")
+            hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                resultado = futuro.result()
+                if resultado and (mejor is None or resultado[0] < mejor[0]):
+                    mejor = resultado
+            if reportar:
+                # Aproximado: rangos enviados menos los que siguen en curso
+                reportar(siguiente - len(pendientes) * NONCES_POR_TAREA)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Reserva de pares de claves RSA generados en segundo plano
+
+- Un pool de procesos mantiene hasta PROFUNDIDAD_POOL_CLAVES pares listos
+- obtener() entrega un par listo al instante y encarga uno nuevo
+- Si la reserva está vacía, el par se genera en el momento (fallo de la reserva)
+- Métricas: profundidad, pares en generación, aciertos/fallos y tasa de recarga
+- Con varios workers de uvicorn cada uno tiene su reserva: la profundidad y
+  los procesos configurados son del servidor y se reparten entre los workers;
+  si no alcanza un proceso por worker, la reserva se desactiva y cada par se
+  genera en el momento (subir PROCESOS_CLAVES a WEB_CONCURRENCY o más)
+"""
+
+import contextlib
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from rsa512 import RSA512
+
+# Pares listos que se intentan mantener en reserva (entre todos los workers)
+PROFUNDIDAD_POOL_CLAVES = int(os.getenv("PROFUNDIDAD_POOL_CLAVES", "4"))
+# Procesos que generan claves en segundo plano (entre todos los workers)
+PROCESOS_CLAVES = int(os.getenv("PROCESOS_CLAVES", "1"))
+# Segundos de historia para calcular la tasa de recarga
+VENTANA_METRICAS = 60.0
+
+
+def _generar_par():
+    """Corre en el proceso del pool: genera un par (sin los mensajes de RSA512)."""
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rsa = RSA512()
+    return rsa, time.perf_counter() - inicio
+
+
+class PoolClaves:
+    """Reserva de instancias RSA512 listas para usar."""
+
+    def __init__(self, profundidad=PROFUNDIDAD_POOL_CLAVES, procesos=PROCESOS_CLAVES,
+                 workers=1):
+        """
+        Args:
+            profundidad: Pares en reserva entre todos los workers
+            procesos: Procesos generadores entre todos los workers
+            workers: Workers del servidor, cada uno con su PoolClaves; con menos
+                     de un proceso por worker la reserva queda desactivada
+        """
+        self.procesos = procesos // workers
+        self.profundidad = profundidad // workers if self.procesos > 0 else 0
+        self._listas = deque()
+        self._en_generacion = 0
+        # Reentrante: un futuro ya terminado ejecuta su callback en quien lo registra
+        self._candado = threading.RLock()
+        self._pool = None
+        self._cerrado = False
+        # Métricas
+        self._aciertos = 0
+        self._fallos = 0
+        self._generadas = 0
+        self._tiempo_generacion = 0.0
+        self._terminadas = deque()  # instantes en que se completó cada par
+
+    def iniciar(self):
+        """Crea el pool de procesos y empieza a llenar la reserva."""
+        with self._candado:
+            if self._pool is None and not self._cerrado and self.profundidad > 0:
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+            self._rellenar()
+
+    def _rellenar(self):
+        """Encarga los pares que faltan para llegar a la profundidad (con el candado tomado)."""
+        if self._pool is None:
+            return
+        while len(self._listas) + self._en_generacion < self.profundidad:
+            try:
+                futuro = self._pool.submit(_generar_par)
+            except RuntimeError:
+                # El pool se está cerrando
+                return
+            self._en_generacion += 1
+            futuro.add_done_callback(self._par_generado)
+
+    def _par_generado(self, futuro):
+        with self._candado:
+            self._en_generacion -= 1
+            if futuro.cancelled() or futuro.exception() is not None:
+                return
+            rsa, duracion = futuro.result()
+            self._listas.append(rsa)
+            self._registrar_generacion(duracion)
+
+    def _registrar_generacion(self, duracion):
+        ahora = time.monotonic()
+        self._generadas += 1
+        self._tiempo_generacion += duracion
+        self._terminadas.append(ahora)
+        while self._terminadas and ahora - self._terminadas[0] > VENTANA_METRICAS:
+            self._terminadas.popleft()
+
+    def obtener(self):
+        """Un par de claves nuevo: de la reserva si hay, si no se genera en el momento."""
+        if self._pool is None:
+            self.iniciar()
+        with self._candado:
+            rsa = self._listas.popleft() if self._listas else None
+            if rsa is not None:
+                self._aciertos += 1
+            else:
+                self._fallos += 1
+            self._rellenar()
+        if rsa is None:
+            rsa, duracion = _generar_par()
+            with self._candado:
+                self._registrar_generacion(duracion)
+        return rsa
+
+    def metricas(self):
+        with self._candado:
+            ahora = time.monotonic()
+            recientes = [t for t in self._terminadas if ahora - t <= VENTANA_METRICAS]
+            entregadas = self._aciertos + self._fallos
+            return {
+                "profundidad": len(self._listas),
+                "profundidad_objetivo": self.profundidad,
+                "en_generacion": self._en_generacion,
+                "procesos": self.procesos,
+                "generadas": self._generadas,
+                "entregadas": entregadas,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / entregadas, 3) if entregadas else None,
+                "tasa_recarga_por_minuto": round(len(recientes) * 60.0 / VENTANA_METRICAS, 2),
+                "tiempo_medio_generacion": (round(self._tiempo_generacion / self._generadas, 4)
+                                            if self._generadas else None)
+            }
+
+    def cerrar(self):
+        """Descarta lo pendiente y libera el pool."""
+        with self._candado:
+            self._cerrado = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -9,10 +9,51 @@ Created on Wed Dec 10 16:05:58 2025
 # -*- coding: utf-8 -*-
 """
 Módulo RSA-512 Manual
-Implementación completa de RSA con claves de 512 bits
+Implementación completa de RSA con claves de 512 bits (tamaño configurable)
+- Primos: criba de primos pequeños sobre una ventana de candidatos impares;
+  Miller-Rabin solo sobre los sobrevivientes
+- Firma con el Teorema Chino del Resto (CRT) cuando se conocen p y q
+- Firma por lotes, opcionalmente repartida en un pool de procesos
+- Verificación con un objeto por clave pública (e, n) y caché LRU de los
+  pares (hash, firma) ya verificados
+- Exportar/importar la clave pública: cualquier proceso o nodo puede verificar
+  sin la clave privada
 """
 
+import os
 import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Bits del módulo n de las claves nuevas
+BITS_RSA = int(os.getenv("BITS_RSA", "512"))
+
+# Firmas por tarea al firmar un lote en varios procesos
+FIRMAS_POR_TAREA = 64
+
+# Pares (hash, firma) válidos que recuerda cada verificador
+TAM_CACHE_FIRMAS = int(os.getenv("TAM_CACHE_FIRMAS", "65536"))
+# Verificadores (claves públicas distintas) que se mantienen
+MAX_VERIFICADORES = 64
+
+# Cota de los primos pequeños con los que se criban los candidatos
+LIMITE_PRIMOS_PEQUENOS = 2000
+
+
+def _primos_hasta(limite):
+    """Criba de Eratóstenes: primos menores que 'limite'."""
+    es_compuesto = bytearray(limite)
+    primos = []
+    for i in range(2, limite):
+        if not es_compuesto[i]:
+            primos.append(i)
+            es_compuesto[i * i::i] = b"\x01" * len(range(i * i, limite, i))
+    return primos
+
+
+# Primos impares pequeños (el 2 se descarta usando solo candidatos impares)
+PRIMOS_PEQUENOS = _primos_hasta(LIMITE_PRIMOS_PEQUENOS)[1:]
 
 
 def es_primo(n, k=5):
@@ -46,23 +87,59 @@ def es_primo(n, k=5):
     return True
 
 
+def _cribar_ventana(inicio, ventana):
+    """
+    Marca los candidatos inicio + 2j (j < ventana) divisibles por algún primo pequeño.
+    inicio debe ser impar y mayor que LIMITE_PRIMOS_PEQUENOS.
+    """
+    compuesto = bytearray(ventana)
+    for p in PRIMOS_PEQUENOS:
+        # Primer j con inicio + 2j ≡ 0 (mod p): j ≡ -inicio · 2⁻¹ (mod p)
+        j = (p - inicio % p) * ((p + 1) // 2) % p
+        if j < ventana:
+            compuesto[j::p] = b"\x01" * len(range(j, ventana, p))
+    return compuesto
+
+
 def generar_primo(bits):
-    """Genera número primo de 'bits' bits."""
+    """
+    Genera número primo de 'bits' bits (los dos bits altos en 1, así el
+    producto de dos primos tiene exactamente 2·bits bits).
+
+    Parte de un impar aleatorio y recorre la ventana de impares siguientes:
+    la criba descarta los divisibles por primos pequeños y Miller-Rabin solo
+    se aplica a los que quedan.
+    """
+    if bits < 16:
+        raise ValueError("Se requieren al menos 16 bits")
+    # Ventana de ~2·ln(2^bits) impares: suele contener varios primos
+    ventana = max(64, int(1.4 * bits))
     while True:
-        n = random.getrandbits(bits)
-        n |= (1 << (bits - 1)) | 1
-        if es_primo(n):
-            return n
+        inicio = random.getrandbits(bits) | (3 << (bits - 2)) | 1
+        compuesto = _cribar_ventana(inicio, ventana)
+        for j in range(ventana):
+            if compuesto[j]:
+                continue
+            candidato = inicio + 2 * j
+            if candidato.bit_length() > bits:
+                break
+            if es_primo(candidato):
+                return candidato
 
 
 def mcd_extendido(a, b):
-    """Algoritmo extendido de Euclides."""
-    if a == 0:
-        return b, 0, 1
-    mcd, x1, y1 = mcd_extendido(b % a, a)
-    x = y1 - (b // a) * x1
-    y = x1
-    return mcd, x, y
+    """
+    Algoritmo extendido de Euclides (iterativo: sin límite de recursión).
+
+    Returns:
+        (mcd, x, y) con a*x + b*y = mcd
+    """
+    x0, x1, y0, y1 = 0, 1, 1, 0
+    while a != 0:
+        cociente, b, a = b // a, a, b % a
+        y0, y1 = y1, y0 - cociente * y1
+        x0, x1 = x1, x0 - cociente * x1
+    return b, x0, y0
 
 
 def inverso_modular(e, phi):
@@ -73,23 +150,173 @@ def inverso_modular(e, phi):
     return x % phi
 
 
+class VerificadorRSA:
+    """
+    Verificación de firmas con una clave pública (e, n).
+
+    Recuerda los últimos TAM_CACHE_FIRMAS pares (hash, firma) válidos: volver
+    a validar la misma cadena no repite las exponenciaciones.
+    """
+
+    def __init__(self, e, n, tam_cache=TAM_CACHE_FIRMAS):
+        self.e = e
+        self.n = n
+        self.tam_cache = tam_cache
+        self._validas = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.calculos = 0
+
+    def verificar_enteros(self, m, s):
+        """Verifica la firma s (entero) del hash m (entero)."""
+        if m >= self.n:
+            m = m % self.n
+        par = (m, s)
+        with self._candado:
+            if par in self._validas:
+                self._validas.move_to_end(par)
+                self.aciertos += 1
+                return True
+            self.calculos += 1
+        if pow(s, self.e, self.n) != m:
+            return False
+        with self._candado:
+            self._validas[par] = True
+            if len(self._validas) > self.tam_cache:
+                self._validas.popitem(last=False)
+        return True
+
+    def verificar(self, mensaje_hash, firma):
+        """Igual que RSA512.verificar: hash y firma en hexadecimal."""
+        try:
+            return self.verificar_enteros(int(mensaje_hash, 16), int(firma, 16))
+        except (TypeError, ValueError):
+            return False
+
+    def verificar_lote(self, pares):
+        """Verifica pares (m, s) de enteros; retorna una lista de bool (mismo orden)."""
+        return [self.verificar_enteros(m, s) for m, s in pares]
+
+    def obtener_clave_publica(self):
+        """Retorna la clave pública (e, n)."""
+        return (self.e, self.n)
+
+    def exportar_clave_publica(self):
+        """Clave pública serializable en JSON (ver importar_clave_publica)."""
+        return exportar_clave_publica(self.e, self.n)
+
+    def __reduce__(self):
+        # Solo viaja la clave pública: al deserializarse (p. ej. en un proceso de
+        # validación) se usa el verificador compartido de ese proceso
+        return verificador_para, (self.e, self.n)
+
+
+_verificadores = OrderedDict()
+_candado_verificadores = threading.Lock()
+
+
+def verificador_para(e, n):
+    """Verificador compartido (con su caché) para la clave pública (e, n)."""
+    with _candado_verificadores:
+        verificador = _verificadores.get((e, n))
+        if verificador is None:
+            verificador = _verificadores[(e, n)] = VerificadorRSA(e, n)
+            if len(_verificadores) > MAX_VERIFICADORES:
+                _verificadores.popitem(last=False)
+        else:
+            _verificadores.move_to_end((e, n))
+        return verificador
+
+
+def exportar_clave_publica(e, n):
+    """Clave pública (e, n) como dict serializable en JSON: {'e': int, 'n': hex}."""
+    return {'e': e, 'n': hex(n)}
+
+
+def importar_clave_publica(datos):
+    """
+    Verificador de una clave pública exportada.
+
+    Args:
+        datos: Dict de exportar_clave_publica (n en hexadecimal) o tupla (e, n)
+
+    Raises:
+        ValueError: Si la clave no tiene el formato esperado
+    """
+    try:
+        if isinstance(datos, dict):
+            e, n = datos['e'], datos['n']
+        else:
+            e, n = datos
+        e = int(e, 16) if isinstance(e, str) else int(e)
+        n = int(n, 16) if isinstance(n, str) else int(n)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Clave pública inválida: se esperaba {'e': int, 'n': hex}")
+    if n < 3 or not 1 < e < n:
+        raise ValueError("Clave pública inválida: se requiere 1 < e < n")
+    return verificador_para(e, n)
+
+
 class RSA512:
-    """RSA-512 manual para firmas digitales."""
+    """RSA-512 manual para firmas digitales (el tamaño de la clave es configurable)."""
     
-    def __init__(self):
-        """Genera par de claves RSA-512."""
+    def __init__(self, bits=None):
+        """
+        Genera par de claves RSA.
+        
+        Args:
+            bits: Bits del módulo n (por defecto BITS_RSA = 512)
+        """
+        bits = BITS_RSA if bits is None else bits
         print("   Generando números primos (p, q)...")
-        p = generar_primo(256)
-        q = generar_primo(256)
+        self.e = 65537
+        while True:
+            p = generar_primo(bits // 2)
+            q = generar_primo(bits - bits // 2)
+            phi = (p - 1) * (q - 1)
+            # e debe ser invertible módulo phi (y p distinto de q)
+            if p != q and phi % self.e != 0:
+                break
         
         self.n = p * q
-        phi = (p - 1) * (q - 1)
-        
-        self.e = 65537
         self.d = inverso_modular(self.e, phi)
+        self._preparar_crt(p, q)
         
         print(f"   Claves generadas: n={self.n.bit_length()} bits")
     
+    @classmethod
+    def desde_claves(cls, n, e, d, p=None, q=None):
+        """
+        Reconstruye una instancia a partir de claves guardadas (sin generar primos).
+        Sin p y q la firma usa el exponente privado completo (más lenta).
+        """
+        rsa = cls.__new__(cls)
+        rsa.n = n
+        rsa.e = e
+        rsa.d = d
+        rsa._preparar_crt(p, q)
+        return rsa
+    
+    def _preparar_crt(self, p, q):
+        """Guarda p, q y los exponentes precalculados para firmar con CRT."""
+        self.p = p
+        self.q = q
+        if p is None or q is None:
+            self.dp = self.dq = self.q_inv = None
+            return
+        self.dp = self.d % (p - 1)
+        self.dq = self.d % (q - 1)
+        self.q_inv = inverso_modular(q, p)
+    
+    def _firmar_entero(self, m):
+        """m^d mod n; con CRT: dos exponenciaciones de la mitad de bits y recombinación."""
+        if self.p is None:
+            return pow(m, self.d, self.n)
+        s_p = pow(m % self.p, self.dp, self.p)
+        s_q = pow(m % self.q, self.dq, self.q)
+        h = (self.q_inv * (s_p - s_q)) % self.p
+        return s_q + h * self.q
+    
     def firmar(self, mensaje_hash):
         """
         Firma un hash.
@@ -103,9 +330,31 @@ class RSA512:
         m = int(mensaje_hash, 16)
         if m >= self.n:
             m = m % self.n
-        s = pow(m, self.d, self.n)
+        s = self._firmar_entero(m)
         return hex(s)[2:]
     
+    def firmar_lote(self, mensajes_hash, procesos=None):
+        """
+        Firma varios hashes.
+        
+        Args:
+            mensajes_hash: Lista de hashes en formato hexadecimal
+            procesos: Si es > 1 y hay más de FIRMAS_POR_TAREA hashes, reparte
+                      el lote en un pool de procesos
+            
+        Returns:
+            Lista de firmas en formato hexadecimal (mismo orden)
+        """
+        mensajes_hash = list(mensajes_hash)
+        if not procesos or procesos <= 1 or len(mensajes_hash) <= FIRMAS_POR_TAREA:
+            return [self.firmar(mensaje_hash) for mensaje_hash in mensajes_hash]
+        
+        tareas = [mensajes_hash[i:i + FIRMAS_POR_TAREA]
+                  for i in range(0, len(mensajes_hash), FIRMAS_POR_TAREA)]
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = pool.map(_firmar_tarea, [self] * len(tareas), tareas)
+            return [firma for firmas in resultados for firma in firmas]
+    
     def verificar(self, mensaje_hash, firma):
         """
         Verifica firma.
@@ -117,22 +366,24 @@ class RSA512:
         Returns:
             True si la firma es válida, False en caso contrario
         """
-        try:
-            m = int(mensaje_hash, 16)
-            s = int(firma, 16)
-            
-            if m >= self.n:
-                m = m % self.n
-            
-            m_verificado = pow(s, self.e, self.n)
-            return m == m_verificado
-        except:
-            return False
+        return self.verificador().verificar(mensaje_hash, firma)
+    
+    def verificar_enteros(self, m, s):
+        """Verifica la firma s del hash m (enteros)."""
+        return self.verificador().verificar_enteros(m, s)
+    
+    def verificador(self):
+        """Verificador (con caché) de la clave pública de esta instancia."""
+        return verificador_para(self.e, self.n)
     
     def obtener_clave_publica(self):
         """Retorna la clave pública (e, n)."""
         return (self.e, self.n)
     
+    def exportar_clave_publica(self):
+        """Clave pública serializable en JSON (ver importar_clave_publica)."""
+        return exportar_clave_publica(self.e, self.n)
+    
     def obtener_info(self):
         """Retorna información sobre las claves."""
         return {
@@ -142,6 +393,11 @@ class RSA512:
         }
 
 
+def _firmar_tarea(rsa, mensajes_hash):
+    """Corre en el proceso del pool: firma una parte del lote."""
+    return [rsa.firmar(mensaje_hash) for mensaje_hash in mensajes_hash]
+
+
 # ============== PRUEBAS ==============
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de trabajos en segundo plano (minado del PoW)
+
+- Enviar un trabajo retorna de inmediato; el cálculo corre en un pool de procesos
+- Estados: pendiente, ejecutando, completado, error, cancelado
+- Cancelación cooperativa con un evento compartido entre procesos
+- Progreso publicado por el proceso en un diccionario compartido
+- Límite de trabajos activos (pendientes + ejecutando)
+- El callback al_terminar corre en un pool de hilos propio, no en el hilo
+  interno del ProcessPoolExecutor que entrega los resultados
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Procesos del pool de trabajos
+PROCESOS_TRABAJOS = int(os.getenv("PROCESOS_TRABAJOS", "2"))
+# Máximo de trabajos pendientes o en ejecución al mismo tiempo
+MAX_TRABAJOS_ACTIVOS = int(os.getenv("MAX_TRABAJOS_ACTIVOS", "8"))
+# Trabajos terminados que se conservan para consultar su resultado
+MAX_TRABAJOS_HISTORIAL = 1000
+# Hilos que ejecutan los callbacks al_terminar (p. ej. confirmar un bloque)
+HILOS_AL_TERMINAR = int(os.getenv("HILOS_AL_TERMINAR", "2"))
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+COMPLETADO = "completado"
+ERROR = "error"
+CANCELADO = "cancelado"
+
+
+class ColaLlenaError(Exception):
+    """Se alcanzó el límite de trabajos activos."""
+
+
+def _ejecutar(funcion, args, kwargs):
+    """Corre en el proceso del pool: ejecuta la función y mide su duración."""
+    inicio = time.time()
+    resultado = funcion(*args, **kwargs)
+    return resultado, inicio, time.time() - inicio
+
+
+class _Progreso:
+    """Callable (serializable) que publica el progreso en un dict compartido."""
+
+    def __init__(self, compartido):
+        self.compartido = compartido
+
+    def __call__(self, **datos):
+        self.compartido.update(datos)
+
+
+class Trabajo:
+    """Trabajo enviado a la cola y su estado."""
+
+    def __init__(self, tipo, cancelacion, progreso):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.cancelacion = cancelacion
+        self._progreso = progreso
+        self._ultimo_progreso = {}
+        self.creado = time.time()
+        self.iniciado = None
+        self.duracion = None
+        self.resultado = None
+        self.error = None
+        self.estado_final = None
+        self.futuro = None
+        # Se resuelve con el propio trabajo cuando termina (para esperar sin sondear);
+        # queda "en curso" para que quien espera no pueda cancelarlo
+        self.finalizado = Future()
+        self.finalizado.set_running_or_notify_cancel()
+
+    @property
+    def estado(self):
+        if self.estado_final is not None:
+            return self.estado_final
+        # Terminado en el proceso pero con al_terminar en curso: sigue ejecutando
+        return EJECUTANDO if self.futuro.running() or self.futuro.done() else PENDIENTE
+
+    @property
+    def activo(self):
+        return self.estado_final is None
+
+    @property
+    def progreso(self):
+        """Último progreso publicado por el proceso (copia)."""
+        if self.activo:
+            self._copiar_progreso()
+        return self._ultimo_progreso
+
+    def _copiar_progreso(self):
+        # El dict compartido deja de responder cuando se cierra el Manager
+        # (GestorTrabajos.cerrar): queda el último progreso leído
+        try:
+            self._ultimo_progreso = dict(self._progreso)
+        except (OSError, EOFError):
+            pass
+
+    def _cancelacion_pedida(self):
+        try:
+            return self.cancelacion.is_set()
+        except (OSError, EOFError):
+            return False
+
+    def a_dict(self):
+        return {
+            "job_id": self.id,
+            "tipo": self.tipo,
+            "estado": self.estado,
+            "creado": self.creado,
+            "iniciado": self.iniciado,
+            "duracion": None if self.duracion is None else round(self.duracion, 3),
+            "progreso": self.progreso,
+            "resultado": self.resultado,
+            "error": self.error
+        }
+
+
+class GestorTrabajos:
+    """
+    Registro de trabajos sobre un ProcessPoolExecutor.
+
+    Las funciones enviadas deben ser importables (se ejecutan en otro proceso)
+    y aceptar los argumentos 'cancelacion' (evento con is_set()) y 'progreso'
+    (callable con argumentos nombrados que se publican en el trabajo). El callback
+    'al_terminar(resultado, duracion)' corre en el proceso principal, en un hilo
+    del pool de callbacks, y su retorno es el resultado del trabajo; si lanza
+    una excepción el trabajo termina con error.
+    """
+
+    def __init__(self, procesos=PROCESOS_TRABAJOS, max_activos=MAX_TRABAJOS_ACTIVOS,
+                 max_historial=MAX_TRABAJOS_HISTORIAL, hilos_al_terminar=HILOS_AL_TERMINAR):
+        self.procesos = procesos
+        self.hilos_al_terminar = hilos_al_terminar
+        self.max_activos = max_activos
+        self.max_historial = max_historial
+        self._trabajos = {}
+        self._candado = threading.Lock()
+        self._pool = None
+        self._manager = None
+        self._hilos = None
+
+    def _iniciar(self):
+        if self._pool is None:
+            self._manager = multiprocessing.Manager()
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+            self._hilos = ThreadPoolExecutor(max_workers=self.hilos_al_terminar,
+                                             thread_name_prefix="al_terminar")
+
+    def activos(self):
+        return sum(1 for t in self._trabajos.values() if t.activo)
+
+    def enviar(self, tipo, funcion, *args, al_terminar=None, **kwargs):
+        """
+        Encola funcion(*args, cancelacion=evento, progreso=callable, **kwargs).
+
+        Raises:
+            ColaLlenaError: si ya hay max_activos trabajos activos
+        """
+        with self._candado:
+            if self.activos() >= self.max_activos:
+                raise ColaLlenaError(
+                    f"Límite de {self.max_activos} trabajos activos alcanzado")
+            self._iniciar()
+            trabajo = Trabajo(tipo, self._manager.Event(), self._manager.dict())
+            kwargs["cancelacion"] = trabajo.cancelacion
+            kwargs["progreso"] = _Progreso(trabajo._progreso)
+            trabajo.futuro = self._pool.submit(_ejecutar, funcion, args, kwargs)
+            self._trabajos[trabajo.id] = trabajo
+            self._podar_historial()
+
+        hilos = self._hilos
+        trabajo.futuro.add_done_callback(
+            lambda futuro: self._despachar(hilos, trabajo, futuro, al_terminar))
+        return trabajo
+
+    def _despachar(self, hilos, trabajo, futuro, al_terminar):
+        """
+        Corre en el hilo de gestión del pool de procesos: pasa el resultado a un
+        hilo de callbacks para no retener la entrega de los demás resultados.
+        """
+        try:
+            hilos.submit(self._terminar, trabajo, futuro, al_terminar)
+        except RuntimeError:
+            # Pool de callbacks cerrado (cerrar()): se registra aquí mismo
+            self._terminar(trabajo, futuro, al_terminar)
+
+    def _terminar(self, trabajo, futuro, al_terminar):
+        """Registra el resultado (o error) cuando el proceso termina."""
+        trabajo._copiar_progreso()
+        if futuro.cancelled():
+            estado = CANCELADO
+        elif futuro.exception() is not None:
+            # Una excepción tras pedir la cancelación es la cancelación misma
+            estado = CANCELADO if trabajo._cancelacion_pedida() else ERROR
+            if estado == ERROR:
+                trabajo.error = str(futuro.exception())
+        else:
+            resultado, trabajo.iniciado, trabajo.duracion = futuro.result()
+            try:
+                if al_terminar is not None:
+                    resultado = al_terminar(resultado, trabajo.duracion)
+                trabajo.resultado = resultado
+                estado = COMPLETADO
+            except Exception as e:
+                trabajo.error = str(e)
+                estado = ERROR
+        trabajo.estado_final = estado
+        trabajo.finalizado.set_result(trabajo)
+
+    def _podar_historial(self):
+        """Descarta los trabajos terminados más antiguos."""
+        exceso = len(self._trabajos) - self.max_historial
+        if exceso <= 0:
+            return
+        for trabajo_id in [t.id for t in self._trabajos.values() if not t.activo][:exceso]:
+            del self._trabajos[trabajo_id]
+
+    def obtener(self, trabajo_id):
+        return self._trabajos.get(trabajo_id)
+
+    def cancelar(self, trabajo_id):
+        """Pide la cancelación; un trabajo pendiente no llega a ejecutarse."""
+        trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None and trabajo.activo:
+            trabajo.cancelacion.set()
+            trabajo.futuro.cancel()
+        return trabajo
+
+    def cerrar(self):
+        """Cancela lo pendiente y libera el pool."""
+        for trabajo in list(self._trabajos.values()):
+            if trabajo.activo:
+                trabajo.cancelacion.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._hilos.shutdown(wait=True)
+            self._manager.shutdown()
+            self._pool = None
+            self._manager = None
+            self._hilos = None
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Validación de bloques repartida en un pool de procesos
+
+- Las verificaciones de un bloque (hashes, PoW, firmas) no dependen de los demás:
+  se reparten en lotes de bloques consecutivos
+- Los resultados se entregan en el orden de la cadena, no en el de terminación:
+  el primer bloque inválido reportado es siempre el mismo que en la validación
+  secuencial (los enlaces hash_anterior se revisan al recorrerlos, en el
+  proceso principal)
+- Solo hay unos pocos lotes en curso: los bloques se leen a medida que se envían
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+# Bloques por tarea enviada al pool
+BLOQUES_POR_LOTE = int(os.getenv("BLOQUES_POR_LOTE", "256"))
+
+# Lotes en curso por proceso
+LOTES_EN_CURSO_POR_PROCESO = 2
+
+
+def _validar_lote(funcion, lote):
+    """Corre en el proceso del pool: aplica la función a cada elemento del lote."""
+    return [funcion(elemento) for elemento in lote]
+
+
+def _lotes(elementos, tam_lote):
+    lote = []
+    for elemento in elementos:
+        lote.append(elemento)
+        if len(lote) == tam_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def validar_en_lotes(elementos, funcion, procesos=None, tam_lote=BLOQUES_POR_LOTE):
+    """
+    Aplica funcion(elemento) a cada elemento y genera (elemento, resultado) en orden.
+
+    Args:
+        elementos: Iterable de elementos (se consume de a un lote)
+        funcion: Función importable (o functools.partial) y elementos serializables
+        procesos: Si es > 1 y hay más de un lote, los lotes se reparten en un pool
+        tam_lote: Elementos por tarea
+
+    Si quien consume deja de iterar (p. ej. en el primer bloque inválido), los
+    lotes que no empezaron se cancelan.
+    """
+    lotes = _lotes(elementos, tam_lote)
+    primero = next(lotes, None)
+    if primero is None:
+        return
+    segundo = next(lotes, None)
+    pendientes = [primero] if segundo is None else [primero, segundo]
+
+    if not procesos or procesos <= 1 or segundo is None:
+        # Secuencial (un solo lote no justifica levantar el pool)
+        for lote in chain(pendientes, lotes):
+            for elemento in lote:
+                yield elemento, funcion(elemento)
+        return
+
+    en_curso = []
+    pool = ProcessPoolExecutor(max_workers=procesos)
+    try:
+        while True:
+            while len(en_curso) < LOTES_EN_CURSO_POR_PROCESO * procesos:
+                lote = pendientes.pop(0) if pendientes else next(lotes, None)
+                if lote is None:
+                    break
+                en_curso.append((lote, pool.submit(_validar_lote, funcion, lote)))
+            if not en_curso:
+                return
+            # El lote más antiguo primero: el orden de los resultados es el de la cadena
+            lote, futuro = en_curso.pop(0)
+            yield from zip(lote, futuro.result())
+    finally:
+        for _, futuro in en_curso:
+            futuro.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
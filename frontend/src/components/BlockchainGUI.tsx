@@ -191,6 +191,21 @@ const BlockchainGUI = () => {
   // ============== FUNCIONES DEL SIMULADOR DE FRAUDE ==============
 
   const [calculandoNonce, setCalculandoNonce] = useState({});
+  const [progresoNonce, setProgresoNonce] = useState({});
+
+  // Sigue un trabajo de minado por SSE; resuelve con el estado final del trabajo
+  const seguirTrabajo = (jobId, alProgreso) => new Promise((resolve, reject) => {
+    const eventos = new EventSource(`${API_URL}/jobs/${jobId}/eventos`);
+    eventos.addEventListener('progreso', (e) => alProgreso?.(JSON.parse(e.data).progreso));
+    eventos.addEventListener('fin', (e) => {
+      eventos.close();
+      resolve(JSON.parse(e.data));
+    });
+    eventos.onerror = () => {
+      eventos.close();
+      reject(new Error('Se perdió la conexión con el trabajo de minado'));
+    };
+  });
 
   const modificarCodigoFraude = (bloqueId, nuevoCodigo) => {
     setBlockchainFraude(prev => prev.map(block => {
@@ -275,7 +290,8 @@ const BlockchainGUI = () => {
           fecha: block.fecha,
           lista_verificacion: block.lista_verificacion,
           observaciones: observacionesNormalizadas,
-          pow_hash: block.pow_hash
+          pow_hash: block.pow_hash,
+          version: block.version
         }),
       });
 
@@ -317,17 +333,35 @@ const BlockchainGUI = () => {
 
     try {
       const block = blockchainFraude[indexBloque];
-      const response = await fetch(`${API_URL}/fraude/recalcular-nonce`, {
+      const peticion = {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           hash_codigo: block.codigo_hash,
           fecha: block.fecha,
-          observaciones: block.observaciones.map(obs => obs.texto)
+          observaciones: block.observaciones.map(obs => obs.texto),
+          dificultad: block.dificultad,
+          version: block.version
         }),
-      });
+      };
+      const response = await fetch(`${API_URL}/fraude/recalcular-nonce/async`, peticion);
+
+      let data;
+      if (response.status === 501) {
+        // Backend con varios workers: sin trabajos asíncronos, se mina en la misma petición
+        const sincrono = await fetch(`${API_URL}/fraude/recalcular-nonce`, peticion);
+        data = await sincrono.json();
+        if (!sincrono.ok) throw new Error(data.detail || 'No se pudo calcular el nonce');
+      } else {
+        const envio = await response.json();
+        if (!response.ok) throw new Error(envio.detail || 'No se pudo iniciar el minado');
 
-      const data = await response.json();
+        const trabajo = await seguirTrabajo(envio.job_id, (progreso) => {
+          setProgresoNonce(prev => ({ ...prev, [indexBloque]: progreso }));
+        });
+        if (trabajo.estado !== 'completado') throw new Error(trabajo.error || `Minado ${trabajo.estado}`);
+        data = trabajo.resultado;
+      }
 
       setBlockchainFraude(prev => prev.map((b, idx) => {
         if (idx === indexBloque) {
@@ -342,6 +376,7 @@ const BlockchainGUI = () => {
       addLog(`❌ Error: ${error.message}`, 'error');
     } finally {
       setCalculandoNonce(prev => ({ ...prev, [indexBloque]: false }));
+      setProgresoNonce(prev => ({ ...prev, [indexBloque]: null }));
     }
   };
 
@@ -673,27 +708,30 @@ const BlockchainGUI = () => {
 
     addLog('🔍 Validando blockchain en el backend...', 'info');
 
-    try {
-      const response = await fetch(`${API_URL}/blockchain/${blockchainId}/validate`, {
-        method: 'POST',
+    // Resultado por bloque a medida que se valida (SSE)
+    await new Promise((resolve) => {
+      const eventos = new EventSource(`${API_URL}/blockchain/${blockchainId}/validate/stream`);
+      eventos.addEventListener('bloque', (e) => {
+        const bloque = JSON.parse(e.data);
+        addLog(`${bloque.valido ? '✓' : '❌'} ${bloque.mensaje} (${bloque.indice + 1}/${bloque.total})`,
+          bloque.valido ? 'info' : 'error');
       });
-
-      if (!response.ok) throw new Error('Error al validar');
-
-      const data = await response.json();
-
-      data.logs?.forEach(log => {
-        addLog(log.message, log.type);
+      eventos.addEventListener('fin', (e) => {
+        eventos.close();
+        const data = JSON.parse(e.data);
+        if (data.valid) {
+          addLog(`✅ Blockchain íntegra y válida (${data.tiempo}s)`, 'success');
+        } else {
+          addLog(`❌ ${data.message}`, 'error');
+        }
+        resolve();
       });
-
-      if (data.valid) {
-        addLog('✅ Blockchain íntegra y válida', 'success');
-      } else {
-        addLog(`❌ ${data.message}`, 'error');
-      }
-    } catch (error) {
-      addLog(`❌ Error: ${error.message}`, 'error');
-    }
+      eventos.onerror = () => {
+        eventos.close();
+        addLog('❌ Error: Error al validar', 'error');
+        resolve();
+      };
+    });
   };
 
   const iniciarNuevaEtapa = () => {
@@ -785,6 +823,7 @@ const BlockchainGUI = () => {
     if (activeTab === 'fraud' && blocks.length > 0) {
       const copiaBlockchain = blocks.map(block => ({
         id: block.id,
+        version: block.version,
         etapa: block.etapa,
         fecha: block.fecha,
         hash_anterior: block.hash_anterior,
@@ -792,6 +831,7 @@ const BlockchainGUI = () => {
         codigo_texto: block.codigo_texto,
         nonce: block.nonce,
         pow_hash: block.pow_hash,
+        dificultad: block.dificultad,
         hash_actual: block.hash_actual,
         lista_verificacion: [...block.lista_verificacion],
         observaciones: block.observaciones.map(obs => ({
@@ -1896,7 +1936,11 @@ const BlockchainGUI = () => {
                               className="w-full px-3 py-2 bg-yellow-600 hover:bg-yellow-700 rounded text-sm font-semibold"
                               disabled={calculandoNonce[index]}
                             >
-                              {calculandoNonce[index] ? '⏳ Calculando...' : '⛏️ Calcular Nonce'}
+                              {calculandoNonce[index]
+                                ? (progresoNonce[index]?.nonce
+                                  ? `⏳ ${progresoNonce[index].nonce.toLocaleString()} (${progresoNonce[index].hashes_por_segundo.toLocaleString()} H/s)`
+                                  : '⏳ Calculando...')
+                                : '⛏️ Calcular Nonce'}
                             </button>
                           </div>
                         </div>